@@ -3,6 +3,8 @@ from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils import timezone
 
+from procurement.mailer import queue_email
+
 @shared_task
 def send_welcome_email_task(user_id, token):
     from .models import User  # import here to avoid circular imports
@@ -28,4 +30,4 @@ def send_welcome_email_task(user_id, token):
         [user.email],
     )
     email.attach_alternative(html_content, "text/html")
-    email.send()
+    queue_email(email)
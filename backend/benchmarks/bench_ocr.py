@@ -0,0 +1,73 @@
+"""
+Serial vs parallel OCR wall-clock on a synthetic multi-page scanned PDF.
+
+Usage (from backend/):
+    python benchmarks/bench_ocr.py [pages] [runs]
+
+Requires tesseract and poppler (pdftoppm) on PATH.
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'procured_payment.settings')
+
+django.setup()
+
+from PIL import Image, ImageDraw
+from procurement.document_processing import ocr_pdf_pages, ocr_worker_count
+
+
+def make_scanned_pdf(pages):
+    """Build an image-only PDF (no text layer) that looks like a receipt scan."""
+    images = []
+    for page in range(pages):
+        img = Image.new("RGB", (1654, 2339), "white")  # A4 @ 200 DPI
+        draw = ImageDraw.Draw(img)
+        draw.text((120, 100), f"ACME SUPPLIES LTD - RECEIPT PAGE {page + 1}", fill="black")
+        for line in range(40):
+            draw.text(
+                (120, 200 + line * 50),
+                f"Item {page * 40 + line:04d}  HP LaserJet Toner 85A   2 x 45.00   90.00",
+                fill="black",
+            )
+        images.append(img)
+
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:], resolution=200)
+    return buffer.getvalue()
+
+
+def time_ocr(pdf_path, max_workers, runs):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        list(ocr_pdf_pages(pdf_path, max_workers=max_workers))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    workers = ocr_worker_count(pages, os.cpu_count())
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+        tmp.write(make_scanned_pdf(pages))
+        tmp.flush()
+        serial = time_ocr(tmp.name, 1, runs)
+        parallel = time_ocr(tmp.name, workers, runs)
+
+    print(f"pages={pages} runs={runs} (best of)")
+    print(f"serial:   {serial:.2f}s  ({pages / serial:.2f} pages/s)")
+    print(f"parallel: {parallel:.2f}s  ({pages / parallel:.2f} pages/s, {workers} threads)")
+    print(f"speedup:  {serial / parallel:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+PDF renders/sec: cold per-request rendering (what the tasks used to do:
+fresh font configuration and stylesheet parsing for every document) vs
+the warm per-worker renderer, single and batched.
+
+Usage (from backend/):
+    python benchmarks/bench_render.py [documents] [runs]
+
+Requires WeasyPrint's system libraries (Pango).
+"""
+import os
+import sys
+import time
+
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'procured_payment.settings')
+
+django.setup()
+
+from django.template.loader import render_to_string
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+from procurement.rendering import STYLESHEETS, PDFRenderer
+
+TEMPLATE = "emails/po.html"
+
+
+def po_context(number):
+    items = [
+        {"name": f"HP LaserJet Toner 85A #{line}", "price": 45.0, "quantity": 2, "total_price": 90.0}
+        for line in range(25)
+    ]
+    purchase_request = {
+        "id": number, "title": f"Office supplies {number}", "vendor_name": "Acme Supplies Ltd",
+        "amount": 2250, "description": "Quarterly restock",
+    }
+    return {"purchase_request": purchase_request, "items": items}
+
+
+def render_cold(context):
+    font_config = FontConfiguration()
+    stylesheet = CSS(string=render_to_string(STYLESHEETS[TEMPLATE]), font_config=font_config)
+    html_string = render_to_string(TEMPLATE, context)
+    return HTML(string=html_string).write_pdf(stylesheets=[stylesheet], font_config=font_config)
+
+
+def best_rate(render_all, documents, runs):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        render_all()
+        best = min(best, time.perf_counter() - start)
+    return documents / best
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    contexts = [po_context(number) for number in range(documents)]
+
+    renderer = PDFRenderer()
+    renderer.warm_up()
+
+    cold = best_rate(lambda: [render_cold(context) for context in contexts], documents, runs)
+    warm = best_rate(lambda: [renderer.render(TEMPLATE, context) for context in contexts], documents, runs)
+    batch = best_rate(lambda: renderer.render_many([(TEMPLATE, context) for context in contexts]), documents, runs)
+
+    print(f"{documents} purchase orders, best of {runs} runs")
+    print(f"  cold (per-request setup): {cold:6.1f} renders/sec")
+    print(f"  warm renderer:            {warm:6.1f} renders/sec  ({warm / cold:.2f}x)")
+    print(f"  warm batch:               {batch:6.1f} renders/sec  ({batch / cold:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
+import logging
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "procured_payment.settings")
 
@@ -8,3 +10,22 @@ app = Celery("procured_payment")
 # Use broker URL from environment
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+logger = logging.getLogger(__name__)
+
+
+@worker_process_init.connect
+def warm_pdf_renderer(**kwargs):
+    """
+    Load fonts and parse PDF stylesheets once per worker process (skipped
+    when PDF_WARM_UP is off, e.g. for the mail worker). A failed warm-up
+    only means the first render starts cold.
+    """
+    from django.conf import settings
+    if not settings.PDF_WARM_UP:
+        return
+    try:
+        from procurement.rendering import warm_up
+        warm_up()
+    except Exception:
+        logger.exception("PDF renderer warm-up failed; renderer will start cold")
@@ -9,10 +9,6 @@ from decouple import config
 
 from datetime import timedelta
 
-import openai
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -185,6 +181,112 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Africa/Kigali"
+CELERY_BEAT_SCHEDULE = {
+    "purge-extraction-cache": {
+        "task": "procurement.tasks.purge_extraction_cache",
+        "schedule": timedelta(hours=24),
+    },
+    "purge-item-equivalences": {
+        "task": "procurement.tasks.purge_item_equivalences",
+        "schedule": timedelta(hours=24),
+    },
+    "purge-checkpoints": {
+        "task": "procurement.tasks.purge_checkpoints",
+        "schedule": timedelta(hours=24),
+    },
+    "send-queued-emails": {
+        "task": "procurement.tasks.send_queued_emails",
+        "schedule": timedelta(minutes=1),
+    },
+    "purge-sent-emails": {
+        "task": "procurement.tasks.purge_sent_emails",
+        "schedule": timedelta(hours=24),
+    },
+}
+# outbound mail is delivered by its own worker (celery worker -Q mail)
+CELERY_TASK_ROUTES = {
+    "procurement.tasks.send_queued_emails": {"queue": "mail"},
+}
+# warm the PDF renderer in every worker process at start; off for workers
+# that never render PDFs (the mail worker)
+PDF_WARM_UP = config('PDF_WARM_UP', default=True, cast=bool)
+
+# Public base URL of this API, used for links in emails (e.g. report downloads)
+BACKEND_BASE_URL = config('BACKEND_BASE_URL', default='http://localhost:8000')
+# signed discrepancy-report download links stay valid this many days (and only
+# until the request's matching results change)
+REPORT_LINK_MAX_AGE_DAYS = config('REPORT_LINK_MAX_AGE_DAYS', default=3, cast=int)
+
+# pipeline checkpoints of runs that never completed are purged after this many hours
+PIPELINE_CHECKPOINT_TTL_HOURS = config('PIPELINE_CHECKPOINT_TTL_HOURS', default=24, cast=int)
+
+# Document extraction cache (keyed by SHA-256 of the uploaded file)
+EXTRACTION_CACHE_TTL_DAYS = config('EXTRACTION_CACHE_TTL_DAYS', default=90, cast=int)
+EXTRACTION_CACHE_MAX_ENTRIES = config('EXTRACTION_CACHE_MAX_ENTRIES', default=5000, cast=int)
+
+# OCR: pages of scanned PDFs are processed in parallel (0 workers = CPU count)
+OCR_PARALLEL = config('OCR_PARALLEL', default=True, cast=bool)
+OCR_MAX_WORKERS = config('OCR_MAX_WORKERS', default=0, cast=int)
+# pages with fewer text-layer characters than this are treated as scanned
+OCR_PAGE_MIN_CHARS = config('OCR_PAGE_MIN_CHARS', default=30, cast=int)
+# pages are rasterized one at a time; DPI is lowered so that all pages being
+# OCRed concurrently fit in this budget
+OCR_DPI = config('OCR_DPI', default=200, cast=int)
+OCR_MEMORY_BUDGET_MB = config('OCR_MEMORY_BUDGET_MB', default=256, cast=int)
+# adaptive DPI: pages are OCRed at OCR_LOW_DPI first and re-rendered at
+# OCR_DPI only when mean tesseract confidence is below OCR_MIN_CONFIDENCE
+OCR_LOW_DPI = config('OCR_LOW_DPI', default=150, cast=int)
+OCR_MIN_CONFIDENCE = config('OCR_MIN_CONFIDENCE', default=60, cast=int)
+# OpenCV cleanup (denoise, binarize, deskew, crop margins) before tesseract
+OCR_PREPROCESS = config('OCR_PREPROCESS', default=True, cast=bool)
+
+# documents parsed by the rule-based parser with at least this confidence (0-1)
+# skip the OpenAI call
+RULE_PARSER_MIN_CONFIDENCE = config('RULE_PARSER_MIN_CONFIDENCE', default=0.85, cast=float)
+
+# item/vendor name pairs scoring at least ITEM_MATCH_ACCEPT (0-1) locally are
+# the same item, at most ITEM_MATCH_REJECT different; only the band in
+# between is sent to OpenAI
+ITEM_MATCH_ACCEPT = config('ITEM_MATCH_ACCEPT', default=0.85, cast=float)
+ITEM_MATCH_REJECT = config('ITEM_MATCH_REJECT', default=0.4, cast=float)
+
+# "llm": fuzzy prefilter + one structured LLM call per receipt;
+# "embedding": cached name embeddings + optimal one-to-one assignment
+ITEM_MATCH_MODE = config('ITEM_MATCH_MODE', default='llm')
+ITEM_EMBEDDING_MODEL = config('ITEM_EMBEDDING_MODEL', default='text-embedding-3-small')
+ITEM_EMBEDDING_THRESHOLD = config('ITEM_EMBEDDING_THRESHOLD', default=0.8, cast=float)
+
+# LLM item-equivalence answers are memoized per worker (LRU, seconds) and in
+# the shared ItemEquivalence table (days / max rows)
+ITEM_EQUIVALENCE_MEMORY_SIZE = config('ITEM_EQUIVALENCE_MEMORY_SIZE', default=2048, cast=int)
+ITEM_EQUIVALENCE_MEMORY_TTL = config('ITEM_EQUIVALENCE_MEMORY_TTL', default=3600, cast=int)
+ITEM_EQUIVALENCE_TTL_DAYS = config('ITEM_EQUIVALENCE_TTL_DAYS', default=180, cast=int)
+ITEM_EQUIVALENCE_MAX_ENTRIES = config('ITEM_EQUIVALENCE_MAX_ENTRIES', default=20000, cast=int)
+
+# long documents are parsed as overlapping chunks (characters) in parallel
+LLM_CHUNK_SIZE = config('LLM_CHUNK_SIZE', default=4000, cast=int)
+LLM_CHUNK_OVERLAP = config('LLM_CHUNK_OVERLAP', default=400, cast=int)
+LLM_CHUNK_CONCURRENCY = config('LLM_CHUNK_CONCURRENCY', default=4, cast=int)
+
+# Shared LLM client (procurement.llm_client). LLM_BASE_URL can point at any
+# OpenAI-compatible server, e.g. a local stand-in for tests/benchmarks.
+LLM_BACKEND = config('LLM_BACKEND', default='procurement.llm_client.OpenAIBackend')
+LLM_BASE_URL = config('LLM_BASE_URL', default='')
+LLM_TIMEOUT = config('LLM_TIMEOUT', default=60.0, cast=float)
+LLM_CONNECT_TIMEOUT = config('LLM_CONNECT_TIMEOUT', default=5.0, cast=float)
+LLM_MAX_RETRIES = config('LLM_MAX_RETRIES', default=2, cast=int)
+LLM_MAX_CONNECTIONS = config('LLM_MAX_CONNECTIONS', default=20, cast=int)
+LLM_MAX_KEEPALIVE_CONNECTIONS = config('LLM_MAX_KEEPALIVE_CONNECTIONS', default=10, cast=int)
+LLM_KEEPALIVE_EXPIRY = config('LLM_KEEPALIVE_EXPIRY', default=60.0, cast=float)
+
+# Cluster-wide OpenAI budget shared by all workers (token buckets in Redis).
+# Calls over budget wait up to LLM_RATE_LIMIT_MAX_WAIT seconds.
+LLM_RATE_LIMIT_ENABLED = config('LLM_RATE_LIMIT_ENABLED', default=True, cast=bool)
+LLM_RATE_LIMIT_REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+LLM_RATE_LIMIT_RPM = config('LLM_RATE_LIMIT_RPM', default=500, cast=int)
+LLM_RATE_LIMIT_TPM = config('LLM_RATE_LIMIT_TPM', default=200000, cast=int)
+LLM_RATE_LIMIT_MAX_WAIT = config('LLM_RATE_LIMIT_MAX_WAIT', default=300, cast=int)
+LLM_RATE_LIMIT_COMPLETION_ESTIMATE = config('LLM_RATE_LIMIT_COMPLETION_ESTIMATE', default=500, cast=int)
 
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='localhost')
@@ -195,6 +297,21 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
 
+# Outbound mail queue: tasks enqueue messages and the mail worker sends up to
+# MAIL_BATCH_SIZE of them over one SMTP connection
+MAIL_BATCH_SIZE = config('MAIL_BATCH_SIZE', default=50, cast=int)
+# seconds a queued flush waits, so messages enqueued together share a batch
+MAIL_FLUSH_DELAY = config('MAIL_FLUSH_DELAY', default=5, cast=int)
+# SMTP errors back off exponentially from MAIL_RETRY_BACKOFF up to MAIL_RETRY_BACKOFF_MAX seconds
+MAIL_RETRY_BACKOFF = config('MAIL_RETRY_BACKOFF', default=30, cast=int)
+MAIL_RETRY_BACKOFF_MAX = config('MAIL_RETRY_BACKOFF_MAX', default=900, cast=int)
+# a message that failed this many times is marked FAILED
+MAIL_MAX_ATTEMPTS = config('MAIL_MAX_ATTEMPTS', default=5, cast=int)
+# claimed messages not sent within this many seconds (crashed worker) are re-queued
+MAIL_CLAIM_TIMEOUT = config('MAIL_CLAIM_TIMEOUT', default=600, cast=int)
+# sent messages are kept this many days
+MAIL_KEEP_DAYS = config('MAIL_KEEP_DAYS', default=14, cast=int)
+
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",   # Vite frontend
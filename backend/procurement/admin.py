@@ -1,6 +1,6 @@
 # requests/admin.py
 from django.contrib import admin
-from .models import PurchaseRequest, ApprovalAction
+from .models import PurchaseRequest, ApprovalAction, DocumentExtraction, PipelineCounter, VendorTemplate, ItemEquivalence, ItemEmbedding, Vendor, VendorAlias, PipelineCheckpoint, OutboundEmail
 
 class ApprovalActionInline(admin.TabularInline):
     model = ApprovalAction
@@ -32,3 +32,62 @@ class ApprovalActionAdmin(admin.ModelAdmin):
     list_filter = ('action', 'level', 'acted_at')
     search_fields = ('request__title', 'actor__username', 'comment')
     readonly_fields = ('request', 'level', 'action', 'actor', 'comment', 'acted_at')
+
+@admin.register(DocumentExtraction)
+class DocumentExtractionAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'hit_count', 'created_at', 'last_used_at')
+    search_fields = ('digest',)
+    readonly_fields = ('digest', 'raw_text', 'parsed_json', 'hit_count', 'created_at', 'last_used_at')
+
+@admin.register(PipelineCounter)
+class PipelineCounterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value', 'updated_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'value', 'updated_at')
+
+@admin.register(VendorTemplate)
+class VendorTemplateAdmin(admin.ModelAdmin):
+    list_display = ('vendor_name', 'fingerprint', 'hit_count', 'updated_at')
+    search_fields = ('vendor_name', 'fingerprint')
+    readonly_fields = ('fingerprint', 'field_map', 'hit_count', 'created_at', 'updated_at')
+
+@admin.register(ItemEquivalence)
+class ItemEquivalenceAdmin(admin.ModelAdmin):
+    list_display = ('name_a', 'name_b', 'same', 'hit_count', 'last_used_at')
+    list_filter = ('same',)
+    search_fields = ('name_a', 'name_b')
+    readonly_fields = ('pair_key', 'name_a', 'name_b', 'same', 'hit_count', 'created_at', 'last_used_at')
+
+@admin.register(ItemEmbedding)
+class ItemEmbeddingAdmin(admin.ModelAdmin):
+    list_display = ('name', 'model', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('name_key', 'name', 'model', 'created_at')
+    exclude = ('vector',)
+
+class VendorAliasInline(admin.TabularInline):
+    model = VendorAlias
+    extra = 0
+    readonly_fields = ('alias_key', 'created_at')
+
+@admin.register(Vendor)
+class VendorAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'created_at')
+    search_fields = ('name', 'aliases__alias')
+    inlines = [VendorAliasInline]
+
+@admin.register(PipelineCheckpoint)
+class PipelineCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('request', 'pipeline', 'stage', 'updated_at')
+    list_filter = ('pipeline', 'stage')
+    readonly_fields = ('request', 'pipeline', 'stage', 'input_key', 'data', 'updated_at')
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    readonly_fields = (
+        'subject', 'to', 'message', 'attempts', 'last_error', 'created_at', 'claimed_at',
+        'deferrals', 'deferred_until', 'sent_at',
+    )
@@ -1,16 +1,32 @@
 # requests/ai_matching.py
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import numpy as np
+from django.conf import settings
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from . import metrics
+from .embeddings import similarity_matrix
+from .item_equivalence import get_equivalence, get_equivalences, store_equivalence, store_equivalences
+from .llm_client import get_backend
+from .schemas import ItemAssignment
+from .similarity import local_decision, name_similarity, optimal_assignment
+from .utils import normalize_text
 
 def are_items_same(name1: str, name2: str) -> bool:
     """
     Uses OpenAI to determine if two item names refer to the same product,
     ignoring word order, synonyms, or minor phrasing differences.
+    Clear matches and clear non-matches are decided locally first, and
+    earlier LLM answers are reused from the item-equivalence memo.
     """
+    decision = local_decision(name1, name2)
+    if decision is not None:
+        metrics.increment("item_match.local")
+        return decision
+
+    cached = get_equivalence(name1, name2)
+    if cached is not None:
+        return cached
+    metrics.increment("item_match.remote")
+
     # Craft the prompt
     prompt = f"""
     You are a smart procurement assistant. Determine if these two item names 
@@ -22,14 +38,218 @@ def are_items_same(name1: str, name2: str) -> bool:
     """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        answer = get_backend().chat(
+            [{"role": "user", "content": prompt}],
             temperature=0.0,
             max_tokens=5
         )
-        return response.choices[0].message.content.strip().upper() == "YES"
+        same = answer.strip().upper() == "YES"
+        store_equivalence(name1, name2, same)
+        return same
     except Exception:
         # Fallback to normalized exact match if AI fails
-        from .utils import normalize_text
-        return normalize_text(name1) == normalize_text(name2)
\ No newline at end of file
+        return normalize_text(name1) == normalize_text(name2)
+
+
+def assignment_messages(po_names, receipt_names):
+    po_lines = "\n".join(f"{i}: {name}" for i, name in enumerate(po_names))
+    receipt_lines = "\n".join(f"{i}: {name}" for i, name in enumerate(receipt_names))
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are a smart procurement assistant matching purchase-order lines to "
+                "receipt lines. Pair each PO line with the receipt line for the same "
+                "physical product or service, ignoring word order, extra words, synonyms "
+                "or minor typos. Each line may be used in at most one pair. List every "
+                "line that has no counterpart as unmatched. Refer to lines by index only."
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"PURCHASE ORDER LINES:\n{po_lines}\n\nRECEIPT LINES:\n{receipt_lines}",
+        },
+    ]
+
+
+def exact_assignment(po_names, receipt_names):
+    """Greedy normalized exact-name pairing, used when the LLM is unavailable."""
+    free = {}
+    for j, name in enumerate(receipt_names):
+        free.setdefault(normalize_text(name), []).append(j)
+    pairs = []
+    for i, name in enumerate(po_names):
+        candidates = free.get(normalize_text(name))
+        if candidates:
+            pairs.append((i, candidates.pop(0)))
+    return pairs
+
+
+def complete_assignment(pairs, po_count, receipt_count):
+    """
+    Keep only in-range, one-to-one pairs (first claim wins) and derive the
+    unmatched lines from them rather than trusting the model's own lists.
+    """
+    used_po, used_receipt, kept = set(), set(), []
+    for i, j in pairs:
+        if not (0 <= i < po_count and 0 <= j < receipt_count):
+            continue
+        if i in used_po or j in used_receipt:
+            continue
+        used_po.add(i)
+        used_receipt.add(j)
+        kept.append((i, j))
+    unmatched_po = [i for i in range(po_count) if i not in used_po]
+    unmatched_receipt = [j for j in range(receipt_count) if j not in used_receipt]
+    return kept, unmatched_po, unmatched_receipt
+
+
+def local_assignment(po_names, receipt_names):
+    """
+    Pair lines whose similarity is above ITEM_MATCH_ACCEPT (best scores
+    first). Returns (pairs, ambiguous) where `ambiguous` says whether any
+    remaining PO/receipt combination falls in the uncertain band.
+    """
+    scores = sorted(
+        (
+            (name_similarity(po_name, receipt_name), i, j)
+            for i, po_name in enumerate(po_names)
+            for j, receipt_name in enumerate(receipt_names)
+        ),
+        reverse=True,
+    )
+    used_po, used_receipt, pairs = set(), set(), []
+    for score, i, j in scores:
+        if score < settings.ITEM_MATCH_ACCEPT:
+            break
+        if i in used_po or j in used_receipt:
+            continue
+        used_po.add(i)
+        used_receipt.add(j)
+        pairs.append((i, j))
+    ambiguous = any(
+        score > settings.ITEM_MATCH_REJECT
+        for score, i, j in scores
+        if i not in used_po and j not in used_receipt
+    )
+    return pairs, ambiguous
+
+
+def memo_assignment(po_names, receipt_names, rest_po, rest_receipt):
+    """
+    Apply earlier LLM answers (item-equivalence memo) to the leftover lines.
+    Returns (pairs, rest_po, rest_receipt, undecided): pairs the memo knows
+    are the same product, the lines still unpaired, and whether any of
+    their combinations has no memoized answer yet.
+    """
+    combinations = [(i, j) for i in rest_po for j in rest_receipt]
+    answers = dict(zip(combinations, get_equivalences(
+        [(po_names[i], receipt_names[j]) for i, j in combinations]
+    )))
+    pairs, used_receipt = [], set()
+    for i in rest_po:
+        for j in rest_receipt:
+            if answers[i, j] and j not in used_receipt:
+                pairs.append((i, j))
+                used_receipt.add(j)
+                break
+    paired_po = {i for i, _ in pairs}
+    rest_po = [i for i in rest_po if i not in paired_po]
+    rest_receipt = [j for j in rest_receipt if j not in used_receipt]
+    undecided = any(answers[i, j] is None for i in rest_po for j in rest_receipt)
+    return pairs, rest_po, rest_receipt, undecided
+
+
+def remember_assignment(po_names, receipt_names, pairs, unmatched_po, unmatched_receipt):
+    """
+    Memoize what an LLM assignment says about each combination: paired
+    lines are the same product; a line left unmatched differs from every
+    line it could have been paired with. Lines both paired elsewhere say
+    nothing about each other and are not stored.
+    """
+    answers = [(po_names[i], receipt_names[j], True) for i, j in pairs]
+    unmatched_po, unmatched_receipt = set(unmatched_po), set(unmatched_receipt)
+    answers += [
+        (po_names[i], receipt_names[j], False)
+        for i in range(len(po_names))
+        for j in range(len(receipt_names))
+        if i in unmatched_po or j in unmatched_receipt
+    ]
+    store_equivalences(answers)
+
+
+def embedding_assignment(po_names, receipt_names):
+    """
+    Match by embedding cosine similarity: one optimal one-to-one assignment
+    over the whole matrix, keeping pairs at or above ITEM_EMBEDDING_THRESHOLD.
+    If embeddings are unavailable the local name-similarity matrix is used
+    with the stricter ITEM_MATCH_ACCEPT threshold.
+    """
+    try:
+        scores = similarity_matrix(po_names, receipt_names)
+        threshold = settings.ITEM_EMBEDDING_THRESHOLD
+    except Exception:
+        scores = np.array([
+            [name_similarity(po_name, receipt_name) for receipt_name in receipt_names]
+            for po_name in po_names
+        ])
+        threshold = settings.ITEM_MATCH_ACCEPT
+    metrics.increment("item_match.embedding", len(po_names) * len(receipt_names))
+    return [(i, j) for i, j in optimal_assignment(scores) if scores[i, j] >= threshold]
+
+
+def match_item_lists(po_names, receipt_names):
+    """
+    Match two item-name lists with at most one LLM call (or, with
+    ITEM_MATCH_MODE = "embedding", one batched embedding call).
+
+    Clear pairs are taken locally and earlier LLM answers are reused from
+    the item-equivalence memo; only the lines left over go to the LLM, and
+    only if some of them are ambiguous. Returns (pairs, unmatched_po,
+    unmatched_receipt) where pairs are (po_index, receipt_index) tuples;
+    every index appears exactly once.
+    """
+    po_names, receipt_names = list(po_names), list(receipt_names)
+    if settings.ITEM_MATCH_MODE == "embedding":
+        if not po_names or not receipt_names:
+            return complete_assignment([], len(po_names), len(receipt_names))
+        pairs = embedding_assignment(po_names, receipt_names)
+        return complete_assignment(pairs, len(po_names), len(receipt_names))
+
+    pairs, ambiguous = local_assignment(po_names, receipt_names)
+    _, rest_po, rest_receipt = complete_assignment(pairs, len(po_names), len(receipt_names))
+
+    leftover = len(rest_po) * len(rest_receipt) if ambiguous else 0
+    if len(po_names) * len(receipt_names):
+        metrics.increment("item_match.local", len(po_names) * len(receipt_names) - leftover)
+    if not leftover:
+        return complete_assignment(pairs, len(po_names), len(receipt_names))
+
+    memo_pairs, rest_po, rest_receipt, undecided = memo_assignment(
+        po_names, receipt_names, rest_po, rest_receipt
+    )
+    pairs += memo_pairs
+    if not undecided:
+        return complete_assignment(pairs, len(po_names), len(receipt_names))
+    metrics.increment("item_match.remote", len(rest_po) * len(rest_receipt))
+
+    rest_po_names = [po_names[i] for i in rest_po]
+    rest_receipt_names = [receipt_names[j] for j in rest_receipt]
+    try:
+        assignment = get_backend().parse(
+            assignment_messages(rest_po_names, rest_receipt_names), ItemAssignment
+        )
+    except Exception:
+        # Fallback to normalized exact match if AI fails
+        remote_pairs = exact_assignment(rest_po_names, rest_receipt_names)
+    else:
+        remote_pairs, unmatched_po, unmatched_receipt = complete_assignment(
+            [(pair.po_index, pair.receipt_index) for pair in assignment.pairs],
+            len(rest_po), len(rest_receipt),
+        )
+        remember_assignment(rest_po_names, rest_receipt_names, remote_pairs, unmatched_po, unmatched_receipt)
+
+    # map indices in the reduced lists back to the original lines
+    remote_pairs, _, _ = complete_assignment(remote_pairs, len(rest_po), len(rest_receipt))
+    pairs += [(rest_po[i], rest_receipt[j]) for i, j in remote_pairs]
+    return complete_assignment(pairs, len(po_names), len(receipt_names))
@@ -0,0 +1,74 @@
+# requests/checkpoints.py
+"""
+Per-request pipeline checkpoints.
+
+A task saves the output of each expensive stage (raw text, parsed
+document, match result) under an input key (document digest, hash of the
+stage inputs). When the task is retried, stages whose input key is
+unchanged are loaded instead of recomputed.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PipelineCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+def input_key(*parts) -> str:
+    """Stable SHA-256 of JSON-serializable stage inputs."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class Checkpoints:
+    """Checkpoint store for one request's run of one pipeline (task)."""
+
+    def __init__(self, request_id, pipeline):
+        self.request_id = request_id
+        self.pipeline = pipeline
+
+    def for_document(self, name):
+        """Checkpoints for one document's stages within this pipeline."""
+        return Checkpoints(self.request_id, f"{self.pipeline}:{name}")
+
+    def load(self, stage, key):
+        """Saved data for `stage`, or None if missing or saved for other inputs."""
+        checkpoint = PipelineCheckpoint.objects.filter(
+            request_id=self.request_id, pipeline=self.pipeline, stage=stage, input_key=key,
+        ).first()
+        if checkpoint is None:
+            return None
+        logger.info(f"Resuming {self.pipeline} for request {self.request_id} from stage {stage}")
+        return checkpoint.data
+
+    def save(self, stage, key, data):
+        PipelineCheckpoint.objects.update_or_create(
+            request_id=self.request_id, pipeline=self.pipeline, stage=stage,
+            defaults={"input_key": key, "data": data},
+        )
+
+    def clear(self):
+        """Drop all checkpoints (document ones included) once the pipeline has completed."""
+        PipelineCheckpoint.objects.filter(
+            Q(pipeline=self.pipeline) | Q(pipeline__startswith=f"{self.pipeline}:"),
+            request_id=self.request_id,
+        ).delete()
+
+
+def purge_checkpoints() -> int:
+    """
+    Delete checkpoints not updated for PIPELINE_CHECKPOINT_TTL_HOURS (runs
+    that never completed, e.g. a worker killed mid-task). Returns the
+    number deleted.
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.PIPELINE_CHECKPOINT_TTL_HOURS)
+    deleted, _ = PipelineCheckpoint.objects.filter(updated_at__lt=cutoff).delete()
+    logger.info(f"Checkpoint purge removed {deleted} entries")
+    return deleted
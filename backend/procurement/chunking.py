@@ -0,0 +1,79 @@
+# requests/chunking.py
+"""
+Map-reduce helpers for parsing documents longer than one LLM prompt.
+
+Text is split on line boundaries into overlapping chunks; each chunk is
+parsed independently and the partial results are merged back into one
+document, dropping items duplicated by the overlap and reconciling totals.
+"""
+from .utils import normalize_text
+
+
+def split_into_chunks(text, chunk_size, overlap):
+    """
+    Split `text` into chunks of at most ~chunk_size characters, cutting on
+    line boundaries. Each chunk after the first starts with the last
+    ~overlap characters of the previous one so no line item is cut in half.
+    Returns [(chunk_text, overlap_prefix_length), ...].
+    """
+    lines = text.splitlines(keepends=True)
+    chunks = []
+    current, size, carried = [], 0, 0
+
+    for line in lines:
+        if current and size + len(line) > chunk_size:
+            chunks.append(("".join(current), carried))
+            tail, tail_size = [], 0
+            for previous in reversed(current):
+                if tail_size + len(previous) > overlap:
+                    break
+                tail.insert(0, previous)
+                tail_size += len(previous)
+            current, size, carried = tail, tail_size, tail_size
+        current.append(line)
+        size += len(line)
+
+    if current or not chunks:
+        chunks.append(("".join(current), carried))
+    return chunks
+
+
+def item_key(item):
+    return (normalize_text(str(item.get("name", ""))), item.get("price"), item.get("quantity"))
+
+
+def merge_chunk_results(chunks, results):
+    """
+    Combine per-chunk parses (in chunk order) into one document:
+    - header fields come from the first chunk that has them
+    - an item is dropped when it repeats an item of the previous chunk
+      and its name lies in this chunk's overlap prefix
+    - the total is the last stated total (grand totals sit at the end);
+      if no chunk states one, it is the sum of the merged items
+    """
+    merged = {"vendor_name": "", "vendor_address": "", "items": [], "total_amount": None, "payment_terms": ""}
+    previous_keys = []
+
+    for (chunk_text, overlap), result in zip(chunks, results):
+        for field in ("vendor_name", "vendor_address", "payment_terms"):
+            if not merged[field] and result.get(field):
+                merged[field] = result[field]
+
+        overlap_text = normalize_text(chunk_text[:overlap])
+        remaining = list(previous_keys)
+        for item in result.get("items") or []:
+            key = item_key(item)
+            if key in remaining and key[0] and key[0] in overlap_text:
+                remaining.remove(key)
+                continue
+            merged["items"].append(item)
+        previous_keys = [item_key(item) for item in result.get("items") or []]
+
+        if result.get("total_amount") is not None:
+            merged["total_amount"] = result["total_amount"]
+
+    if merged["total_amount"] is None and merged["items"]:
+        merged["total_amount"] = round(
+            sum(float(item.get("price") or 0) * int(item.get("quantity") or 0) for item in merged["items"]), 2
+        )
+    return merged
@@ -0,0 +1,175 @@
+# requests/discrepancy.py
+"""
+Discrepancy engine shared by matching and reporting.
+
+Given PO lines matched against a receipt's (or an invoice's) lines, tolerance checks run over NumPy arrays of
+all pairs at once and produce one structured row per line. The rows and
+summary are persisted in PurchaseRequest.discrepancy_details; the report
+renderer only reads them.
+"""
+import numpy as np
+
+from .ai_matching import match_item_lists
+
+MATCHED = "MATCHED"
+MISMATCH = "MISMATCH"
+
+
+def line_values(lines, field, dtype):
+    return np.array([lines[i].get(field) or 0 for i in range(len(lines))], dtype=dtype)
+
+
+def percent_difference(expected, received):
+    """|expected - received| / expected * 100, 0 where nothing was expected."""
+    diff = np.zeros_like(expected, dtype=float)
+    np.divide(np.abs(expected - received) * 100, expected, out=diff, where=expected > 0)
+    return np.round(diff, 2)
+
+
+def compare_lines(po_lines, receipt_lines, pairs, unmatched_po, unmatched_receipt,
+                  price_tolerance, quantity_tolerance, document="receipt"):
+    """
+    Evaluate a PO/receipt (or PO/invoice, with document="invoice") assignment.
+
+    Returns {"lines": [...], "issues": [...], "discrepancies": [...]}:
+    `lines` has one row per PO or document line (status MATCHED, MISMATCH,
+    MISSING_IN_<DOCUMENT> or EXTRA_IN_<DOCUMENT>), `issues` the
+    per-problem records stored as <document>_validation, `discrepancies`
+    one code per problem line.
+    """
+    missing, extra = f"MISSING_IN_{document.upper()}", f"EXTRA_IN_{document.upper()}"
+    pairs = sorted(pairs)  # report rows follow PO line order
+    po_idx = np.array([i for i, _ in pairs], dtype=int)
+    rcpt_idx = np.array([j for _, j in pairs], dtype=int)
+
+    po_price = line_values(po_lines, "price", float)[po_idx]
+    po_qty = line_values(po_lines, "quantity", int)[po_idx]
+    rcpt_price = line_values(receipt_lines, "price", float)[rcpt_idx]
+    rcpt_qty = line_values(receipt_lines, "quantity", int)[rcpt_idx]
+
+    price_diff = percent_difference(po_price, rcpt_price)
+    qty_diff = percent_difference(po_qty, rcpt_qty)
+    price_bad = price_diff > price_tolerance
+    qty_bad = qty_diff > quantity_tolerance
+
+    lines, issues, discrepancies = [], [], []
+    for k, (i, j) in enumerate(pairs):
+        name = po_lines[i]["name"].strip()
+        lines.append({
+            "name": name,
+            f"{document}_name": receipt_lines[j]["name"].strip(),
+            "po_price": float(po_price[k]),
+            f"{document}_price": float(rcpt_price[k]),
+            "po_qty": int(po_qty[k]),
+            f"{document}_qty": int(rcpt_qty[k]),
+            "price_diff_pct": float(price_diff[k]),
+            "qty_diff_pct": float(qty_diff[k]),
+            "status": MISMATCH if price_bad[k] or qty_bad[k] else MATCHED,
+        })
+        if price_bad[k]:
+            issues.append({
+                "type": "price",
+                "item": name,
+                "expected_price": float(po_price[k]),
+                "received_price": float(rcpt_price[k]),
+                "tolerance_pct": price_tolerance,
+                "difference_pct": float(price_diff[k]),
+            })
+        if qty_bad[k]:
+            issues.append({
+                "type": "quantity",
+                "item": name,
+                "expected_quantity": int(po_qty[k]),
+                "received_quantity": int(rcpt_qty[k]),
+                "tolerance_pct": quantity_tolerance,
+                "difference_pct": float(qty_diff[k]),
+            })
+        if price_bad[k] or qty_bad[k]:
+            discrepancies.append("item_mismatch")
+
+    for i in unmatched_po:
+        item = po_lines[i]
+        price, qty = float(item.get("price") or 0), int(item.get("quantity") or 0)
+        name = item["name"].strip()
+        lines.append({
+            "name": name, f"{document}_name": "", "po_price": price, f"{document}_price": None,
+            "po_qty": qty, f"{document}_qty": None, "status": missing,
+        })
+        issues.append({
+            "type": "missing_item",
+            "item": name,
+            "expected": f"{qty} units @ ${price}",
+            "message": f"Item not found in {document}",
+        })
+        discrepancies.append("missing_item")
+
+    for j in unmatched_receipt:
+        item = receipt_lines[j]
+        name = item["name"].strip()
+        lines.append({
+            "name": name, f"{document}_name": name, "po_price": None,
+            f"{document}_price": float(item.get("price") or 0), "po_qty": None,
+            f"{document}_qty": int(item.get("quantity") or 0), "status": extra,
+        })
+        issues.append({
+            "type": "extra_item",
+            "item": name,
+            "message": f"Item in {document} not found in purchase order",
+        })
+        discrepancies.append("extra_item")
+
+    return {"lines": lines, "issues": issues, "discrepancies": discrepancies}
+
+
+def named_lines(items):
+    return [item for item in items or [] if str(item.get("name") or "").strip()]
+
+
+def match_document(po_items, document_items, price_tolerance, quantity_tolerance,
+                   document="receipt"):
+    """Assign a document's lines to the PO lines, then compare_lines() them."""
+    po_lines, document_lines = named_lines(po_items), named_lines(document_items)
+    pairs, unmatched_po, unmatched_document = match_item_lists(
+        [item["name"].strip() for item in po_lines],
+        [item["name"].strip() for item in document_lines],
+    )
+    return compare_lines(
+        po_lines, document_lines, pairs, unmatched_po, unmatched_document,
+        price_tolerance, quantity_tolerance, document=document,
+    )
+
+
+def compare_totals(po_total, document_total, tolerance, document="invoice"):
+    """A "total" issue when the document total is off the PO total by more than `tolerance` %."""
+    if po_total is None or document_total is None or float(po_total) <= 0:
+        return None
+    diff = float(percent_difference(np.array([float(po_total)]), np.array([float(document_total)]))[0])
+    if diff <= tolerance:
+        return None
+    return {
+        "type": "total",
+        "document": document,
+        "expected_total": float(po_total),
+        "received_total": float(document_total),
+        "tolerance_pct": tolerance,
+        "difference_pct": diff,
+    }
+
+
+def summarize(lines, po_total, receipt_total, invoice_total=None, invoice_lines=(), findings=()):
+    """
+    Counts and totals shown at the bottom of the matching report. Line
+    counts cover the receipt and invoice rows; `findings` are the
+    document-level issues (vendor or total mismatch, unreadable invoice),
+    each counted as one more issue.
+    """
+    all_lines = list(lines) + list(invoice_lines)
+    matched = sum(1 for line in all_lines if line["status"] == MATCHED)
+    return {
+        "total_items": len(all_lines),
+        "matched_count": matched,
+        "issues_count": len(all_lines) - matched + len(findings),
+        "po_total": float(po_total) if po_total is not None else None,
+        "receipt_total": float(receipt_total) if receipt_total is not None else None,
+        "invoice_total": float(invoice_total) if invoice_total is not None else None,
+    }
@@ -1,77 +1,408 @@
-import io
 import os
-from pdf2image import convert_from_bytes
-import pytesseract
+import hashlib
+import math
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from django.conf import settings
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image, ImageOps
 import pdfplumber
-from openai import OpenAI
-from dotenv import load_dotenv
+from .image_preprocessing import preprocess_for_ocr, ocr_with_confidence
+from .rule_parser import parse_with_rules
+from .chunking import split_into_chunks, merge_chunk_results
+from .schemas import ExtractedDocument, validate_extraction
+from .llm_client import gather_limited, get_backend, run_async
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+A4_POINTS = (595, 842)
+SPOOL_CHUNK_SIZE = 64 * 1024
+
+# leading bytes that identify each supported upload format
+PDF_SIGNATURE = b"%PDF-"
+IMAGE_SIGNATURES = (
+    b"\x89PNG\r\n\x1a\n",  # PNG
+    b"\xff\xd8\xff",         # JPEG
+)
+
+def detect_document_format(head):
+    """
+    Sniff a document's format from its first bytes: "pdf", "image" or "unknown".
+    PDFs may carry a little junk before the %PDF- header, so the first KiB is searched.
+    """
+    if head.startswith(IMAGE_SIGNATURES):
+        return "image"
+    if PDF_SIGNATURE in head[:1024]:
+        return "pdf"
+    return "unknown"
+
+@contextmanager
+def spool_document(document):
+    """
+    Copy an uploaded/stored file to a temporary file in fixed-size chunks,
+    hashing it on the way, so the document is never held in memory at once.
+    Yields (path, sha256_hex_digest).
+    """
+    document.seek(0)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile() as tmp:
+        for chunk in iter(lambda: document.read(SPOOL_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            tmp.write(chunk)
+        tmp.flush()
+        yield tmp.name, digest.hexdigest()
+
+def extract_and_parse(document, checkpoints=None):
+    """
+    Extract text from a document and parse it into structured data.
+    Identical documents (same SHA-256) are served from the extraction cache,
+    skipping pdfplumber, OCR and the OpenAI call entirely.
+    With `checkpoints` (a checkpoints.Checkpoints), the raw text and the
+    parse result are saved as they complete, so a retried task resumes
+    after the last finished stage.
+    Returns (raw_text, structured_data).
+    """
+    from .extraction_cache import get_cached_extraction, store_extraction
+
+    with spool_document(document) as (path, digest):
+        cached = get_cached_extraction(digest)
+        if cached is not None:
+            print(f" Using cached extraction ({digest[:12]})")
+            return cached.raw_text, cached.parsed_json
+
+        extracted = checkpoints.load("raw_text", digest) if checkpoints else None
+        if extracted is None:
+            # a PDF's layout is read in the same pdfplumber pass as its text
+            layout = new_layout() if sniff_format(path) == "pdf" else None
+            extracted = {
+                "raw_text": extract_text_from_path(path, layout=layout),
+                "layout": layout if layout and layout["pages"] else None,
+            }
+            if checkpoints:
+                checkpoints.save("raw_text", digest, extracted)
+
+    raw_text = extracted["raw_text"]
+    structured_data = checkpoints.load("parsed", digest) if checkpoints else None
+    if structured_data is None:
+        structured_data = parse_document(raw_text, extracted["layout"])
+        if checkpoints:
+            checkpoints.save("parsed", digest, structured_data)
+
+    store_extraction(digest, raw_text, structured_data)
+    return raw_text, structured_data
 
 def extract_text_from_any_pdf(pdf_file):
     """
-    Smart extraction: handles both text-based and scanned PDFs
+    Smart extraction: handles text-based, scanned and mixed PDFs.
+    Each page keeps its own text layer when it has one; only pages
+    without usable text are rasterized and OCRed.
+    """
+    with spool_document(pdf_file) as (path, _digest):
+        return extract_text_from_pdf_path(path)
+
+def extract_text_from_document(document):
+    """Extract text from an uploaded PDF or image (format sniffed from its bytes)."""
+    with spool_document(document) as (path, _digest):
+        return extract_text_from_path(path)
+
+def extract_text_from_path(path, layout=None):
+    """
+    Dispatch a spooled document by its magic bytes: images go straight to
+    OCR, PDFs through the text-layer/OCR path (filling `layout`, if given,
+    see pdf_page_layers).
+    """
+    document_format = sniff_format(path)
+    if document_format == "image":
+        print(" Image document detected, running OCR directly")
+        return extract_text_from_image_path(path)
+    if document_format == "pdf":
+        return extract_text_from_pdf_path(path, layout=layout)
+    raise ValueError("Unsupported document format. Please upload a PDF, JPG or PNG file.")
+
+def sniff_format(path):
+    """detect_document_format() for a file on disk."""
+    with open(path, "rb") as f:
+        return detect_document_format(f.read(1024))
+
+def extract_text_from_image_path(image_path):
+    """
+    OCR a JPG/PNG receipt without any PDF conversion. Low-confidence
+    results from small photos are retried on a 2x upscaled copy.
     """
-    pdf_file.seek(0)
-    content = pdf_file.read()
-    
-    # METHOD 1: Try text extraction first)
     try:
-        with pdfplumber.open(io.BytesIO(content)) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-            if len(text.strip()) >= 100:  # Good confidence it's text-based
-                print(" Using text extraction (pdfplumber)")
-                return text
+        with Image.open(image_path) as image:
+            image = ImageOps.exif_transpose(image)
+            text, confidence = ocr_image(image)
+            if confidence < settings.OCR_MIN_CONFIDENCE and image.width < 1500:
+                print(f"   Low OCR confidence ({confidence:.0f}), retrying upscaled")
+                upscaled = image.resize((image.width * 2, image.height * 2), Image.LANCZOS)
+                text, confidence = max(
+                    (text, confidence), ocr_image(upscaled), key=lambda result: result[1]
+                )
     except Exception as e:
-        print(f"Text extraction failed: {e}")
-    
-    # METHOD 2: try OCR on images
+        print(f"OCR failed: {e}")
+        raise ValueError(
+            "Could not extract text from document. "
+            "Please ensure PDF contains readable text or clear images."
+        )
+    return require_text(text)
+
+def extract_text_from_pdf_path(pdf_path, layout=None):
+    """Join the per-page texts of a PDF on disk, validating OCR output."""
     try:
-        print(" Falling back to OCR (scanned PDF detected)")
-        images = convert_from_bytes(content)
-        ocr_text = ""
-        for i, img in enumerate(images):
-            print(f"   Processing page {i+1} with OCR...")
-            ocr_text += pytesseract.image_to_string(img) + "\n"
-        
-        if len(ocr_text.strip()) >= 50:
-            return ocr_text
-        else:
-            raise ValueError("OCR produced insufficient text")
-            
+        page_texts = list(iter_pdf_page_texts(pdf_path, layout=layout))
     except Exception as e:
         print(f"OCR failed: {e}")
         raise ValueError(
             "Could not extract text from document. "
             "Please ensure PDF contains readable text or clear images."
         )
+    return require_text("\n".join(page_texts))
+
+def require_text(text):
+    """Reject extractions too short to contain a usable document."""
+    if len(text.strip()) < 50:
+        print("OCR failed: OCR produced insufficient text")
+        raise ValueError(
+            "Could not extract text from document. "
+            "Please ensure PDF contains readable text or clear images."
+        )
+    return text
+
+def iter_pdf_page_texts(pdf_path, layout=None):
+    """
+    Yield the text of each page in order. Pages with a usable text layer
+    come straight from pdfplumber; the rest are rasterized one at a time
+    (to temp files, at a DPI that fits OCR_MEMORY_BUDGET_MB) and OCRed.
+    """
+    layers = pdf_page_layers(pdf_path, layout=layout)
+    if not layers:
+        print(" Falling back to OCR (scanned PDF detected)")
+        page_count = pdfinfo_from_path(pdf_path)["Pages"]
+        layers = [("", A4_POINTS)] * page_count
+
+    scanned_pages = pages_needing_ocr([text for text, _size in layers])
+    if scanned_pages and len(scanned_pages) < len(layers):
+        print(f" OCR on scanned pages {scanned_pages} of {len(layers)}")
+    elif not scanned_pages:
+        print(" Using text extraction (pdfplumber)")
+
+    sizes = [layers[number - 1][1] for number in scanned_pages]
+    ocr_texts = ocr_pdf_pages(pdf_path, scanned_pages, sizes)
+    scanned = set(scanned_pages)
+    for number, (text, _size) in enumerate(layers, start=1):
+        yield next(ocr_texts) if number in scanned else text
+
+def pdf_page_layers(pdf_path, layout=None):
+    """
+    (text, (width_pt, height_pt)) for every page; text is empty for pages
+    without a text layer. Returns [] if the PDF cannot be read.
+    With `layout` (see new_layout), each page's positioned words and tables
+    are collected in the same pass, so the PDF is opened and parsed once.
+    Each page's parsed objects are released as soon as it has been read.
+    """
+    try:
+        layers = []
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                layers.append((page.extract_text() or "", (page.width, page.height)))
+                if layout is not None:
+                    add_page_layout(layout, page)
+                page.close()
+        return layers
+    except Exception as e:
+        print(f"Text extraction failed: {e}")
+        if layout is not None:
+            layout.update(new_layout())
+        return []
+
+def new_layout():
+    """
+    Empty layout for the rule parser and vendor layout templates:
+    {"pages": [{"size": (w, h), "words": [{text, x0, x1, top}, ...]}], "tables": [...]}
+    """
+    return {"pages": [], "tables": []}
+
+def add_page_layout(layout, page):
+    words = [
+        {key: word[key] for key in ("text", "x0", "x1", "top")}
+        for word in page.extract_words()
+    ]
+    layout["pages"].append({"size": (page.width, page.height), "words": words})
+    layout["tables"].extend(page.extract_tables())
+
+def pages_needing_ocr(page_texts):
+    """1-based numbers of pages whose text layer is too short to be usable."""
+    return [
+        number for number, text in enumerate(page_texts, start=1)
+        if len(text.strip()) < settings.OCR_PAGE_MIN_CHARS
+    ]
+
+def ocr_worker_count(page_count, max_workers=None):
+    """
+    Number of OCR threads to use for `page_count` pages: bounded by
+    OCR_MAX_WORKERS (0 = CPU count) and never more than the page count.
+    """
+    if max_workers is None:
+        if not settings.OCR_PARALLEL:
+            return 1
+        max_workers = settings.OCR_MAX_WORKERS or os.cpu_count() or 1
+    return max(1, min(max_workers, page_count))
+
+def ocr_dpi(page_size, concurrent_pages=1):
+    """
+    Highest DPI (capped at OCR_DPI) at which `concurrent_pages` RGB
+    rasters of a page this size fit in OCR_MEMORY_BUDGET_MB together.
+    """
+    width_in, height_in = page_size[0] / 72, page_size[1] / 72
+    budget_bytes = settings.OCR_MEMORY_BUDGET_MB * 1024 * 1024 / concurrent_pages
+    fitting_dpi = math.sqrt(budget_bytes / (3 * width_in * height_in))
+    return max(72, min(settings.OCR_DPI, int(fitting_dpi)))
+
+def ocr_image(image):
+    """OCR a PIL image (preprocessed when OCR_PREPROCESS is on); returns (text, confidence)."""
+    if settings.OCR_PREPROCESS:
+        image = preprocess_for_ocr(image)
+    return ocr_with_confidence(image)
+
+def ocr_page_at_dpi(pdf_path, page_number, dpi):
+    """
+    Rasterize one PDF page at `dpi` and OCR it; returns (text, confidence).
+    The raster goes to a temp file and is released before returning.
+    """
+    with tempfile.TemporaryDirectory() as output_folder:
+        paths = convert_from_path(
+            pdf_path, dpi=dpi, first_page=page_number, last_page=page_number,
+            output_folder=output_folder, paths_only=True,
+        )
+        if not paths:
+            return "", 0.0
+        with Image.open(paths[0]) as image:
+            return ocr_image(image)
+
+def ocr_page(pdf_path, page_number, dpi=200):
+    """
+    OCR a single PDF page.
+    The page is first rendered at OCR_LOW_DPI and only re-rendered at `dpi`
+    (the budget-capped maximum) when tesseract's confidence is poor.
+    """
+    low_dpi = min(settings.OCR_LOW_DPI, dpi)
+    text, confidence = ocr_page_at_dpi(pdf_path, page_number, low_dpi)
+    if confidence >= settings.OCR_MIN_CONFIDENCE or low_dpi >= dpi:
+        return text
+
+    print(f"   Page {page_number}: OCR confidence {confidence:.0f} at {low_dpi} DPI, re-rendering at {dpi}")
+    high_text, high_confidence = ocr_page_at_dpi(pdf_path, page_number, dpi)
+    return high_text if high_confidence >= confidence else text
+
+def ocr_pdf_pages(pdf_path, page_numbers=None, page_sizes=None, max_workers=None):
+    """
+    Lazily OCR the given 1-based pages of a PDF (all pages by default),
+    yielding texts in page order. Pages are fanned out across a bounded
+    thread pool; the memory budget is split across the concurrent pages.
+    Threads rather than processes: pdftoppm and tesseract run as
+    subprocesses anyway, and Celery's daemonic prefork workers may not
+    start child processes of their own.
+    """
+    if page_numbers is None:
+        page_numbers = range(1, pdfinfo_from_path(pdf_path)["Pages"] + 1)
+    page_numbers = list(page_numbers)
+    if not page_numbers:
+        return
+    page_sizes = page_sizes or [A4_POINTS] * len(page_numbers)
+
+    workers = ocr_worker_count(len(page_numbers), max_workers)
+    dpis = [ocr_dpi(size, workers) for size in page_sizes]
+    if workers == 1:
+        for number, dpi in zip(page_numbers, dpis):
+            yield ocr_page(pdf_path, number, dpi)
+        return
+
+    print(f"   OCR on {len(page_numbers)} pages with {workers} threads...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(ocr_page, repeat(pdf_path), page_numbers, dpis)
+
+def parse_document(text, layout=None):
+    """
+    Parse extracted text into structured data, cheapest method first:
+    a learned vendor layout template, then the rule-based parser, and the
+    OpenAI call only when neither reaches RULE_PARSER_MIN_CONFIDENCE.
+    Successful LLM parses of a PDF teach a template for its layout.
+    """
+    from . import metrics
+    from .layout_templates import find_template, layout_fingerprint, learn_template, parse_with_template
+
+    fingerprint = layout_fingerprint(layout)
+    template = find_template(fingerprint)
+    if template is not None:
+        data, confidence = parse_with_template(template, layout)
+        if confidence >= settings.RULE_PARSER_MIN_CONFIDENCE:
+            print(f" Parsed with {template.vendor_name} template (confidence {confidence:.2f})")
+            metrics.increment("parser.template")
+            return validate_extraction(data)
+
+    data, confidence = parse_with_rules(text, layout["tables"] if layout else None)
+    if confidence >= settings.RULE_PARSER_MIN_CONFIDENCE:
+        print(f" Parsed with rules (confidence {confidence:.2f})")
+        metrics.increment("parser.rules")
+        return validate_extraction(data)
+
+    print(f" Rule confidence {confidence:.2f} too low, parsing with AI")
+    metrics.increment("parser.llm")
+    data = validate_extraction(parse_with_ai(text))
+
+    if fingerprint:
+        try:
+            if learn_template(fingerprint, layout, data):
+                print(f" Learned layout template for {data.get('vendor_name')}")
+        except Exception as e:
+            print(f"Template learning failed: {e}")
+    return data
 
 def parse_with_ai(text):
-    """Send extracted text to OpenAI for structured parsing"""
+    """
+    Send extracted text to OpenAI for structured parsing. Long documents are
+    split into overlapping chunks (LLM_CHUNK_SIZE / LLM_CHUNK_OVERLAP), parsed
+    concurrently on the async client (LLM_CHUNK_CONCURRENCY) and merged,
+    so nothing is truncated.
+    """
+    chunks = split_into_chunks(text, settings.LLM_CHUNK_SIZE, settings.LLM_CHUNK_OVERLAP)
+    if len(chunks) == 1:
+        return parse_chunk_with_ai(chunks[0][0])
+
+    print(f" Parsing {len(chunks)} chunks with AI")
+    results = run_async(gather_limited(
+        [aparse_chunk_with_ai(chunk, part, len(chunks)) for part, (chunk, _overlap) in enumerate(chunks, start=1)],
+        settings.LLM_CHUNK_CONCURRENCY,
+    ))
+    return merge_chunk_results(chunks, results)
+
+def chunk_messages(text, part=1, parts=1):
+    """Chat messages asking the model to extract one chunk of a document."""
+    scope = ""
+    if parts > 1:
+        scope = (
+            f"This is part {part} of {parts} of a longer document. Extract only what appears "
+            "in this part; use null for total_amount unless the grand total is stated here."
+        )
     prompt = f"""
-    Extract structured data from this proforma invoice. Return ONLY valid JSON:
-    {{
-        "vendor_name": "string",
-        "vendor_address": "string",
-        "items": [
-            {{"name": "string", "price": number, "quantity": integer}}
-        ],
-        "total_amount": number,
-        "payment_terms": "string"
-    }}
-    Text: {text[:4000]}
-    """
-    
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.0
-    )
-    
-    result = response.choices[0].message.content.strip()
-    if result.startswith("```json"):
-        result = result[7:-3]
-    
-    import json
-    return json.loads(result)
\ No newline at end of file
+    Extract the vendor, vendor address, line items (name, unit price, quantity),
+    total amount and payment terms from this procurement document
+    (proforma invoice, receipt or invoice). Use empty strings for missing text.
+    {scope}
+    Text: {text}
+    """
+    return [{"role": "user", "content": prompt}]
+
+def parse_chunk_with_ai(text, part=1, parts=1):
+    """
+    Parse one chunk of a document with OpenAI using structured (JSON-schema)
+    output, validated and type-coerced through ExtractedDocument.
+    """
+    parsed = get_backend().parse(chunk_messages(text, part, parts), ExtractedDocument)
+    return parsed.model_dump()
+
+async def aparse_chunk_with_ai(text, part=1, parts=1):
+    """Async parse_chunk_with_ai, for concurrent chunk fan-out."""
+    parsed = await get_backend().aparse(chunk_messages(text, part, parts), ExtractedDocument)
+    return parsed.model_dump()
@@ -0,0 +1,65 @@
+# requests/embeddings.py
+"""
+Embedding vectors for item names, cached per normalized name.
+
+Vectors are stored L2-normalized as float32 bytes in ItemEmbedding, so a
+cosine-similarity matrix for two item lists is a single matrix product.
+"""
+import hashlib
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+from .llm_client import get_backend
+from .models import ItemEmbedding
+from .similarity import normalize_item_name
+
+CACHE_METRIC = "item_embedding"
+
+
+def name_key(normalized_name: str, model: str) -> str:
+    return hashlib.sha1(f"{model}\0{normalized_name}".encode()).hexdigest()
+
+
+def unit_vector(values):
+    vector = np.asarray(values, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_names(names) -> np.ndarray:
+    """
+    (len(names), dim) array of unit vectors. Cached names come from one
+    query; all missing ones are embedded in one batched backend call.
+    """
+    model = settings.ITEM_EMBEDDING_MODEL
+    normalized = [normalize_item_name(name) or name.strip().lower() for name in names]
+    keys = {text: name_key(text, model) for text in normalized}
+
+    cached = {
+        entry.name_key: np.frombuffer(bytes(entry.vector), dtype=np.float32)
+        for entry in ItemEmbedding.objects.filter(name_key__in=keys.values())
+    }
+    missing = [text for text, key in keys.items() if key not in cached]
+    metrics.increment(f"{CACHE_METRIC}.hit", len(keys) - len(missing))
+    metrics.increment(f"{CACHE_METRIC}.miss", len(missing))
+
+    if missing:
+        vectors = get_backend().embed(missing, model=model)
+        new_entries = []
+        for text, values in zip(missing, vectors):
+            vector = unit_vector(values)
+            cached[keys[text]] = vector
+            new_entries.append(ItemEmbedding(
+                name_key=keys[text], name=text[:255], model=model, vector=vector.tobytes(),
+            ))
+        ItemEmbedding.objects.bulk_create(new_entries, ignore_conflicts=True)
+
+    return np.vstack([cached[keys[text]] for text in normalized])
+
+
+def similarity_matrix(po_names, receipt_names) -> np.ndarray:
+    """Cosine similarity of every PO name (rows) to every receipt name (columns)."""
+    vectors = embed_names(list(po_names) + list(receipt_names))
+    return vectors[:len(po_names)] @ vectors[len(po_names):].T
@@ -0,0 +1,72 @@
+# requests/extraction_cache.py
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DocumentExtraction
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_METRIC = "extraction_cache"
+
+
+def document_digest(content: bytes) -> str:
+    """SHA-256 hex digest of the raw document bytes."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_cached_extraction(digest: str):
+    """
+    Return the cached DocumentExtraction for `digest`, or None.
+    Records a hit/miss and refreshes the entry's last-used timestamp.
+    """
+    entry = DocumentExtraction.objects.filter(digest=digest).first()
+    if entry is None:
+        metrics.increment(f"{CACHE_METRIC}.miss")
+        return None
+
+    DocumentExtraction.objects.filter(pk=entry.pk).update(
+        hit_count=F("hit_count") + 1,
+        last_used_at=timezone.now(),
+    )
+    metrics.increment(f"{CACHE_METRIC}.hit")
+    return entry
+
+
+def store_extraction(digest: str, raw_text: str, parsed_data: dict) -> DocumentExtraction:
+    """Save (or refresh) the extraction result for a document."""
+    entry, _ = DocumentExtraction.objects.update_or_create(
+        digest=digest,
+        defaults={
+            "raw_text": raw_text,
+            "parsed_json": parsed_data,
+            "last_used_at": timezone.now(),
+        },
+    )
+    return entry
+
+
+def purge_extraction_cache() -> int:
+    """
+    Evict entries unused for longer than EXTRACTION_CACHE_TTL_DAYS, then trim
+    the least recently used ones so at most EXTRACTION_CACHE_MAX_ENTRIES remain.
+    Returns the number of deleted rows.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.EXTRACTION_CACHE_TTL_DAYS)
+    deleted, _ = DocumentExtraction.objects.filter(last_used_at__lt=cutoff).delete()
+
+    overflow_ids = list(
+        DocumentExtraction.objects.order_by("-last_used_at")
+        .values_list("id", flat=True)[settings.EXTRACTION_CACHE_MAX_ENTRIES:]
+    )
+    if overflow_ids:
+        trimmed, _ = DocumentExtraction.objects.filter(id__in=overflow_ids).delete()
+        deleted += trimmed
+
+    logger.info(f"Extraction cache purge removed {deleted} entries")
+    return deleted
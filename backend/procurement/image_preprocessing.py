@@ -0,0 +1,82 @@
+# requests/image_preprocessing.py
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image
+
+# skew angles outside this band are left alone (noise / intentionally rotated pages)
+MIN_SKEW_DEGREES = 0.5
+MAX_SKEW_DEGREES = 15
+MARGIN_PADDING = 10
+
+
+def preprocess_for_ocr(image: Image.Image) -> Image.Image:
+    """
+    Clean a page/photo before OCR: grayscale, denoise, binarize (Otsu),
+    deskew and crop the blank margins. Returns a 1-channel PIL image.
+    """
+    gray = cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2GRAY)
+    gray = cv2.medianBlur(gray, 3)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    binary = deskew(binary)
+    binary = crop_margins(binary)
+    return Image.fromarray(binary)
+
+
+def skew_angle(binary: np.ndarray) -> float:
+    """Estimated rotation (degrees) of the ink in a black-on-white binary image."""
+    coords = cv2.findNonZero(255 - binary)
+    if coords is None:
+        return 0.0
+    angle = cv2.minAreaRect(coords)[-1]
+    # minAreaRect reports (0, 90]; map to (-45, 45]
+    if angle > 45:
+        angle -= 90
+    return angle
+
+
+def deskew(binary: np.ndarray) -> np.ndarray:
+    """Rotate the image so text lines are horizontal."""
+    angle = skew_angle(binary)
+    if not MIN_SKEW_DEGREES <= abs(angle) <= MAX_SKEW_DEGREES:
+        return binary
+    height, width = binary.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(
+        binary, matrix, (width, height),
+        flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_CONSTANT, borderValue=255,
+    )
+
+
+def crop_margins(binary: np.ndarray) -> np.ndarray:
+    """Trim the blank border around the ink, keeping a small padding."""
+    coords = cv2.findNonZero(255 - binary)
+    if coords is None:
+        return binary
+    x, y, w, h = cv2.boundingRect(coords)
+    height, width = binary.shape
+    top, left = max(0, y - MARGIN_PADDING), max(0, x - MARGIN_PADDING)
+    bottom, right = min(height, y + h + MARGIN_PADDING), min(width, x + w + MARGIN_PADDING)
+    return binary[top:bottom, left:right]
+
+
+def ocr_with_confidence(image: Image.Image):
+    """
+    Run tesseract once and return (text, mean word confidence 0-100).
+    Words are regrouped into lines in reading order.
+    """
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        confidence = float(data["conf"][i])
+        if confidence >= 0:
+            confidences.append(confidence)
+
+    text = "\n".join(" ".join(words) for words in lines.values())
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, confidence
@@ -0,0 +1,152 @@
+# requests/item_equivalence.py
+"""
+Two-tier memo for LLM item-equivalence answers.
+
+Tier 1 is a small in-process LRU (per worker, short TTL); tier 2 is the
+shared ItemEquivalence table. Both are keyed on the order-independent
+pair of normalized names, so "HP 85A toner" / "Toner HP 85A" and the
+reversed pair share one entry.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import ItemEquivalence
+from .similarity import normalize_item_name
+
+logger = logging.getLogger(__name__)
+
+CACHE_METRIC = "item_equivalence"
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def normalized_pair(name1: str, name2: str):
+    return tuple(sorted((normalize_item_name(name1), normalize_item_name(name2))))
+
+
+def pair_key(name1: str, name2: str) -> str:
+    """SHA-1 of the sorted normalized pair."""
+    return hashlib.sha1("\0".join(normalized_pair(name1, name2)).encode()).hexdigest()
+
+
+def _memory_get(key):
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        same, expires_at = entry
+        if expires_at < time.monotonic():
+            del _memory[key]
+            return None
+        _memory.move_to_end(key)
+        return same
+
+
+def _memory_put(key, same):
+    with _memory_lock:
+        _memory[key] = (same, time.monotonic() + settings.ITEM_EQUIVALENCE_MEMORY_TTL)
+        _memory.move_to_end(key)
+        while len(_memory) > settings.ITEM_EQUIVALENCE_MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+def clear_memory():
+    with _memory_lock:
+        _memory.clear()
+
+
+def get_equivalence(name1: str, name2: str):
+    """Cached True/False for the pair, or None (see get_equivalences)."""
+    return get_equivalences([(name1, name2)])[0]
+
+
+def get_equivalences(name_pairs) -> list:
+    """
+    Cached True/False (or None) for each (name1, name2) pair, in order.
+    The in-process LRU is checked first; the rest are looked up in the
+    shared table in one query (promoting DB hits into memory), and the
+    hit/miss counters are updated once per call.
+    """
+    keys = [pair_key(name1, name2) for name1, name2 in name_pairs]
+    answers = {}
+    for key in keys:
+        same = _memory_get(key)
+        if same is not None:
+            answers[key] = same
+    memory_hits = sum(1 for key in keys if key in answers)
+
+    missing = {key for key in keys if key not in answers}
+    if missing:
+        entries = dict(
+            ItemEquivalence.objects.filter(pair_key__in=missing).values_list("pair_key", "same")
+        )
+        if entries:
+            ItemEquivalence.objects.filter(pair_key__in=entries).update(
+                hit_count=F("hit_count") + 1,
+                last_used_at=timezone.now(),
+            )
+        for key, same in entries.items():
+            _memory_put(key, same)
+        answers.update(entries)
+
+    hits = sum(1 for key in keys if key in answers)
+    for name, amount in (("hit", hits), ("memory_hit", memory_hits), ("miss", len(keys) - hits)):
+        if amount:
+            metrics.increment(f"{CACHE_METRIC}.{name}", amount)
+    return [answers.get(key) for key in keys]
+
+
+def store_equivalence(name1: str, name2: str, same: bool) -> None:
+    """Remember an LLM answer in both tiers."""
+    store_equivalences([(name1, name2, same)])
+
+
+def store_equivalences(answers) -> None:
+    """Remember (name1, name2, same) LLM answers in both tiers, in one query."""
+    now = timezone.now()
+    entries = {}
+    for name1, name2, same in answers:
+        key = pair_key(name1, name2)
+        name_a, name_b = normalized_pair(name1, name2)
+        entries[key] = ItemEquivalence(
+            pair_key=key, name_a=name_a[:255], name_b=name_b[:255], same=same, last_used_at=now,
+        )
+    ItemEquivalence.objects.bulk_create(
+        entries.values(),
+        update_conflicts=True,
+        unique_fields=["pair_key"],
+        update_fields=["name_a", "name_b", "same", "last_used_at"],
+    )
+    for key, entry in entries.items():
+        _memory_put(key, entry.same)
+
+
+def purge_item_equivalences() -> int:
+    """
+    Evict pairs unused for longer than ITEM_EQUIVALENCE_TTL_DAYS, then trim
+    the least recently used ones so at most ITEM_EQUIVALENCE_MAX_ENTRIES remain.
+    Returns the number of deleted rows.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.ITEM_EQUIVALENCE_TTL_DAYS)
+    deleted, _ = ItemEquivalence.objects.filter(last_used_at__lt=cutoff).delete()
+
+    overflow_ids = list(
+        ItemEquivalence.objects.order_by("-last_used_at")
+        .values_list("id", flat=True)[settings.ITEM_EQUIVALENCE_MAX_ENTRIES:]
+    )
+    if overflow_ids:
+        trimmed, _ = ItemEquivalence.objects.filter(id__in=overflow_ids).delete()
+        deleted += trimmed
+
+    logger.info(f"Item equivalence purge removed {deleted} entries")
+    return deleted
@@ -0,0 +1,253 @@
+# requests/layout_templates.py
+"""
+Vendor layout templates.
+
+Recurring vendors send documents with identical layouts. A fingerprint of
+the header tokens' positions identifies the layout; the first successful
+LLM extraction of that layout teaches us where the line-item columns and
+the total sit, so later documents are parsed from word coordinates alone.
+"""
+import hashlib
+import re
+from collections import Counter
+
+from django.db.models import F
+
+from .models import VendorTemplate
+from .rule_parser import parse_amount, score
+from .utils import normalize_text
+
+HEADER_REGION = 0.3           # fraction of the first page used for the fingerprint
+GRID_COLUMNS, GRID_ROWS = 20, 40
+LINE_TOLERANCE = 3            # points; words closer than this vertically share a line
+COLUMN_TOLERANCE = 25         # points between a word's centre and a learned column
+MIN_FINGERPRINT_TOKENS = 4
+TOKEN = re.compile(r"^[a-z]{3,}$")
+
+
+def layout_fingerprint(layout):
+    """
+    Hash of the alphabetic header tokens of the first page and their
+    quantized positions. Numbers (dates, invoice numbers) are ignored so
+    documents from the same template share a fingerprint.
+    """
+    if not layout or not layout["pages"]:
+        return None
+    first = layout["pages"][0]
+    width, height = first["size"]
+
+    cells = set()
+    for word in first["words"]:
+        if word["top"] > height * HEADER_REGION:
+            continue
+        token = normalize_text(word["text"])
+        if TOKEN.match(token):
+            cells.add(f"{token}@{int(word['x0'] / width * GRID_COLUMNS)},{int(word['top'] / height * GRID_ROWS)}")
+
+    if len(cells) < MIN_FINGERPRINT_TOKENS:
+        return None
+    return hashlib.sha1("|".join(sorted(cells)).encode()).hexdigest()
+
+
+def layout_lines(layout):
+    """Words of every page grouped into lines, in reading order."""
+    lines = []
+    for page in layout["pages"]:
+        current = []
+        for word in sorted(page["words"], key=lambda w: (round(w["top"]), w["x0"])):
+            if current and abs(word["top"] - current[0]["top"]) > LINE_TOLERANCE:
+                lines.append(sorted(current, key=lambda w: w["x0"]))
+                current = []
+            current.append(word)
+        if current:
+            lines.append(sorted(current, key=lambda w: w["x0"]))
+    return lines
+
+
+def line_text(line):
+    return normalize_text(" ".join(word["text"] for word in line))
+
+
+def centre(word):
+    return (word["x0"] + word["x1"]) / 2
+
+
+def column_word(line, x):
+    """The word of `line` sitting in the column centred at `x`, if any."""
+    candidates = [w for w in line if abs(centre(w) - x) <= COLUMN_TOLERANCE]
+    return min(candidates, key=lambda w: abs(centre(w) - x)) if candidates else None
+
+
+def find_template(fingerprint):
+    """Stored template for a layout fingerprint (records a hit), or None."""
+    if not fingerprint:
+        return None
+    template = VendorTemplate.objects.filter(fingerprint=fingerprint).first()
+    if template:
+        VendorTemplate.objects.filter(pk=template.pk).update(hit_count=F("hit_count") + 1)
+    return template
+
+
+def parse_with_template(template, layout):
+    """
+    Parse a document with a learned template's field coordinates.
+    Returns (data, confidence) on the same scale as the rule parser.
+    """
+    fields = template.field_map
+    lines = layout_lines(layout)
+    texts = [line_text(line) for line in lines]
+
+    items, total = [], None
+    if fields["header"] in texts:
+        start = texts.index(fields["header"]) + 1
+        for index in range(start, len(lines)):
+            line = lines[index]
+            if texts[index].split(" ")[0] == fields["total_label"]:
+                total = parse_amount(line[-1]["text"])
+                break
+
+            qty_word = column_word(line, fields["qty_x"])
+            price_word = column_word(line, fields["price_x"])
+            quantity = parse_amount(qty_word["text"]) if qty_word else None
+            price = parse_amount(price_word["text"]) if price_word else None
+            if quantity is None or price is None:
+                continue
+
+            name_index = index + fields["name_line_offset"]
+            if not start <= name_index < len(lines):
+                continue
+            name_words = [
+                w for w in lines[name_index]
+                if w["x0"] >= fields["name_x0"] - LINE_TOLERANCE and w["x1"] < fields["qty_x"] - COLUMN_TOLERANCE
+            ]
+            name = " ".join(w["text"] for w in name_words).strip()
+            if name:
+                items.append({"name": name, "price": price, "quantity": int(quantity)})
+
+    data = {
+        "vendor_name": template.vendor_name,
+        "vendor_address": template.vendor_address,
+        "items": items,
+        "total_amount": total,
+        "payment_terms": template.payment_terms,
+    }
+    return data, score(data)
+
+
+def learn_template(fingerprint, layout, data):
+    """
+    Derive field coordinates from a successful extraction of this layout and
+    store them, but only if re-parsing the same document with the learned
+    template reproduces the extracted items and total.
+    """
+    items = data.get("items") or []
+    total = parse_amount(data.get("total_amount"))
+    if not fingerprint or not items or total is None or not data.get("vendor_name"):
+        return None
+
+    lines = layout_lines(layout)
+    texts = [line_text(line) for line in lines]
+
+    qty_xs, price_xs, name_x0s, offsets, item_rows, name_rows = [], [], [], [], [], []
+    for item in items:
+        row = locate_item_row(lines, item, exclude=item_rows)
+        if row is None:
+            return None
+        index, qty_word, price_word = row
+        name_index = locate_name_line(texts, item["name"], index)
+        if name_index is None:
+            return None
+
+        first_name_word = normalize_text(item["name"]).split(" ")[0]
+        name_word = next(w for w in lines[name_index] if normalize_text(w["text"]).startswith(first_name_word))
+        item_rows.append(index)
+        name_rows.append(name_index)
+        qty_xs.append(centre(qty_word))
+        price_xs.append(centre(price_word))
+        name_x0s.append(name_word["x0"])
+        offsets.append(name_index - index)
+
+    total_index = next(
+        (i for i in range(len(lines) - 1, max(item_rows), -1)
+         if parse_amount(lines[i][-1]["text"]) == total and parse_amount(lines[i][0]["text"]) is None),
+        None,
+    )
+    header_index = min(item_rows + name_rows) - 1
+    if total_index is None or header_index < 0:
+        return None
+
+    field_map = {
+        "header": texts[header_index],
+        "qty_x": sum(qty_xs) / len(qty_xs),
+        "price_x": sum(price_xs) / len(price_xs),
+        "name_x0": min(name_x0s),
+        "name_line_offset": Counter(offsets).most_common(1)[0][0],
+        "total_label": texts[total_index].split(" ")[0],
+    }
+    template = VendorTemplate(
+        fingerprint=fingerprint,
+        vendor_name=data["vendor_name"][:255],
+        vendor_address=data.get("vendor_address") or "",
+        payment_terms=data.get("payment_terms") or "",
+        field_map=field_map,
+    )
+
+    reparsed, _confidence = parse_with_template(template, layout)
+    if not same_extraction(reparsed, items, total):
+        return None
+
+    template, _ = VendorTemplate.objects.update_or_create(
+        fingerprint=fingerprint,
+        defaults={
+            "vendor_name": template.vendor_name,
+            "vendor_address": template.vendor_address,
+            "payment_terms": template.payment_terms,
+            "field_map": field_map,
+        },
+    )
+    return template
+
+
+def locate_item_row(lines, item, exclude=()):
+    """(line index, quantity word, price word) of the row carrying this item's quantity and price."""
+    price = parse_amount(item.get("price"))
+    quantity = parse_amount(item.get("quantity"))
+    for index, line in enumerate(lines):
+        if index in exclude:
+            continue
+        price_word = next((w for w in line if parse_amount(w["text"]) == price and w["text"] != str(item.get("quantity"))), None)
+        if price_word is None:
+            continue
+        # nearest matching word left of the price (skips row-number columns)
+        qty_word = next(
+            (w for w in reversed(line) if w["x1"] <= price_word["x0"] and parse_amount(w["text"]) == quantity),
+            None,
+        )
+        if qty_word:
+            return index, qty_word, price_word
+    return None
+
+
+def locate_name_line(texts, name, row_index, window=2):
+    """Index of the line within `window` lines of the row that starts with the item's name."""
+    target = normalize_text(name)
+    first_word = target.split(" ")[0]
+    for offset in sorted(range(-window, window + 1), key=abs):
+        index = row_index + offset
+        if 0 <= index < len(texts) and first_word in texts[index].split(" "):
+            return index
+    return None
+
+
+def same_extraction(reparsed, items, total):
+    """Whether a template re-parse matches the reference items (name, qty, price) and total."""
+    if reparsed["total_amount"] != total or len(reparsed["items"]) != len(items):
+        return False
+    for got, expected in zip(reparsed["items"], items):
+        if normalize_text(got["name"]) != normalize_text(expected["name"]):
+            return False
+        if got["quantity"] != int(parse_amount(expected["quantity"])):
+            return False
+        if got["price"] != parse_amount(expected["price"]):
+            return False
+    return True
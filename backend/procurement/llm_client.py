@@ -0,0 +1,172 @@
+# requests/llm_client.py
+"""
+Shared LLM client layer.
+
+All OpenAI traffic goes through one backend object per process. The
+default OpenAIBackend keeps a pooled keep-alive HTTP connection for the
+sync client and another for the AsyncOpenAI client, which runs on a
+dedicated event-loop thread so concurrent fan-out can reuse its pool.
+LLM_BACKEND selects a different LLMBackend implementation, and
+LLM_BASE_URL points the OpenAI backend at any compatible server (e.g. a
+local stand-in for tests and benchmarks).
+"""
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+
+import httpx
+from django.conf import settings
+from django.utils.module_loading import import_string
+from openai import AsyncOpenAI, OpenAI
+
+from . import rate_limiter
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+_backend = None
+_backend_lock = threading.Lock()
+_loop = None
+_loop_lock = threading.Lock()
+
+
+class LLMBackend(ABC):
+    """
+    Interface every LLM backend implements. `messages` are OpenAI-style
+    chat messages; parse() returns an instance of the pydantic
+    `response_format` model. A backend missing an abstract method fails
+    when it is instantiated, not in the middle of a pipeline.
+    """
+
+    @abstractmethod
+    def chat(self, messages, *, model=DEFAULT_MODEL, temperature=0.0, max_tokens=None):
+        """The assistant's reply text."""
+
+    @abstractmethod
+    def parse(self, messages, response_format, *, model=DEFAULT_MODEL, temperature=0.0):
+        """The reply parsed into a `response_format` instance."""
+
+    async def achat(self, messages, *, model=DEFAULT_MODEL, temperature=0.0, max_tokens=None):
+        return self.chat(messages, model=model, temperature=temperature, max_tokens=max_tokens)
+
+    async def aparse(self, messages, response_format, *, model=DEFAULT_MODEL, temperature=0.0):
+        return self.parse(messages, response_format, model=model, temperature=temperature)
+
+    @abstractmethod
+    def embed(self, texts, *, model=DEFAULT_EMBEDDING_MODEL):
+        """One embedding vector (list of floats) per input text, in order."""
+
+
+def http_limits():
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def http_timeout():
+    return httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    OpenAI (or any OpenAI-compatible server) over pooled keep-alive
+    connections. Every call first takes its share of the cluster-wide
+    request/token budget (see rate_limiter).
+    """
+
+    def __init__(self):
+        options = {
+            "api_key": settings.OPENAI_API_KEY,
+            "base_url": settings.LLM_BASE_URL or None,
+            "max_retries": settings.LLM_MAX_RETRIES,
+        }
+        self.client = OpenAI(
+            http_client=httpx.Client(limits=http_limits(), timeout=http_timeout()), **options
+        )
+        self.async_client = AsyncOpenAI(
+            http_client=httpx.AsyncClient(limits=http_limits(), timeout=http_timeout()), **options
+        )
+
+    def chat(self, messages, *, model=DEFAULT_MODEL, temperature=0.0, max_tokens=None):
+        rate_limiter.acquire(rate_limiter.estimate_tokens(messages, max_tokens))
+        response = self.client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+        )
+        return response.choices[0].message.content or ""
+
+    def parse(self, messages, response_format, *, model=DEFAULT_MODEL, temperature=0.0):
+        rate_limiter.acquire(rate_limiter.estimate_tokens(messages))
+        completion = self.client.chat.completions.parse(
+            model=model, messages=messages, temperature=temperature, response_format=response_format,
+        )
+        return parsed_message(completion)
+
+    async def achat(self, messages, *, model=DEFAULT_MODEL, temperature=0.0, max_tokens=None):
+        await rate_limiter.aacquire(rate_limiter.estimate_tokens(messages, max_tokens))
+        response = await self.async_client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+        )
+        return response.choices[0].message.content or ""
+
+    async def aparse(self, messages, response_format, *, model=DEFAULT_MODEL, temperature=0.0):
+        await rate_limiter.aacquire(rate_limiter.estimate_tokens(messages))
+        completion = await self.async_client.chat.completions.parse(
+            model=model, messages=messages, temperature=temperature, response_format=response_format,
+        )
+        return parsed_message(completion)
+
+    def embed(self, texts, *, model=DEFAULT_EMBEDDING_MODEL):
+        rate_limiter.acquire(sum(len(text) for text in texts) // 4 + 1)
+        response = self.client.embeddings.create(model=model, input=list(texts))
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def parsed_message(completion):
+    message = completion.choices[0].message
+    if message.parsed is None:
+        raise ValueError(f"AI refused to parse document: {message.refusal}")
+    return message.parsed
+
+
+def get_backend():
+    """The process-wide LLM backend (built on first use from LLM_BACKEND)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.LLM_BACKEND)()
+    return _backend
+
+
+def reset_backend():
+    """Drop the cached backend so the next call rebuilds it from settings."""
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def run_async(coroutine):
+    """
+    Run a coroutine on this process's long-lived LLM event loop and wait
+    for the result. A single loop keeps the async connection pool valid
+    across calls (pools are bound to the loop that created them).
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _loop).result()
+
+
+async def gather_limited(coroutines, limit):
+    """asyncio.gather with at most `limit` coroutines in flight; results keep input order."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def limited(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(limited(c) for c in coroutines))
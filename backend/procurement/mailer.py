@@ -0,0 +1,231 @@
+# requests/mailer.py
+"""
+Outbound mail queue.
+
+Tasks build their EmailMessage as before but hand it to `queue_email`
+instead of calling `send()`, which would open an SMTP connection per
+message. Queued messages are stored as OutboundEmail rows and delivered by
+`send_queued_emails` on the dedicated "mail" queue: each run claims a batch
+and sends it over a single connection. A message the server rejects
+outright is marked FAILED without holding up the others. Connection-level
+SMTP errors put the unsent rest of the batch back in the queue and start
+an exponential backoff, stored on the deferred rows: until it has passed,
+no flush (periodic, on-commit or retry) claims anything.
+"""
+import base64
+import logging
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .metrics import increment
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_message(message) -> dict:
+    """JSON-safe copy of an EmailMessage (attachments base64-encoded)."""
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            raise ValueError("Only (filename, content, mimetype) attachments can be queued")
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append({
+            "filename": filename,
+            "content": base64.b64encode(content).decode(),
+            "mimetype": mimetype,
+        })
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": list(message.to),
+        "cc": list(message.cc),
+        "bcc": list(message.bcc),
+        "reply_to": list(message.reply_to),
+        "alternatives": [list(alt) for alt in getattr(message, "alternatives", [])],
+        "attachments": attachments,
+    }
+
+
+def build_message(data: dict, connection=None):
+    message = EmailMultiAlternatives(
+        subject=data["subject"],
+        body=data["body"],
+        from_email=data["from_email"],
+        to=data["to"],
+        cc=data["cc"],
+        bcc=data["bcc"],
+        reply_to=data["reply_to"],
+        connection=connection,
+    )
+    for content, mimetype in data["alternatives"]:
+        message.attach_alternative(content, mimetype)
+    for attachment in data["attachments"]:
+        message.attach(
+            attachment["filename"], base64.b64decode(attachment["content"]), attachment["mimetype"]
+        )
+    return message
+
+
+def schedule_flush():
+    from .tasks import send_queued_emails  # import here to avoid circular imports
+    try:
+        send_queued_emails.apply_async(countdown=settings.MAIL_FLUSH_DELAY)
+    except Exception as exc:
+        # the periodic flush picks the message up
+        logger.warning(f"Could not schedule mail flush: {exc}")
+
+
+def queue_email(message) -> OutboundEmail:
+    """Store `message` for batched delivery; a flush is scheduled on commit."""
+    email = OutboundEmail.objects.create(
+        subject=message.subject,
+        to=list(message.to),
+        message=serialize_message(message),
+    )
+    transaction.on_commit(schedule_flush)
+    return email
+
+
+def backoff_remaining(now=None) -> float:
+    """Seconds left of the current SMTP backoff; 0 when mail may be sent."""
+    now = now or timezone.now()
+    until = OutboundEmail.objects.filter(
+        status="PENDING", deferred_until__gt=now
+    ).aggregate(until=Max("deferred_until"))["until"]
+    return (until - now).total_seconds() if until else 0.0
+
+
+def claim_batch(size: int) -> list:
+    """Mark up to `size` deliverable messages SENDING and return them, oldest first."""
+    now = timezone.now()
+    if backoff_remaining(now):
+        return []
+    stale = now - timedelta(seconds=settings.MAIL_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(status="PENDING") | Q(status="SENDING", claimed_at__lt=stale))
+            .order_by("id")
+            .values_list("id", flat=True)[:size]
+        )
+        OutboundEmail.objects.filter(id__in=ids).update(status="SENDING", claimed_at=now)
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by("id"))
+
+
+def is_rejection(exc) -> bool:
+    """True when the server permanently refused this message (other messages can still go)."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def mark_failed(email, error: str) -> None:
+    OutboundEmail.objects.filter(id=email.id).update(
+        status="FAILED", attempts=email.attempts + 1, last_error=error[:1000]
+    )
+
+
+def release(emails, exc, in_flight=None) -> float:
+    """
+    Put unsent messages back in the queue and back off for
+    MAIL_RETRY_BACKOFF * 2**n seconds (n = connection failures so far).
+    Only `in_flight`, the message being sent when `exc` hit, uses up an
+    attempt; an unreachable server (failed open) is no message's fault.
+    Returns the backoff in seconds.
+    """
+    if not emails:
+        return 0.0
+    deferrals = max(email.deferrals for email in emails) + 1
+    delay = min(settings.MAIL_RETRY_BACKOFF * 2 ** (deferrals - 1), settings.MAIL_RETRY_BACKOFF_MAX)
+    ids = [email.id for email in emails]
+    if in_flight is not None:
+        if in_flight.attempts + 1 >= settings.MAIL_MAX_ATTEMPTS:
+            mark_failed(in_flight, str(exc))
+            ids.remove(in_flight.id)
+        else:
+            OutboundEmail.objects.filter(id=in_flight.id).update(attempts=in_flight.attempts + 1)
+    OutboundEmail.objects.filter(id__in=ids).update(
+        status="PENDING",
+        deferrals=deferrals,
+        deferred_until=timezone.now() + timedelta(seconds=delay),
+        last_error=str(exc)[:1000],
+    )
+    return delay
+
+
+def deliver_batch(size=None):
+    """
+    Claim a batch and send it over one SMTP connection. Returns (sent, failed).
+    Connection-level errors are re-raised after the unsent messages are
+    released into a backoff.
+    """
+    batch = claim_batch(size or settings.MAIL_BATCH_SIZE)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    started = time.monotonic()
+    connection = get_connection()
+    pending = list(batch)
+    in_flight = None
+    try:
+        connection.open()
+        while pending:
+            email = in_flight = pending[0]
+            try:
+                delivered = connection.send_messages([build_message(email.message, connection)])
+            except (smtplib.SMTPException, OSError) as exc:
+                if not is_rejection(exc):
+                    raise
+                mark_failed(email, str(exc))
+                failed += 1
+            else:
+                if delivered:
+                    OutboundEmail.objects.filter(id=email.id).update(
+                        status="SENT", sent_at=timezone.now(), attempts=email.attempts + 1, last_error=""
+                    )
+                    sent += 1
+                else:
+                    mark_failed(email, "No recipients")
+                    failed += 1
+            pending.pop(0)
+            in_flight = None
+    except (smtplib.SMTPException, OSError) as exc:
+        release(pending, exc, in_flight)
+        increment("mail.errors")
+        raise
+    finally:
+        try:
+            connection.close()
+        except (smtplib.SMTPException, OSError):
+            pass
+        elapsed = time.monotonic() - started
+        increment("mail.batches")
+        increment("mail.send_ms", int(elapsed * 1000))
+        if sent:
+            increment("mail.sent", sent)
+        if failed:
+            increment("mail.failed", failed)
+        logger.info(
+            f"Mail batch: {sent} sent, {failed} failed in {elapsed:.2f}s"
+            f" ({sent / elapsed if elapsed else 0:.1f} msg/s)"
+        )
+    return sent, failed
+
+
+def purge_sent_emails() -> int:
+    """Delete sent messages older than MAIL_KEEP_DAYS. Returns the number deleted."""
+    cutoff = timezone.now() - timedelta(days=settings.MAIL_KEEP_DAYS)
+    deleted, _ = OutboundEmail.objects.filter(status="SENT", sent_at__lt=cutoff).delete()
+    return deleted
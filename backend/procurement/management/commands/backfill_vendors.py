@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from procurement.models import PurchaseRequest
+from procurement.vendors import resolve_vendor
+
+
+class Command(BaseCommand):
+    help = "Link existing purchase requests to registered vendors by their extracted vendor name"
+
+    def handle(self, *args, **options):
+        linked = 0
+        pending = PurchaseRequest.objects.filter(vendor__isnull=True).exclude(vendor_name="")
+        for pr_id, vendor_name in pending.values_list("id", "vendor_name").iterator():
+            vendor = resolve_vendor(vendor_name)
+            if vendor:
+                PurchaseRequest.objects.filter(id=pr_id).update(vendor=vendor)
+                linked += 1
+        self.stdout.write(f"Linked {linked} purchase requests to vendors")
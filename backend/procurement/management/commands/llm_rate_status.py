@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from procurement.rate_limiter import utilization
+
+
+class Command(BaseCommand):
+    help = "Show current utilization of the shared OpenAI rate-limit buckets"
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(utilization(), indent=2))
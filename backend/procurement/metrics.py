@@ -0,0 +1,26 @@
+# requests/metrics.py
+from django.db.models import F
+
+from .models import PipelineCounter
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """Atomically add `amount` to the named pipeline counter."""
+    PipelineCounter.objects.get_or_create(name=name)
+    PipelineCounter.objects.filter(name=name).update(value=F("value") + amount)
+
+
+def get_counters(prefix: str) -> dict:
+    """Return {counter_name: value} for every counter starting with `prefix`."""
+    return dict(
+        PipelineCounter.objects.filter(name__startswith=prefix).values_list("name", "value")
+    )
+
+
+def hit_rate(prefix: str) -> float:
+    """Hit ratio for a `<prefix>.hit` / `<prefix>.miss` counter pair."""
+    counters = get_counters(prefix)
+    hits = counters.get(f"{prefix}.hit", 0)
+    misses = counters.get(f"{prefix}.miss", 0)
+    total = hits + misses
+    return hits / total if total else 0.0
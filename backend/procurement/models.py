@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
@@ -42,6 +43,28 @@ class ApprovalLevel(BaseModel):
 
 
 
+# canonical vendors; every spelling seen on a document is a VendorAlias
+class Vendor(models.Model):
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class VendorAlias(models.Model):
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name="aliases")
+    alias = models.CharField(max_length=255)
+    alias_key = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.alias} -> {self.vendor}"
+
+
 class PurchaseRequest(BaseModel):
     STATUS_CHOICES = [
         ("PENDING", "Pending"),
@@ -66,11 +89,18 @@ class PurchaseRequest(BaseModel):
     # Files
     proforma = models.FileField(upload_to="proformas/", null=True, blank=True)
     purchase_order = models.FileField(upload_to="purchase_orders/", null=True, blank=True)
+    # version key of the data the stored PO PDF was rendered from
+    purchase_order_version = models.CharField(max_length=64, blank=True)
+    # purchase_order_version of the PO last queued for emailing to the creator
+    purchase_order_sent_version = models.CharField(max_length=64, blank=True)
     invoice = models.FileField(upload_to="invoices/", null=True, blank=True)
     receipt = models.FileField(upload_to="receipts/", null=True, blank=True)
 
     # AI-extracted data (proforma)
     vendor_name = models.CharField(max_length=255, blank=True)
+    vendor = models.ForeignKey(
+        Vendor, on_delete=models.SET_NULL, null=True, blank=True, related_name="purchase_requests"
+    )
     vendor_address = models.TextField(blank=True)
     items_json = models.JSONField(default=list, blank=True)
     total_amount_extracted = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
@@ -97,6 +127,9 @@ class PurchaseRequest(BaseModel):
         default="PENDING"
     )
     discrepancy_details = models.JSONField(default=dict, blank=True)
+    # PDF report, rendered on first download for the current discrepancy_details
+    discrepancy_report = models.FileField(upload_to="discrepancy_reports/", null=True, blank=True)
+    discrepancy_report_version = models.CharField(max_length=64, blank=True)
 
     # Tolerance thresholds
     amount_tolerance_percent = models.DecimalField(max_digits=5, decimal_places=2, default=5.00)
@@ -104,6 +137,10 @@ class PurchaseRequest(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # keyset (cursor) pagination of the request list
+            models.Index(fields=["created_at", "id"], name="purchase_request_keyset_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.status})"
@@ -129,3 +166,125 @@ class ApprovalAction(BaseModel):
 
     def __str__(self):
         return f"{self.actor} {self.action} at level {self.level}"
+
+
+
+# cached extraction results, keyed by the SHA-256 of the document bytes
+class DocumentExtraction(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    raw_text = models.TextField(blank=True)
+    parsed_json = models.JSONField(default=dict, blank=True)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ["-last_used_at"]
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.hit_count} hits)"
+
+
+# memoized LLM answers to "are these two item names the same product?"
+class ItemEquivalence(models.Model):
+    pair_key = models.CharField(max_length=40, unique=True)
+    name_a = models.CharField(max_length=255)
+    name_b = models.CharField(max_length=255)
+    same = models.BooleanField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ["-last_used_at"]
+
+    def __str__(self):
+        return f"{self.name_a} {'==' if self.same else '!='} {self.name_b}"
+
+
+# cached embedding vectors (float32 bytes) of normalized item names
+class ItemEmbedding(models.Model):
+    name_key = models.CharField(max_length=40, unique=True)
+    name = models.CharField(max_length=255)
+    model = models.CharField(max_length=100)
+    vector = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.model})"
+
+
+# completed stages of a task pipeline, so a retry resumes instead of restarting
+class PipelineCheckpoint(models.Model):
+    request = models.ForeignKey(PurchaseRequest, on_delete=models.CASCADE, related_name="checkpoints")
+    pipeline = models.CharField(max_length=50)
+    stage = models.CharField(max_length=50)
+    input_key = models.CharField(max_length=64)
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("request", "pipeline", "stage")
+
+    def __str__(self):
+        return f"{self.pipeline}:{self.stage} for request {self.request_id}"
+
+
+# outbound email, queued by tasks and sent in batches by the mail worker
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("SENDING", "Sending"),
+        ("SENT", "Sent"),
+        ("FAILED", "Failed"),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING", db_index=True)
+    subject = models.TextField()
+    to = models.JSONField(default=list)
+    message = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # SMTP backoff: connection failures this message was caught in, and when it may go again
+    deferrals = models.PositiveIntegerField(default=0)
+    deferred_until = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+# named counters for pipeline metrics (cache hits/misses, etc.)
+class PipelineCounter(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+
+# learned field coordinates for a recurring vendor document layout
+class VendorTemplate(models.Model):
+    fingerprint = models.CharField(max_length=40, unique=True)
+    vendor_name = models.CharField(max_length=255)
+    vendor_address = models.TextField(blank=True)
+    payment_terms = models.TextField(blank=True)
+    field_map = models.JSONField(default=dict)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["vendor_name"]
+
+    def __str__(self):
+        return f"{self.vendor_name} ({self.fingerprint[:12]})"
@@ -0,0 +1,82 @@
+# requests/purchase_orders.py
+"""
+Render-once, serve-many purchase order PDFs.
+
+The stored PO file is tagged with a version key of the data it was
+rendered from. Generating or downloading a PO for an unchanged request
+returns the stored file; rendering only happens when that data changed
+(or the file is missing).
+"""
+import hashlib
+import json
+import logging
+
+from django.core.files.base import ContentFile
+
+from .models import PurchaseRequest
+from .rendering import render_pdf
+
+logger = logging.getLogger(__name__)
+
+PO_TEMPLATE = "emails/po.html"
+
+
+def po_items(pr):
+    items = []
+    for item in pr.items_json:
+        item_copy = item.copy()
+        item_copy["total_price"] = float(item["price"]) * int(item["quantity"])
+        items.append(item_copy)
+    return items
+
+
+def po_version(pr) -> str:
+    """SHA-256 of every request field that appears on the PO, line items included."""
+    payload = {
+        "template": PO_TEMPLATE,
+        "id": pr.id,
+        "vendor_name": pr.vendor_name,
+        "vendor_address": pr.vendor_address,
+        "payment_terms": getattr(pr, "payment_terms", ""),
+        "approved_at": getattr(pr, "approved_at", None),
+        "total_amount_extracted": pr.total_amount_extracted,
+        "items": pr.items_json,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def stored_purchase_order(pr, version):
+    """Bytes of the stored PO if it was rendered for `version`, else None."""
+    if not pr.purchase_order or pr.purchase_order_version != version:
+        return None
+    try:
+        with pr.purchase_order.open("rb") as stored:
+            return stored.read()
+    except (FileNotFoundError, OSError):
+        logger.warning(f"Stored PO for request {pr.id} is missing, re-rendering")
+        return None
+
+
+def get_purchase_order_pdf(pr):
+    """
+    Return (pdf_bytes, rendered) for the request's PO, rendering and
+    storing it only when no file exists for the current version.
+    """
+    version = po_version(pr)
+    pdf_bytes = stored_purchase_order(pr, version)
+    if pdf_bytes is not None:
+        return pdf_bytes, False
+
+    pdf_bytes = render_pdf(PO_TEMPLATE, {"purchase_request": pr, "items": po_items(pr)})
+
+    # Store the file, then record it with update() so that attaching the PO
+    # does not bump updated_at or overwrite fields changed meanwhile.
+    previous = pr.purchase_order.name if pr.purchase_order else None
+    pr.purchase_order.save(f"PO_{pr.id}.pdf", ContentFile(pdf_bytes), save=False)
+    pr.purchase_order_version = version
+    PurchaseRequest.objects.filter(id=pr.id).update(
+        purchase_order=pr.purchase_order.name, purchase_order_version=version
+    )
+    if previous and previous != pr.purchase_order.name:
+        pr.purchase_order.storage.delete(previous)
+    return pdf_bytes, True
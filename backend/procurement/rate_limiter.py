@@ -0,0 +1,178 @@
+# requests/rate_limiter.py
+"""
+Cluster-wide token bucket for LLM calls, stored in Redis.
+
+Two buckets are kept per deployment: requests per minute and tokens per
+minute. Every worker draws from the same buckets through one atomic Lua
+script, so the combined request rate of all Celery workers stays inside
+the OpenAI budget. Calls that do not fit wait (queue) until the buckets
+refill instead of failing with 429s.
+"""
+import asyncio
+import logging
+import random
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "llm_rate"
+WAITING_KEY = f"{KEY_PREFIX}:waiting"
+
+# KEYS: request bucket, token bucket
+# ARGV: rpm limit, tpm limit, token cost
+# Buckets refill continuously at limit/60s and hold at most `limit`.
+# Returns 0 when both buckets had room (and were charged), otherwise the
+# number of milliseconds until they will.
+ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local limits = {tonumber(ARGV[1]), tonumber(ARGV[2])}
+local costs = {1, tonumber(ARGV[3])}
+local levels = {}
+local wait = 0
+
+for i = 1, 2 do
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or limits[i]
+    local ts = tonumber(state[2]) or now
+    local rate = limits[i] / 60000
+    tokens = math.min(limits[i], tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    local cost = math.min(costs[i], limits[i])
+    if tokens < cost then
+        wait = math.max(wait, math.ceil((cost - tokens) / rate))
+    end
+end
+
+for i = 1, 2 do
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - math.min(costs[i], limits[i])
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], 120000)
+end
+return wait
+"""
+
+_client = None
+_script = None
+
+
+class RateLimitTimeout(Exception):
+    """An LLM call waited longer than LLM_RATE_LIMIT_MAX_WAIT for budget."""
+
+
+def get_redis():
+    global _client, _script
+    if _client is None:
+        _client = redis.Redis.from_url(settings.LLM_RATE_LIMIT_REDIS_URL)
+        _script = _client.register_script(ACQUIRE_SCRIPT)
+    return _client
+
+
+def bucket_keys():
+    return [f"{KEY_PREFIX}:requests", f"{KEY_PREFIX}:tokens"]
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Rough token cost of a call: ~4 characters per prompt token plus the completion budget."""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+    return prompt_chars // 4 + (max_tokens or settings.LLM_RATE_LIMIT_COMPLETION_ESTIMATE)
+
+
+def try_acquire(tokens):
+    """One atomic attempt; returns seconds to wait (0 = admitted). Fails open if Redis is down."""
+    try:
+        get_redis()
+        wait_ms = _script(
+            keys=bucket_keys(),
+            args=[settings.LLM_RATE_LIMIT_RPM, settings.LLM_RATE_LIMIT_TPM, tokens],
+        )
+    except redis.RedisError as e:
+        logger.warning(f"LLM rate limiter unavailable, not limiting: {e}")
+        return 0
+    return int(wait_ms) / 1000
+
+
+def _next_sleep(wait, deadline):
+    if time.monotonic() + wait > deadline:
+        raise RateLimitTimeout(f"LLM budget not available within {settings.LLM_RATE_LIMIT_MAX_WAIT}s")
+    # small jitter so queued workers do not retry in lockstep
+    return wait + random.uniform(0, 0.05)
+
+
+def _waiting(delta):
+    try:
+        get_redis().incrby(WAITING_KEY, delta)
+    except redis.RedisError:
+        pass
+
+
+def acquire(tokens):
+    """Block until the shared buckets admit one request costing `tokens` tokens."""
+    if not settings.LLM_RATE_LIMIT_ENABLED:
+        return
+    wait = try_acquire(tokens)
+    if not wait:
+        return
+
+    deadline = time.monotonic() + settings.LLM_RATE_LIMIT_MAX_WAIT
+    _waiting(1)
+    try:
+        while wait:
+            time.sleep(_next_sleep(wait, deadline))
+            wait = try_acquire(tokens)
+    finally:
+        _waiting(-1)
+
+
+async def aacquire(tokens):
+    """
+    Async acquire(): the blocking Redis calls run in a worker thread and
+    waits use asyncio.sleep, so concurrent coroutines are never serialized
+    behind one another's round trips.
+    """
+    if not settings.LLM_RATE_LIMIT_ENABLED:
+        return
+    wait = await asyncio.to_thread(try_acquire, tokens)
+    if not wait:
+        return
+
+    deadline = time.monotonic() + settings.LLM_RATE_LIMIT_MAX_WAIT
+    await asyncio.to_thread(_waiting, 1)
+    try:
+        while wait:
+            await asyncio.sleep(_next_sleep(wait, deadline))
+            wait = await asyncio.to_thread(try_acquire, tokens)
+    finally:
+        await asyncio.to_thread(_waiting, -1)
+
+
+def utilization():
+    """
+    Current state of the shared buckets:
+    {"requests": {...}, "tokens": {...}, "waiting": n} where each bucket has
+    limit, available and used_pct (share of the per-minute budget in use).
+    """
+    client = get_redis()
+    now = time.time() * 1000
+    report = {}
+    for name, key, limit in (
+        ("requests", bucket_keys()[0], settings.LLM_RATE_LIMIT_RPM),
+        ("tokens", bucket_keys()[1], settings.LLM_RATE_LIMIT_TPM),
+    ):
+        tokens, ts = client.hmget(key, "tokens", "ts")
+        available = float(tokens) if tokens is not None else limit
+        if ts is not None:
+            available = min(limit, available + max(0, now - float(ts)) * limit / 60000)
+        report[name] = {
+            "limit": limit,
+            "available": round(available, 1),
+            "used_pct": round(100 * (1 - available / limit), 1),
+        }
+    report["waiting"] = int(client.get(WAITING_KEY) or 0)
+    return report
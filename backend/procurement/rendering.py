@@ -0,0 +1,97 @@
+# requests/rendering.py
+"""
+PDF render service.
+
+Each worker process keeps one warm renderer: a WeasyPrint
+FontConfiguration (font discovery happens once) and the pre-parsed CSS
+for every PDF template, plus a shared image cache. warm_up() builds it
+at Celery worker start (see procured_payment/celery.py, PDF_WARM_UP) so
+the first task doesn't pay for it either.
+"""
+import logging
+import threading
+import time
+
+from django.template.loader import render_to_string
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+logger = logging.getLogger(__name__)
+
+# HTML template -> stylesheet (under templates/) parsed once per worker
+STYLESHEETS = {
+    "emails/po.html": "pdf/po.css",
+    "emails/matching_report.html": "pdf/matching_report.css",
+}
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+class PDFRenderer:
+    """Renders Django templates to PDF bytes, reusing fonts and stylesheets."""
+
+    def __init__(self):
+        self.font_config = FontConfiguration()
+        self.image_cache = {}
+        self.stylesheets = {}
+        self._lock = threading.Lock()
+
+    def stylesheets_for(self, template_name):
+        css_name = STYLESHEETS.get(template_name)
+        if css_name is None:
+            return []
+        if css_name not in self.stylesheets:
+            with self._lock:
+                if css_name not in self.stylesheets:
+                    self.stylesheets[css_name] = CSS(
+                        string=render_to_string(css_name), font_config=self.font_config
+                    )
+        return [self.stylesheets[css_name]]
+
+    def render(self, template_name, context):
+        """One template + context -> PDF bytes."""
+        html_string = render_to_string(template_name, context)
+        return HTML(string=html_string).write_pdf(
+            stylesheets=self.stylesheets_for(template_name),
+            font_config=self.font_config,
+            cache=self.image_cache,
+        )
+
+    def render_many(self, jobs):
+        """
+        [(template_name, context), ...] -> [pdf_bytes, ...] in order. Just a
+        loop over render(); the saving is the shared fonts and stylesheets.
+        """
+        return [self.render(template_name, context) for template_name, context in jobs]
+
+    def warm_up(self):
+        """Parse every registered stylesheet and lay out a tiny page to load fonts."""
+        for template_name in STYLESHEETS:
+            self.stylesheets_for(template_name)
+        HTML(string="<p>warm-up</p>").write_pdf(font_config=self.font_config)
+
+
+def get_renderer():
+    """The process-wide renderer (built on first use)."""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PDFRenderer()
+    return _renderer
+
+
+def warm_up():
+    """Build and warm this process's renderer; called at Celery worker start."""
+    start = time.perf_counter()
+    get_renderer().warm_up()
+    logger.info(f"PDF renderer warmed up in {time.perf_counter() - start:.2f}s")
+
+
+def render_pdf(template_name, context):
+    return get_renderer().render(template_name, context)
+
+
+def render_pdfs(jobs):
+    return get_renderer().render_many(jobs)
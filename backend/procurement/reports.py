@@ -0,0 +1,110 @@
+# requests/reports.py
+"""
+Lazily rendered discrepancy reports.
+
+The discrepancy email carries an HTML summary and a signed download link;
+the PDF is rendered on the first download and stored, tagged with a hash
+of the discrepancy_details it shows, so later downloads are served from
+storage until matching produces new results.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.urls import reverse
+
+from .models import PurchaseRequest
+from .rendering import render_pdf
+
+REPORT_TEMPLATE = "emails/matching_report.html"
+LINK_SALT = "procurement.discrepancy-report"
+
+
+def report_context(pr):
+    """Template context shared by the summary email and the PDF report."""
+    details = pr.discrepancy_details
+    summary = details.get("summary", {})
+    return {
+        "pr": pr,
+        "staff": pr.created_by,
+        "details": details,
+        "vendor_match": details.get("vendor_match", True),
+        "items": details.get("lines", []),
+        "matched_count": summary.get("matched_count", 0),
+        "issues_count": summary.get("issues_count", 0),
+        "total_items": summary.get("total_items", 0),
+        "po_total": summary.get("po_total") or pr.total_amount_extracted or pr.amount,
+        "receipt_total": summary.get("receipt_total") or "-",
+        "invoice_total": summary.get("invoice_total"),
+        "invoice_items": details.get("invoice_lines", []),
+        "invoice_vendor_match": details.get("invoice_vendor_match", True),
+        "total_issue": next(
+            (issue for issue in details.get("invoice_validation", []) if issue["type"] == "total"), None
+        ),
+    }
+
+
+def report_version(pr) -> str:
+    payload = {"template": REPORT_TEMPLATE, "details": pr.discrepancy_details}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_discrepancy_report_pdf(pr):
+    """
+    Return (pdf_bytes, rendered): the stored report when it matches the
+    current discrepancy_details, otherwise a freshly rendered and stored one.
+    """
+    version = report_version(pr)
+    if pr.discrepancy_report and pr.discrepancy_report_version == version:
+        try:
+            with pr.discrepancy_report.open("rb") as stored:
+                return stored.read(), False
+        except (FileNotFoundError, OSError):
+            pass
+
+    pdf_bytes = render_pdf(REPORT_TEMPLATE, report_context(pr))
+    previous = pr.discrepancy_report.name if pr.discrepancy_report else None
+    pr.discrepancy_report.save(f"3way_report_{pr.id}.pdf", ContentFile(pdf_bytes), save=False)
+    pr.discrepancy_report_version = version
+    PurchaseRequest.objects.filter(id=pr.id).update(
+        discrepancy_report=pr.discrepancy_report.name, discrepancy_report_version=version
+    )
+    if previous and previous != pr.discrepancy_report.name:
+        pr.discrepancy_report.storage.delete(previous)
+    return pdf_bytes, True
+
+
+def report_token(pr) -> str:
+    """
+    Signed token for one report: bound to the request, its creator and the
+    discrepancy results it shows, so new matching results (or a change of
+    owner) invalidate links already sent.
+    """
+    return signing.dumps(
+        {"request": pr.id, "user": pr.created_by_id, "version": report_version(pr)},
+        salt=LINK_SALT,
+    )
+
+
+def verify_report_token(pr, token: str) -> bool:
+    """True if `token` is an unexpired link to `pr`'s current report."""
+    try:
+        data = signing.loads(
+            token, salt=LINK_SALT, max_age=timedelta(days=settings.REPORT_LINK_MAX_AGE_DAYS)
+        )
+    except signing.BadSignature:
+        return False
+    return (
+        data.get("request") == pr.id
+        and data.get("user") == pr.created_by_id
+        and data.get("version") == report_version(pr)
+    )
+
+
+def report_download_url(pr) -> str:
+    """Absolute, signed link to the request's discrepancy report."""
+    path = reverse("purchase-request-discrepancy-report", kwargs={"pk": pr.id})
+    return f"{settings.BACKEND_BASE_URL.rstrip('/')}{path}?token={report_token(pr)}"
@@ -0,0 +1,190 @@
+# requests/rule_parser.py
+"""
+Deterministic fast-path parser for clean text-layer documents.
+
+Finds vendor, line items, total and payment terms with regex/layout
+heuristics over pdfplumber's text and tables, and scores how much it
+trusts the result so callers can fall back to the LLM when unsure.
+"""
+import re
+
+AMOUNT = r"(?:[A-Z]{3}\s*|\$\s*)?\d[\d,]*(?:\.\d+)?"
+CURRENCY_PREFIX = re.compile(r"^(?:[A-Z]{3}|\$)\s*")
+
+TOTAL_LINE = re.compile(
+    rf"^(?:grand\s+)?total(?:\s+amount)?(?:\s+due)?\s*:?\s*(?P<amount>{AMOUNT})\s*$|"
+    rf"^amount\s+due\s*:?\s*(?P<due>{AMOUNT})\s*$",
+    re.IGNORECASE,
+)
+ITEM_LINE = re.compile(
+    rf"^(?:\d+\s+)?(?P<name>[A-Za-z].*?)\s+(?P<quantity>\d+)\s+(?P<price>{AMOUNT})"
+    rf"(?:\s+(?P<amount>{AMOUNT}))?\s*$"
+)
+VENDOR_HEADINGS = re.compile(r"^(?:vendor|supplier|seller|from)(?:\s+information|\s+details)?\s*:?\s*(?P<inline>.*)$", re.IGNORECASE)
+COMPANY_SUFFIX = re.compile(r"\b(?:ltd|limited|inc|llc|plc|sarl|co|company|corp|supplies)\b\.?", re.IGNORECASE)
+PAYMENT_TERMS = re.compile(r"^payment\s+terms?\s*:?\s*(?P<inline>.*)$", re.IGNORECASE)
+NOT_ITEMS = re.compile(r"\b(?:sub\s*total|total|vat|tax|discount|shipping|balance)\b", re.IGNORECASE)
+
+NAME_HEADERS = ("description", "item", "product", "particulars", "designation")
+QUANTITY_HEADERS = ("qty", "quantity")
+PRICE_HEADERS = ("unit price", "unit cost", "price", "rate")
+AMOUNT_HEADERS = ("amount", "total", "line total")
+
+# confidence contributions; a full score needs every field and totals that reconcile.
+# A vendor guessed from the first company-like line (it may be the buyer)
+# counts for little, so it cannot carry a document past RULE_PARSER_MIN_CONFIDENCE.
+WEIGHTS = {"vendor": 0.25, "vendor_guess": 0.05, "items": 0.25, "total": 0.2, "reconciled": 0.3}
+RECONCILE_TOLERANCE = 0.01
+
+
+def parse_amount(value):
+    """'$2,499.00' / 'RWF 1 200' / '770' -> float, or None."""
+    if value is None:
+        return None
+    cleaned = CURRENCY_PREFIX.sub("", str(value).strip()).replace(",", "").replace(" ", "")
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def parse_with_rules(text, tables=None):
+    """
+    Extract the proforma/receipt shape without an LLM.
+    Returns (data, confidence) where confidence is 0.0-1.0.
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    vendor_name, vendor_address, vendor_guessed = find_vendor(lines)
+    items = items_from_tables(tables or []) or items_from_lines(lines)
+    total = find_total(lines, tables or [])
+
+    data = {
+        "vendor_name": vendor_name,
+        "vendor_address": vendor_address,
+        "items": items,
+        "total_amount": total,
+        "payment_terms": find_payment_terms(lines),
+    }
+    return data, score(data, vendor_guessed)
+
+
+def score(data, vendor_guessed=False):
+    """Weighted confidence that the extracted fields are complete and consistent."""
+    confidence = 0.0
+    if data["vendor_name"]:
+        confidence += WEIGHTS["vendor_guess" if vendor_guessed else "vendor"]
+    if data["items"]:
+        confidence += WEIGHTS["items"]
+    if data["total_amount"] is not None:
+        confidence += WEIGHTS["total"]
+        items_sum = sum(item["price"] * item["quantity"] for item in data["items"])
+        if data["items"] and abs(items_sum - data["total_amount"]) <= RECONCILE_TOLERANCE * max(data["total_amount"], 1):
+            confidence += WEIGHTS["reconciled"]
+    return round(confidence, 2)
+
+
+def find_vendor(lines):
+    """
+    (name, address, guessed): the lines under a 'Vendor'/'Supplier' heading,
+    else the first company-like line, with guessed=True.
+    """
+    for i, line in enumerate(lines):
+        match = VENDOR_HEADINGS.match(line)
+        if not match:
+            continue
+        following = [l for l in lines[i + 1:i + 4] if l]
+        if match.group("inline"):
+            return match.group("inline"), following[0] if following else "", False
+        if following:
+            return following[0], following[1] if len(following) > 1 else "", False
+
+    for i, line in enumerate(lines[:15]):
+        if COMPANY_SUFFIX.search(line) and not NOT_ITEMS.search(line):
+            address = lines[i + 1] if i + 1 < len(lines) else ""
+            return line, address, True
+    return "", "", False
+
+
+def find_total(lines, tables):
+    """Grand total from a TOTAL row in a table or a 'Total: ...' line (last one wins)."""
+    total = None
+    for table in tables:
+        for row in table:
+            cells = [cell for cell in row if cell]
+            if len(cells) >= 2 and TOTAL_LINE.match(f"{cells[0]} {cells[-1]}"):
+                total = parse_amount(cells[-1])
+    if total is not None:
+        return total
+
+    for line in lines:
+        match = TOTAL_LINE.match(line)
+        if match:
+            total = parse_amount(match.group("amount") or match.group("due"))
+    return total
+
+
+def find_payment_terms(lines):
+    """Inline 'Payment terms: ...' or the bullet lines under a PAYMENT TERMS heading."""
+    for i, line in enumerate(lines):
+        match = PAYMENT_TERMS.match(line)
+        if not match:
+            continue
+        if match.group("inline"):
+            return match.group("inline")
+        bullets = []
+        for following in lines[i + 1:]:
+            if not following.startswith(("•", "-", "*")):
+                break
+            bullets.append(following.lstrip("•-* "))
+        return "; ".join(bullets)
+    return ""
+
+
+def column_index(header, candidates):
+    for candidate in candidates:
+        for index, cell in enumerate(header):
+            if cell and candidate in cell.lower():
+                return index
+    return None
+
+
+def items_from_tables(tables):
+    """Line items from the first table whose header has description/quantity/price columns."""
+    for table in tables:
+        if not table:
+            continue
+        header = [(cell or "").strip() for cell in table[0]]
+        name_col = column_index(header, NAME_HEADERS)
+        qty_col = column_index(header, QUANTITY_HEADERS)
+        price_col = column_index(header, PRICE_HEADERS)
+        if None in (name_col, qty_col, price_col):
+            continue
+
+        items = []
+        for row in table[1:]:
+            name = (row[name_col] or "").strip().split("\n")[0]
+            quantity = parse_amount(row[qty_col])
+            price = parse_amount(row[price_col])
+            if not name or quantity is None or price is None or NOT_ITEMS.search(name):
+                continue
+            items.append({"name": name, "price": price, "quantity": int(quantity)})
+        if items:
+            return items
+    return []
+
+
+def items_from_lines(lines):
+    """Line items from rows shaped like '<name> <qty> <unit price> [<amount>]'."""
+    items = []
+    for line in lines:
+        match = ITEM_LINE.match(line)
+        if not match or NOT_ITEMS.search(match.group("name")):
+            continue
+        quantity = int(match.group("quantity"))
+        price = parse_amount(match.group("price"))
+        amount = parse_amount(match.group("amount"))
+        # a trailing amount must agree with qty x price, otherwise this is not an item row
+        if amount is not None and abs(amount - quantity * price) > RECONCILE_TOLERANCE * max(amount, 1):
+            continue
+        items.append({"name": match.group("name").strip(), "price": price, "quantity": quantity})
+    return items
@@ -0,0 +1,94 @@
+# requests/schemas.py
+"""
+Pydantic models for structured document extraction.
+
+The same shape covers proformas, receipts and invoices. The models double
+as the JSON schema sent to OpenAI's structured-output mode, so every field
+is required (nullable where a value may be absent) and values are coerced
+("$1,200.00" -> 1200.0, "2 pcs" -> 2) before validation.
+"""
+import re
+from typing import Optional
+
+from pydantic import BaseModel, field_validator
+
+from .rule_parser import parse_amount
+
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def to_number(value):
+    """Pull a number out of '$1,200.00', 'RWF 1 200', ' 2 pcs ', 2.0, ..."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    # amounts parse like the rule parser's (currency prefix, ',' or ' ' thousands)
+    amount = parse_amount(value)
+    if amount is not None:
+        return amount
+    match = NUMBER.search(str(value).replace(",", ""))
+    if not match:
+        raise ValueError(f"not a number: {value!r}")
+    return float(match.group())
+
+
+class ExtractedItem(BaseModel):
+    name: str
+    price: float
+    quantity: int
+
+    @field_validator("name", mode="before")
+    @classmethod
+    def clean_name(cls, value):
+        return str(value or "").strip()
+
+    @field_validator("price", mode="before")
+    @classmethod
+    def coerce_price(cls, value):
+        return to_number(value) or 0.0
+
+    @field_validator("quantity", mode="before")
+    @classmethod
+    def coerce_quantity(cls, value):
+        return int(round(to_number(value) or 0))
+
+
+class ExtractedDocument(BaseModel):
+    vendor_name: str
+    vendor_address: str
+    items: list[ExtractedItem]
+    total_amount: Optional[float]
+    payment_terms: str
+
+    @field_validator("vendor_name", "vendor_address", "payment_terms", mode="before")
+    @classmethod
+    def blank_if_missing(cls, value):
+        return str(value or "").strip()
+
+    @field_validator("items", mode="before")
+    @classmethod
+    def list_if_missing(cls, value):
+        return value or []
+
+    @field_validator("total_amount", mode="before")
+    @classmethod
+    def coerce_total(cls, value):
+        return to_number(value) if value not in (None, "") else None
+
+
+def validate_extraction(data):
+    """Normalize any parser's output dict to the ExtractedDocument shape and types."""
+    return ExtractedDocument.model_validate({
+        field: data.get(field) for field in ExtractedDocument.model_fields
+    }).model_dump()
+
+
+class ItemPair(BaseModel):
+    po_index: int
+    receipt_index: int
+
+
+class ItemAssignment(BaseModel):
+    """One-call answer to "which PO line is which receipt line"."""
+    pairs: list[ItemPair]
+    unmatched_po: list[int]
+    unmatched_receipt: list[int]
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from Users.user_serializer import UserSerializer
 from .models import PurchaseRequest
+from .document_processing import detect_document_format
 
 class PurchaseRequestSerializer(serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
@@ -18,13 +19,15 @@ class PurchaseRequestSerializer(serializers.ModelSerializer):
             'purchase_order', 'purchase_order_url',
             'invoice', 'invoice_url',
             'receipt', 'receipt_url',
-            'vendor_name', 'items_json', 'extraction_status',
+            'vendor_name', 'vendor', 'items_json', 'extraction_status',
+            'invoice_vendor_name', 'invoice_items_json', 'invoice_total', 'invoice_extraction_status',
             'three_way_match_status', 'discrepancy_details',
             'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'status', 'created_by', 'current_level',
-            'vendor_name', 'items_json', 'extraction_status',
+            'vendor_name', 'vendor', 'items_json', 'extraction_status',
+            'invoice_vendor_name', 'invoice_items_json', 'invoice_total', 'invoice_extraction_status',
             'purchase_order', 'invoice',
             'three_way_match_status', 'discrepancy_details',
             'created_at', 'updated_at'
@@ -71,6 +74,11 @@ class ReceiptUploadSerializer(serializers.Serializer):
         ext = value.name.split('.')[-1].lower()
         if ext not in ['pdf', 'jpg', 'jpeg', 'png']:
             raise serializers.ValidationError("Only PDF, JPG, or PNG allowed.")
+        value.seek(0)
+        head = value.read(1024)
+        value.seek(0)
+        if detect_document_format(head) == "unknown":
+            raise serializers.ValidationError("File content is not a valid PDF, JPG, or PNG.")
         return value
 
 class ApprovalActionSerializer(serializers.Serializer):
@@ -0,0 +1,199 @@
+# requests/similarity.py
+"""
+Local fuzzy matching for item and vendor names.
+
+Names are normalized (accents, punctuation, case, units such as
+"500 ML" -> "500ml", "1 L" -> "1000ml", "pieces" -> "pc"), then scored
+with token-set and character-trigram similarity. Scores above
+ITEM_MATCH_ACCEPT are matches, below ITEM_MATCH_REJECT non-matches; only
+the band in between needs the LLM.
+"""
+import re
+
+import numpy as np
+
+from django.conf import settings
+
+from .utils import normalize_text
+
+# unit spelling -> (canonical unit, multiplier to it)
+UNITS = {
+    "mg": ("mg", 1), "g": ("g", 1), "gr": ("g", 1), "gram": ("g", 1), "grams": ("g", 1),
+    "kg": ("g", 1000), "kgs": ("g", 1000), "kilo": ("g", 1000), "kilos": ("g", 1000),
+    "kilogram": ("g", 1000), "kilograms": ("g", 1000),
+    "ml": ("ml", 1), "cl": ("ml", 10), "l": ("ml", 1000), "lt": ("ml", 1000), "ltr": ("ml", 1000),
+    "litre": ("ml", 1000), "litres": ("ml", 1000), "liter": ("ml", 1000), "liters": ("ml", 1000),
+    "mm": ("mm", 1), "cm": ("mm", 10), "m": ("mm", 1000), "meter": ("mm", 1000), "metre": ("mm", 1000),
+    "in": ("in", 1), "inch": ("in", 1), "inches": ("in", 1),
+    "mb": ("mb", 1), "gb": ("mb", 1024), "tb": ("mb", 1024 * 1024),
+    "w": ("w", 1), "kw": ("w", 1000), "v": ("v", 1),
+}
+COUNT_WORDS = {
+    "pc": "pc", "pcs": "pc", "piece": "pc", "pieces": "pc", "unit": "pc", "units": "pc",
+    "pk": "pack", "pkt": "pack", "pack": "pack", "packs": "pack", "packet": "pack",
+    "box": "box", "boxes": "box", "bx": "box", "ream": "ream", "reams": "ream",
+}
+# spelling variants that should not count as a difference
+SYNONYMS = {
+    "limited": "ltd", "incorporated": "inc", "company": "co", "corporation": "corp",
+    "and": "&", "nos": "no", "number": "no",
+}
+# highest score two names with different model numbers can get locally
+CODE_MISMATCH_CAP = 0.6
+MEASURE = re.compile(r"\b(\d+(?:\.\d+)?)\s*([a-z]+)\b")
+
+
+def _canonical_measure(match):
+    amount, unit = float(match.group(1)), match.group(2)
+    if unit in UNITS:
+        base, factor = UNITS[unit]
+        value = amount * factor
+        return f"{value:g}{base}"
+    if unit in COUNT_WORDS:
+        return f"{amount:g}{COUNT_WORDS[unit]}"
+    return match.group(0)
+
+
+def normalize_item_name(name: str) -> str:
+    """normalize_text plus canonical units and quantities ("2 Pieces" -> "2pc")."""
+    text = normalize_text(name)
+    # normalize_text splits "1.5" into "1 5"; put decimals back together first
+    text = re.sub(r"(?<=\d) (?=\d+\s*[a-z])", ".", text) if re.search(r"\d\.\d", name or "") else text
+    text = MEASURE.sub(_canonical_measure, text)
+    tokens = (COUNT_WORDS.get(token, token) for token in text.split())
+    return " ".join(SYNONYMS.get(token, token) for token in tokens)
+
+
+CANONICAL_UNITS = {unit for unit, _ in UNITS.values()} | set(COUNT_WORDS.values())
+MEASURE_TOKEN = re.compile(r"\d+(?:\.\d+)?([a-z]+)")
+
+
+def measures(tokens):
+    """Tokens that are an amount with a unit, e.g. {'500ml', '2pc'}."""
+    return {
+        token for token in tokens
+        if (match := MEASURE_TOKEN.fullmatch(token)) and match.group(1) in CANONICAL_UNITS
+    }
+
+
+def codes(tokens):
+    """Model/part numbers: tokens with a digit that are not measures ('85a', '5420')."""
+    return {token for token in tokens if any(c.isdigit() for c in token)} - measures(tokens)
+
+
+def token_set_similarity(a: set, b: set) -> float:
+    """Dice overlap of two token sets."""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def contains(a: set, b: set) -> bool:
+    """One token set strictly contains the other ("laptop" / "laptop bag")."""
+    return a != b and (a <= b or b <= a)
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def ngram_similarity(a: str, b: str) -> float:
+    """Dice coefficient over character trigrams; tolerant of typos and joins."""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def name_similarity(name1: str, name2: str) -> float:
+    """0-1 similarity of two item/vendor names, order-independent."""
+    norm1, norm2 = normalize_item_name(name1), normalize_item_name(name2)
+    if not norm1 or not norm2:
+        return 0.0
+    if norm1 == norm2:
+        return 1.0
+    tokens1, tokens2 = set(norm1.split()), set(norm2.split())
+
+    # different sizes of the same product ("500ml" vs "1000ml") are different items
+    size1, size2 = measures(tokens1), measures(tokens2)
+    if size1 and size2 and not size1 & size2:
+        return 0.0
+
+    # "Laptop" vs "Laptop bag" is either the same product with an extra word
+    # or an accessory of it; only the LLM can tell, so containment always
+    # scores strictly inside the uncertain band, ordered by token overlap
+    if contains(tokens1, tokens2):
+        low, high = settings.ITEM_MATCH_REJECT, settings.ITEM_MATCH_ACCEPT
+        return low + (high - low) * token_set_similarity(tokens1, tokens2)
+
+    sorted1, sorted2 = " ".join(sorted(tokens1)), " ".join(sorted(tokens2))
+    score = max(token_set_similarity(tokens1, tokens2), ngram_similarity(sorted1, sorted2))
+
+    # "Latitude 5420" vs "Latitude 5430" look alike but are different models;
+    # never accept those locally
+    code1, code2 = codes(tokens1), codes(tokens2)
+    if code1 and code2 and not code1 & code2:
+        score = min(score, CODE_MISMATCH_CAP)
+    return score
+
+
+def local_decision(name1: str, name2: str):
+    """True / False when the score is decisive, None when the LLM should decide."""
+    score = name_similarity(name1, name2)
+    if score >= settings.ITEM_MATCH_ACCEPT:
+        return True
+    if score <= settings.ITEM_MATCH_REJECT:
+        return False
+    return None
+
+
+def optimal_assignment(scores):
+    """
+    Globally optimal one-to-one assignment maximizing the total score
+    (Hungarian algorithm, O(n^2 m)). `scores` is an n x m array; returns
+    (row, col) pairs for min(n, m) rows/columns.
+    """
+    scores = np.asarray(scores, dtype=float)
+    if scores.size == 0:
+        return []
+    transposed = scores.shape[0] > scores.shape[1]
+    cost = -(scores.T if transposed else scores)
+    n, m = cost.shape
+
+    # potentials and matching use 1-based indices; column 0 is a sentinel
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for row in range(1, n + 1):
+        match[0] = row
+        col0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col0] = True
+            row0 = match[col0]
+            free = ~used[1:]
+            reduced = cost[row0 - 1] - u[row0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = col0
+            candidates = np.where(free, minv[1:], np.inf)
+            col1 = int(np.argmin(candidates)) + 1
+            delta = candidates[col1 - 1]
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            col0 = col1
+            if match[col0] == 0:
+                break
+        while col0:
+            col1 = way[col0]
+            match[col0] = match[col1]
+            col0 = col1
+
+    pairs = [(int(match[col]) - 1, col - 1) for col in range(1, m + 1) if match[col]]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
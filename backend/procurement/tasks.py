@@ -1,17 +1,23 @@
 from celery import shared_task
-from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage,EmailMultiAlternatives,send_mail
 from django.template.loader import render_to_string
-from django.core.mail import EmailMessage,send_mail
 from django.db import transaction
 from django.conf import settings
-from weasyprint import HTML
 
 # Local imports
 from .models import PurchaseRequest
-from .document_processing import extract_text_from_any_pdf, parse_with_ai
-from .ai_matching import are_items_same
+from .document_processing import extract_and_parse
+from .purchase_orders import get_purchase_order_pdf
+from .reports import report_context, report_download_url
+from .extraction_cache import purge_extraction_cache as _purge_extraction_cache
+from .item_equivalence import purge_item_equivalences as _purge_item_equivalences
+from .vendors import resolve_vendor, same_vendor
+from .discrepancy import compare_totals, match_document, summarize
+from .checkpoints import Checkpoints, input_key, purge_checkpoints as _purge_checkpoints
+from .mailer import backoff_remaining, deliver_batch, queue_email, purge_sent_emails as _purge_sent_emails
 
 import logging
+import smtplib
 
 
 
@@ -25,14 +31,13 @@ def process_proforma(request_id):
     pr = PurchaseRequest.objects.get(id=request_id)
     
     try:
-        raw_text = extract_text_from_any_pdf(pr.proforma)
+        # Extract + parse with AI (served from cache for identical documents)
+        raw_text, structured_data = extract_and_parse(pr.proforma)
         logger.info(f"Extracted {len(raw_text)} characters from request {request_id}")
         
-        # Parse with AI
-        structured_data = parse_with_ai(raw_text)
-        
         # Save results
         pr.vendor_name = structured_data.get("vendor_name", "")[:255]
+        pr.vendor = resolve_vendor(pr.vendor_name)
         pr.vendor_address = structured_data.get("vendor_address", "")
         pr.items_json = structured_data.get("items", [])
         pr.total_amount_extracted = structured_data.get("total_amount")
@@ -51,6 +56,108 @@ def process_proforma(request_id):
     pr.save()
 
 
+def invoice_extraction(pr, checkpoints=None):
+    """
+    The invoice's parsed data for matching: the stored extraction when
+    process_invoice already ran, otherwise a (cached) extraction of the
+    uploaded file. None when no invoice has been uploaded, and
+    {"extraction_failed": True, ...} when the invoice cannot be read, so
+    an unreadable invoice never aborts the PO/receipt comparison.
+    """
+    if pr.invoice_extraction_status == "SUCCESS":
+        return {
+            "vendor_name": pr.invoice_vendor_name,
+            "items": pr.invoice_items_json,
+            "total_amount": pr.invoice_total,
+        }
+    if not pr.invoice:
+        return None
+    if pr.invoice_extraction_status == "FAILED":
+        # process_invoice already tried; don't pay for another extraction
+        return {"extraction_failed": True, "error": "Invoice extraction failed"}
+    try:
+        _, data = extract_and_parse(pr.invoice, checkpoints=checkpoints)
+    except Exception as e:
+        logger.error(f"Invoice extraction failed for request {pr.id}: {str(e)[:300]}")
+        return {"extraction_failed": True, "error": str(e)[:300]}
+    return data
+
+
+@shared_task
+def process_invoice(request_id):
+    """
+    Extract the uploaded invoice, then re-run matching so the PO, receipt
+    and invoice are compared together.
+    """
+    pr = PurchaseRequest.objects.get(id=request_id)
+
+    try:
+        raw_text, structured_data = extract_and_parse(pr.invoice)
+        logger.info(f"Extracted {len(raw_text)} characters from invoice of request {request_id}")
+
+        pr.invoice_vendor_name = (structured_data.get("vendor_name") or "")[:255]
+        pr.invoice_items_json = structured_data.get("items", [])
+        pr.invoice_total = structured_data.get("total_amount")
+        pr.invoice_extraction_status = "SUCCESS"
+    except Exception as e:
+        logger.error(f"Invoice extraction failed for {request_id}: {str(e)[:300]}")
+        pr.invoice_extraction_status = "FAILED"
+
+    # only this task's fields: matching may have saved results meanwhile
+    pr.save(update_fields=[
+        "invoice_vendor_name", "invoice_items_json", "invoice_total", "invoice_extraction_status",
+        "updated_at",
+    ])
+
+    if pr.invoice_extraction_status == "SUCCESS" and pr.receipt:
+        validate_receipt.delay(request_id)
+
+
+@shared_task
+def purge_extraction_cache():
+    """Periodic eviction of stale/overflowing extraction cache entries."""
+    return _purge_extraction_cache()
+
+
+@shared_task
+def purge_checkpoints():
+    """Periodic eviction of checkpoints left behind by runs that never completed."""
+    return _purge_checkpoints()
+
+
+@shared_task
+def purge_item_equivalences():
+    """Periodic eviction of stale/overflowing item-equivalence memo entries."""
+    return _purge_item_equivalences()
+
+
+@shared_task
+def send_queued_emails():
+    """
+    Deliver queued emails in batches over one SMTP connection (routed to the
+    "mail" queue). After an SMTP error one follow-up flush is scheduled for
+    when the backoff ends; other flushes are no-ops until then.
+    """
+    try:
+        sent, failed = deliver_batch()
+    except (smtplib.SMTPException, OSError) as exc:
+        delay = backoff_remaining()
+        logger.warning(f" Mail batch failed ({exc}), backing off for {delay:.0f}s")
+        send_queued_emails.apply_async(countdown=delay)
+        return 0
+
+    # A full batch means more may be waiting
+    if sent + failed >= settings.MAIL_BATCH_SIZE:
+        send_queued_emails.apply_async()
+    return sent
+
+
+@shared_task
+def purge_sent_emails():
+    """Periodic cleanup of delivered outbound emails."""
+    return _purge_sent_emails()
+
+
 
 
 
@@ -65,24 +172,16 @@ def generate_purchase_order(request_id):
         if pr.status != "APPROVED":
             logger.warning(f"Skipping PO generation for non-approved request {request_id}")
             return
-        items_with_totals = []
-        for item in pr.items_json:
-            item_copy = item.copy()
-            item_copy["total_price"] = float(item["price"]) * int(item["quantity"])
-            items_with_totals.append(item_copy)
-
 
-        # Render Template → HTML string
-        html_string = render_to_string("emails/po.html", {"purchase_request": pr,"items": items_with_totals,})
-
-        #  Convert HTML → PDF bytes
-        pdf_bytes = HTML(string=html_string).write_pdf()
-
-        # Save PDF to model field
+        # Served from the stored PO when the request data is unchanged
+        pdf_bytes, rendered = get_purchase_order_pdf(pr)
         filename = f"PO_{pr.id}.pdf"
-        pr.purchase_order.save(filename, ContentFile(pdf_bytes), save=True)
+        if pr.purchase_order_sent_version == pr.purchase_order_version:
+            logger.info(f" Purchase Order for request {request_id} is up to date, not re-sent")
+            return
 
-        # Email the PDF to request creator
+        # Email the PDF to request creator (also when an earlier run stored
+        # the PDF but failed to queue the email)
         if pr.created_by and pr.created_by.email:
             email = EmailMessage(
                 subject=f"Purchase Order #{pr.id} Approved",
@@ -96,28 +195,103 @@ def generate_purchase_order(request_id):
             )
 
             email.attach(filename, pdf_bytes, "application/pdf")
-            email.send()
+            with transaction.atomic():
+                queue_email(email)
+                PurchaseRequest.objects.filter(id=pr.id).update(
+                    purchase_order_sent_version=pr.purchase_order_version
+                )
 
-            logger.info(f" PO emailed to {pr.created_by.email}")
+            logger.info(f" PO email to {pr.created_by.email} queued")
 
         logger.info(f" Purchase Order generated and emailed for request {request_id}")
 
     except Exception as e:
+        # A failed render leaves any previously stored PO (and its version) in place
         logger.error(f" PO generation failed for request {request_id}: {e}")
 
-        # Clean-up fallback: remove invalid PO file
-        try:
-            pr = PurchaseRequest.objects.get(id=request_id)
-            pr.purchase_order = None
-            pr.save()
-        except:
-            pass
 
 
 
 
 
 
+def match_documents(pr, receipt_data, invoice_data, po_total, price_tolerance, quantity_tolerance):
+    """
+    Vendor and line-item comparison of the PO against the receipt and,
+    when present, the invoice. Returns {"details": ..., "discrepancies": [...]}.
+    """
+    po_items = pr.items_json
+    po_vendor = pr.vendor_name or ""
+
+    # 3. COMPARE VENDORS (both names resolve to a registered vendor; only the
+    # PO side registers new vendors)
+    receipt_vendor = (receipt_data.get("vendor_name") or "").strip()
+    if pr.vendor is None and po_vendor:
+        pr.vendor = resolve_vendor(po_vendor)
+        PurchaseRequest.objects.filter(id=pr.id).update(vendor=pr.vendor)
+    vendor_match = same_vendor(pr.vendor, resolve_vendor(receipt_vendor, create=False))
+
+    # 4. COMPARE ITEMS WITH AI SEMANTIC MATCHING
+    # (one matching call per document, tolerance checks for every line)
+    receipt_items = receipt_data.get("items", [])
+    result = match_document(po_items, receipt_items, price_tolerance, quantity_tolerance)
+    discrepancies = list(result["discrepancies"])
+    details = {
+        "receipt_validation": result["issues"],
+        "lines": result["lines"],
+        "vendor_match": vendor_match,
+        "po_vendor": po_vendor,
+        "receipt_vendor": receipt_vendor,
+        "receipt_items_raw": receipt_items,
+    }
+
+    # document-level issues, counted in the summary alongside the line issues
+    findings = [] if vendor_match else ["vendor_mismatch"]
+    invoice_total, invoice_lines = None, []
+    if invoice_data is not None and invoice_data.get("extraction_failed"):
+        discrepancies.append("invoice_extraction_failed")
+        findings.append("invoice_extraction_failed")
+        details.update({
+            "invoice_extraction_failed": True,
+            "invoice_validation": [{
+                "type": "invoice_extraction_failed",
+                "document": "invoice",
+                "error": invoice_data.get("error", ""),
+            }],
+        })
+    elif invoice_data is not None:
+        invoice_vendor = (invoice_data.get("vendor_name") or "").strip()
+        invoice_total = invoice_data.get("total_amount")
+        invoice_result = match_document(
+            po_items, invoice_data.get("items", []), price_tolerance, quantity_tolerance,
+            document="invoice",
+        )
+        invoice_issues = invoice_result["issues"]
+        invoice_lines = invoice_result["lines"]
+        total_issue = compare_totals(po_total, invoice_total, price_tolerance)
+        if total_issue:
+            invoice_issues.append(total_issue)
+            discrepancies.append("total_mismatch")
+            findings.append("total_mismatch")
+        invoice_vendor_match = same_vendor(pr.vendor, resolve_vendor(invoice_vendor, create=False))
+        if not invoice_vendor_match:
+            discrepancies.append("invoice_vendor_mismatch")
+            findings.append("invoice_vendor_mismatch")
+        discrepancies += invoice_result["discrepancies"]
+        details.update({
+            "invoice_validation": invoice_issues,
+            "invoice_lines": invoice_lines,
+            "invoice_vendor_match": invoice_vendor_match,
+            "invoice_vendor": invoice_vendor,
+        })
+
+    details["summary"] = summarize(
+        result["lines"], po_total, receipt_data.get("total_amount"), invoice_total,
+        invoice_lines=invoice_lines, findings=findings,
+    )
+
+    return {"details": details, "discrepancies": discrepancies}
+
 
 @shared_task(bind=True, max_retries=2)
 def validate_receipt(self, request_id):
@@ -125,12 +299,16 @@ def validate_receipt(self, request_id):
     Performs intelligent 3-way matching between:
     - Purchase Order (from proforma AI extraction)
     - Receipt (uploaded by staff)
+    - Invoice (uploaded by finance), when there is one
     
     Implements Payhawk-style matching with:
     - AI semantic item comparison
     - Custom discrepancy thresholds (±5% price, ±10% quantity)
     - Vendor matching
     - Email alerts on discrepancies
+
+    Document extractions come from the extraction cache, so re-running the
+    match (e.g. after the invoice arrives) does not re-extract anything.
     """
     try:
         pr = PurchaseRequest.objects.get(id=request_id)
@@ -139,107 +317,35 @@ def validate_receipt(self, request_id):
             logger.warning(f"No receipt uploaded for request {request_id}")
             return
 
-        # 1. EXTRACT DATA FROM RECEIPT USING AI-DRIVEN OCR
-        receipt_text = extract_text_from_any_pdf(pr.receipt)
-        receipt_data = parse_with_ai(receipt_text)
+        # Completed stages (raw text, parsed documents, match result) are
+        # checkpointed so a retry resumes where the failed attempt stopped
+        checkpoints = Checkpoints(request_id, "validate_receipt")
+
+        # 1. EXTRACT DATA FROM RECEIPT (AND INVOICE) USING AI-DRIVEN OCR
+        receipt_text, receipt_data = extract_and_parse(
+            pr.receipt, checkpoints=checkpoints.for_document("receipt")
+        )
+        invoice_data = invoice_extraction(pr, checkpoints=checkpoints.for_document("invoice"))
         
         # 2. GET PO DATA (FROM PROFORMA AI EXTRACTION)
         po_items = pr.items_json 
         po_vendor = pr.vendor_name or ""
         po_total = pr.total_amount_extracted or pr.amount
+        price_tolerance = float(pr.amount_tolerance_percent)
+        quantity_tolerance = float(pr.quantity_tolerance_percent)
 
-        # 3. COMPARE VENDOR NAMES
-        receipt_vendor = (receipt_data.get("vendor_name") or "").strip()
-        vendor_match = False
-        if po_vendor and receipt_vendor:
-            vendor_match = are_items_same(po_vendor, receipt_vendor)
-
-        # 4. COMPARE ITEMS WITH AI SEMANTIC MATCHING
-        discrepancies = []
-        all_item_issues = []
-        receipt_items = receipt_data.get("items", [])
-        matched_receipt_items = set()
-
-        # Match PO items to receipt items
-        for po_item in po_items:
-            po_name = po_item.get("name", "").strip()
-            po_price = float(po_item.get("price", 0))
-            po_qty = int(po_item.get("quantity", 0))
-            
-            if not po_name:
-                continue
-
-            matched = False
-            for rcpt_idx, rcpt_item in enumerate(receipt_items):
-                if rcpt_idx in matched_receipt_items:
-                    continue
-                    
-                rcpt_name = rcpt_item.get("name", "").strip()
-                rcpt_price = float(rcpt_item.get("price", 0))
-                rcpt_qty = int(rcpt_item.get("quantity", 0))
-                
-                if not rcpt_name:
-                    continue
-
-                #  AI SEMANTIC MATCHING
-                if are_items_same(po_name, rcpt_name):
-                    matched = True
-                    matched_receipt_items.add(rcpt_idx)
-                    
-                    # Validate price tolerance (±5%)
-                    price_ok = True
-                    if po_price > 0:
-                        price_diff_pct = abs(po_price - rcpt_price) / po_price * 100
-                        if price_diff_pct > float(pr.amount_tolerance_percent):
-                            price_ok = False
-                            all_item_issues.append({
-                                "type": "price",
-                                "item": po_name,
-                                "expected_price": po_price,
-                                "received_price": rcpt_price,
-                                "tolerance_pct": float(pr.amount_tolerance_percent),
-                                "difference_pct": round(price_diff_pct, 2)
-                            })
-                    
-                    # Validate quantity tolerance (±10%)
-                    qty_ok = True
-                    if po_qty > 0:
-                        qty_diff_pct = abs(po_qty - rcpt_qty) / po_qty * 100
-                        if qty_diff_pct > float(pr.quantity_tolerance_percent):
-                            qty_ok = False
-                            all_item_issues.append({
-                                "type": "quantity",
-                                "item": po_name,
-                                "expected_quantity": po_qty,
-                                "received_quantity": rcpt_qty,
-                                "tolerance_pct": float(pr.quantity_tolerance_percent),
-                                "difference_pct": round(qty_diff_pct, 2)
-                            })
-                    
-                    if not (price_ok and qty_ok):
-                        discrepancies.append("item_mismatch")
-                    break
-
-            if not matched:
-                discrepancies.append("missing_item")
-                all_item_issues.append({
-                    "type": "missing_item",
-                    "item": po_name,
-                    "expected": f"{po_qty} units @ ${po_price}",
-                    "message": "Item not found in receipt"
-                })
-
-        # Check for extra items in receipt
-        for rcpt_idx, rcpt_item in enumerate(receipt_items):
-            if rcpt_idx not in matched_receipt_items:
-                rcpt_name = rcpt_item.get("name", "").strip()
-                if rcpt_name:
-                    discrepancies.append("extra_item")
-                    all_item_issues.append({
-                        "type": "extra_item",
-                        "item": rcpt_name,
-                        "message": "Item in receipt not found in purchase order"
-                    })
+        # 3-4. MATCH VENDORS AND ITEMS (see match_documents)
+        match_key = input_key(
+            po_items, po_vendor, po_total, price_tolerance, quantity_tolerance,
+            receipt_data, invoice_data,
+        )
+        match = checkpoints.load("match", match_key)
+        if match is None:
+            match = match_documents(
+                pr, receipt_data, invoice_data, po_total, price_tolerance, quantity_tolerance
+            )
+            checkpoints.save("match", match_key, match)
+        details, discrepancies = match["details"], match["discrepancies"]
 
         # 5. UPDATE MATCHING STATUS
         with transaction.atomic():
@@ -247,20 +353,20 @@ def validate_receipt(self, request_id):
             
             if discrepancies:
                 pr.three_way_match_status = "DISCREPANCY"
-                pr.discrepancy_details = {
-                    "receipt_validation": all_item_issues,
-                    "vendor_match": vendor_match,
-                    "po_vendor": po_vendor,
-                    "receipt_vendor": receipt_vendor,
-                    "receipt_items_raw": receipt_items
-                }
+                pr.discrepancy_details = details
                 pr.save()
                 send_discrepancy_email_task.delay(request_id)
             else:
                 pr.three_way_match_status = "MATCHED"
-                pr.discrepancy_details = {"vendor_match": vendor_match}
+                pr.discrepancy_details = {
+                    key: details[key]
+                    for key in ("vendor_match", "lines", "invoice_lines", "summary")
+                    if key in details
+                }
                 pr.save()
 
+        checkpoints.clear()
+
         logger.info(
             f" 3-way matching completed for request {request_id}. "
             f"Status: {pr.three_way_match_status}, Issues: {len(discrepancies)}"
@@ -279,6 +385,9 @@ def validate_receipt(self, request_id):
         except Exception as save_exc:
             logger.error(f"Failed to update matching status: {save_exc}")
 
+        if self.request.retries >= self.max_retries:
+            # no retry will resume from the saved stages
+            Checkpoints(request_id, "validate_receipt").clear()
         raise self.retry(exc=exc, countdown=60)
     
 
@@ -286,11 +395,10 @@ def validate_receipt(self, request_id):
 @shared_task(bind=True, max_retries=3)
 def send_discrepancy_email_task(self, request_id):
     """
-    Generates a beautifully formatted PDF discrepancy report and emails it.
+    Emails a compact HTML summary of the discrepancies with a signed link
+    to the full PDF report, which is rendered on first download.
     """
     try:
-       
-
         pr = PurchaseRequest.objects.get(id=request_id)
         staff = pr.created_by
         
@@ -298,94 +406,29 @@ def send_discrepancy_email_task(self, request_id):
             logger.warning(f"No email for staff on request {request_id}")
             return
 
-        details = pr.discrepancy_details
-        receipt_items = {item.get("name", "").lower(): item for item in details.get("receipt_items_raw", [])}
-        po_items = {item.get("name", "").lower(): item for item in pr.items_json}
-
-        vendor_match = details.get("vendor_match", True)
-
-        all_items = set(po_items.keys()) | set(receipt_items.keys())
-        matched_count = 0
-        rows = []
-
-        # Build rows for HTML table
-        for item_name in sorted(all_items):
-            po_item = po_items.get(item_name)
-            rcpt_item = receipt_items.get(item_name)
-
-            row = {
-                "name": item_name.title(),
-                "po_price": po_item["price"] if po_item else "-",
-                "receipt_price": rcpt_item["price"] if rcpt_item else "-",
-                "po_qty": po_item["quantity"] if po_item else "-",
-                "receipt_qty": rcpt_item["quantity"] if rcpt_item else "-"
-            }
-
-            # Determine status
-            if po_item and rcpt_item:
-                price_ok = qty_ok = True
-
-                if po_item["price"] > 0:
-                    price_diff_pct = abs(po_item["price"] - rcpt_item["price"]) / po_item["price"] * 100
-                    if price_diff_pct > float(pr.amount_tolerance_percent):
-                        price_ok = False
-
-                if po_item["quantity"] > 0:
-                    qty_diff_pct = abs(po_item["quantity"] - rcpt_item["quantity"]) / po_item["quantity"] * 100
-                    if qty_diff_pct > float(pr.quantity_tolerance_percent):
-                        qty_ok = False
-
-                if price_ok and qty_ok:
-                    row["status"] = "MATCHED"
-                    matched_count += 1
-                else:
-                    row["status"] = "MISMATCH"
-
-            elif po_item:
-                row["status"] = "MISSING_IN_RECEIPT"
-            elif rcpt_item:
-                row["status"] = "EXTRA_IN_RECEIPT"
-
-            rows.append(row)
-
-        issues_count = len(all_items) - matched_count
-
-        # Build HTML using template
-        context = {
-            "pr": pr,
-            "staff": staff,
-            "details": details,
-            "vendor_match": vendor_match,
-            "items": rows,
-            "matched_count": matched_count,
-            "issues_count": issues_count,
-            "total_items": len(all_items),
-            "po_total": pr.total_amount_extracted or pr.amount,
-            "receipt_total": details.get("receipt_total", "-"),
-        }
-
-        html_string = render_to_string("email/matching_report.html", context)
-        pdf_bytes = HTML(string=html_string).write_pdf()
+        # Lines and totals were computed once by the discrepancy engine
+        # during validate_receipt; the summary only renders them.
+        context = report_context(pr)
+        context["report_url"] = report_download_url(pr)
+        html_content = render_to_string("emails/discrepancy_summary.html", context)
 
-        # Send email with attached PDF
-        email = EmailMessage(
+        email = EmailMultiAlternatives(
             subject=f"3-Way Matching Report: {pr.title}",
             body=(
                 f"Hi {staff.first_name},\n\n"
-                f"Your detailed 3-way matching report is attached as a PDF.\n\n"
-                f"Request ID: {pr.id}\n"
+                f"3-way matching found {context['issues_count']} issue(s) on request {pr.id}.\n"
+                f"Download the full report: {context['report_url']}\n\n"
                 f"PO Total: ${pr.total_amount_extracted or pr.amount}\n\n"
                 f"Best regards,\nProcurement System"
             ),
             from_email=settings.DEFAULT_FROM_EMAIL,
             to=[staff.email],
         )
+        email.attach_alternative(html_content, "text/html")
+        queue_email(email)
 
-        email.attach(f"3way_report_{pr.id}.pdf", pdf_bytes, "application/pdf")
-        email.send()
-
-        logger.info(f" PDF report sent to {staff.email} for request {request_id}")
+        logger.info(f" Discrepancy summary queued for {staff.email} for request {request_id}")
 
     except Exception as exc:
-        logger.error(f" PDF report task failed for request {request_id}: {exc}")
+        logger.error(f" Discrepancy email task failed for request {request_id}: {exc}")
         raise self.retry(exc=exc, countdown=60)
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+from procurement.llm_client import LLMBackend
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    In-memory LLMBackend for tests: answers come from `chat_reply` /
+    `parse_reply` / `embed_reply` (values or callables taking the messages,
+    or the text for embeddings) and every call is recorded.
+    """
+    chat_reply = "NO"
+    parse_reply = None
+    embed_reply = None
+    delay = 0.0
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, reply, messages):
+        return reply(messages) if callable(reply) else reply
+
+    def chat(self, messages, **kwargs):
+        self.calls.append(("chat", messages, kwargs))
+        return self._answer(self.chat_reply, messages)
+
+    def embed(self, texts, **kwargs):
+        self.calls.append(("embed", list(texts), kwargs))
+        return [self._answer(self.embed_reply, text) for text in texts]
+
+    def parse(self, messages, response_format, **kwargs):
+        self.calls.append(("parse", messages, kwargs))
+        return response_format.model_validate(self._answer(self.parse_reply, messages))
+
+    async def aparse(self, messages, response_format, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return self.parse(messages, response_format, **kwargs)
@@ -0,0 +1,180 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import TestCase
+
+from procurement.ai_matching import are_items_same, match_item_lists
+from procurement.item_equivalence import clear_memory
+from procurement.metrics import get_counters
+from procurement.models import ItemEquivalence, PurchaseRequest
+from procurement.similarity import local_decision, name_similarity
+from procurement.tasks import validate_receipt
+from procurement.tests.test_llm_client import use_fake_backend
+
+
+def assignment(pairs, unmatched_po=(), unmatched_receipt=()):
+    return {
+        "pairs": [{"po_index": i, "receipt_index": j} for i, j in pairs],
+        "unmatched_po": list(unmatched_po),
+        "unmatched_receipt": list(unmatched_receipt),
+    }
+
+
+class TestMatchItemLists(TestCase):
+
+    def setUp(self):
+        clear_memory()
+
+    def test_only_ambiguous_lines_reach_llm_in_one_call(self):
+        po = ["HP 85A toner", "Dell Latitude 5420", "Stapler"]
+        receipt = ["Dell Latitde 5420 notebook", "Toner HP 85A", "USB cable"]
+        with use_fake_backend() as backend:
+            # the LLM sees only the two leftover lines of each side
+            backend.parse_reply = assignment([(0, 0)], [1], [1])
+            pairs, unmatched_po, unmatched_receipt = match_item_lists(po, receipt)
+
+        self.assertEqual(len(backend.calls), 1)
+        self.assertIn("0: Dell Latitude 5420\n1: Stapler", backend.calls[0][1][1]["content"])
+        self.assertEqual(sorted(pairs), [(0, 1), (1, 0)])
+        self.assertEqual(unmatched_po, [2])
+        self.assertEqual(unmatched_receipt, [2])
+        counters = get_counters("item_match")
+        self.assertEqual(counters["item_match.remote"], 4)
+        self.assertEqual(counters["item_match.local"], 5)
+
+    def test_clear_lists_skip_llm(self):
+        with use_fake_backend() as backend:
+            pairs, unmatched_po, unmatched_receipt = match_item_lists(
+                ["HP 85A toner", "A4 paper ream", "Stapler"],
+                ["Paper A4 (ream)", "Toner HP 85A", "USB cable"],
+            )
+        self.assertEqual(backend.calls, [])
+        self.assertEqual(sorted(pairs), [(0, 1), (1, 0)])
+        self.assertEqual((unmatched_po, unmatched_receipt), ([2], [2]))
+
+    def test_invalid_pairs_are_dropped(self):
+        with use_fake_backend() as backend:
+            # duplicate receipt line, out-of-range index, and lists that disagree with pairs
+            backend.parse_reply = assignment([(0, 0), (1, 0), (2, 9)], [], [])
+            pairs, unmatched_po, unmatched_receipt = match_item_lists(
+                ["Office chair", "Office desk", "Desk lamp"], ["Ofice chiar", "Lamp shade"]
+            )
+
+        self.assertEqual(pairs, [(0, 0)])
+        self.assertEqual(unmatched_po, [1, 2])
+        self.assertEqual(unmatched_receipt, [1])
+
+    def test_empty_side_skips_llm(self):
+        with use_fake_backend() as backend:
+            self.assertEqual(match_item_lists(["Toner"], []), ([], [0], []))
+        self.assertEqual(backend.calls, [])
+
+    def test_falls_back_to_exact_names(self):
+        with use_fake_backend() as backend:
+            backend.parse_reply = lambda messages: 1 / 0
+            pairs, _, unmatched_receipt = match_item_lists(
+                ["Office chair", "Desk lamp"], ["Office chairs", "Lamp shade"]
+            )
+        self.assertEqual(pairs, [])
+        self.assertEqual(unmatched_receipt, [0, 1])
+
+
+    def test_llm_assignment_is_memoized(self):
+        po = ["Dell Latitude 5420", "Stapler"]
+        receipt = ["Dell Latitde 5420 notebook", "USB cable"]
+        with use_fake_backend() as backend:
+            backend.parse_reply = assignment([(0, 0)], [1], [1])
+            first = match_item_lists(po, receipt)
+            second = match_item_lists(po, receipt)
+
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual(first, second)
+        self.assertEqual(second, ([(0, 0)], [1], [1]))
+        self.assertEqual(ItemEquivalence.objects.filter(same=True).count(), 1)
+
+class TestAreItemsSame(TestCase):
+
+    def setUp(self):
+        clear_memory()
+
+    def test_clear_pairs_are_decided_locally(self):
+        with use_fake_backend() as backend:
+            self.assertTrue(are_items_same("Coca Cola 500 ML", "coca-cola 0.5 l"))
+            self.assertFalse(are_items_same("Water 500ml", "Water 1L"))
+            self.assertFalse(are_items_same("Stapler", "USB cable"))
+        self.assertEqual(backend.calls, [])
+        self.assertEqual(get_counters("item_match"), {"item_match.local": 3})
+
+    def test_uncertain_pair_goes_to_llm(self):
+        with use_fake_backend() as backend:
+            backend.chat_reply = "NO"
+            self.assertFalse(are_items_same("Dell Latitude 5420", "Dell Latitude 5430"))
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual(get_counters("item_match"), {"item_match.remote": 1})
+
+    def test_llm_answer_is_memoized(self):
+        with use_fake_backend() as backend:
+            backend.chat_reply = "YES"
+            self.assertTrue(are_items_same("HP LaserJet Toner 85A", "Toner cartridge HP 85A"))
+            self.assertTrue(are_items_same("toner cartridge HP 85A", "HP LaserJet toner 85A"))
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual(get_counters("item_match"), {"item_match.remote": 1})
+
+
+class TestValidateReceiptMatching(TestCase):
+
+    @patch("procurement.tasks.send_discrepancy_email_task")
+    @patch("procurement.tasks.extract_and_parse")
+    def test_items_matched_with_single_assignment(self, mock_extract, mock_email):
+        pr = PurchaseRequest.objects.create(
+            title="Office supplies", description="", amount=100, vendor_name="Acme",
+            receipt="receipts/receipt.pdf",
+            items_json=[
+                {"name": "HP LaserJet Toner 85A", "price": 50, "quantity": 1},
+                {"name": "A4 paper ream", "price": 5, "quantity": 10},
+            ],
+        )
+        mock_extract.return_value = ("text", {
+            "vendor_name": "Acme Limited",
+            "items": [
+                {"name": "Paper A4", "price": 5, "quantity": 10},
+                {"name": "Toner cartridge HP 85A", "price": 60, "quantity": 1},
+                {"name": "Pens", "price": 1, "quantity": 3},
+            ],
+        })
+
+        with use_fake_backend() as backend:
+            # "A4 paper ream" contains "Paper A4", so both lines go to the LLM
+            backend.parse_reply = assignment([(0, 1), (1, 0)], [], [2])
+            validate_receipt(pr.id)
+
+        pr.refresh_from_db()
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual(pr.three_way_match_status, "DISCREPANCY")
+        self.assertTrue(pr.discrepancy_details["vendor_match"])
+        issues = {(issue["type"], issue["item"]) for issue in pr.discrepancy_details["receipt_validation"]}
+        self.assertEqual(issues, {("price", "HP LaserJet Toner 85A"), ("extra_item", "Pens")})
+        mock_email.delay.assert_called_once_with(pr.id)
+
+
+class TestContainment(TestCase):
+
+    def test_product_vs_accessory_is_left_to_llm(self):
+        for name, longer in [
+            ("Laptop", "Laptop bag"),
+            ("iPhone 15", "iPhone 15 case"),
+            ("Printer", "Printer ink cartridge"),
+            ("Toner HP 85A", "HP 85A Toner Cartridge"),
+        ]:
+            with self.subTest(name=name, longer=longer):
+                score = name_similarity(name, longer)
+                self.assertGreater(score, settings.ITEM_MATCH_REJECT)
+                self.assertLess(score, settings.ITEM_MATCH_ACCEPT)
+                self.assertIsNone(local_decision(name, longer))
+
+    def test_missing_accessory_line_is_not_auto_matched(self):
+        with use_fake_backend() as backend:
+            backend.parse_reply = assignment([], [0], [0])
+            pairs, unmatched_po, unmatched_receipt = match_item_lists(["Laptop bag"], ["Laptop"])
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual((pairs, unmatched_po, unmatched_receipt), ([], [0], [0]))
@@ -0,0 +1,86 @@
+import re
+
+from django.test import SimpleTestCase, override_settings
+
+from procurement.chunking import merge_chunk_results, split_into_chunks
+from procurement.document_processing import parse_with_ai
+from procurement.tests.test_llm_client import use_fake_backend
+
+
+def item_lines(count):
+    return "".join(f"Item {n:03d} widget  1  $10.00\n" for n in range(count))
+
+
+class TestSplitIntoChunks(SimpleTestCase):
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(split_into_chunks("short\ntext", 4000, 400), [("short\ntext", 0)])
+
+    def test_chunks_overlap_and_cover_every_line(self):
+        text = item_lines(200)
+        chunks = split_into_chunks(text, 1000, 150)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk, overlap in chunks:
+            self.assertLessEqual(len(chunk), 1000 + 150)
+        for (previous, _), (chunk, overlap) in zip(chunks, chunks[1:]):
+            self.assertTrue(overlap > 0)
+            self.assertTrue(previous.endswith(chunk[:overlap]))
+        rebuilt = chunks[0][0] + "".join(chunk[overlap:] for chunk, overlap in chunks[1:])
+        self.assertEqual(rebuilt, text)
+
+
+class TestMergeChunkResults(SimpleTestCase):
+
+    def test_overlap_duplicates_dropped_and_last_total_wins(self):
+        chunks = [("Acme Ltd\nToner 2 $10\nPaper 5 $3\n", 0), ("Paper 5 $3\nStapler 1 $7\nTOTAL $42\n", 11)]
+        results = [
+            {"vendor_name": "Acme Ltd", "items": [{"name": "Toner", "price": 10, "quantity": 2},
+                                                  {"name": "Paper", "price": 3, "quantity": 5}],
+             "total_amount": None},
+            {"vendor_name": "", "items": [{"name": "Paper", "price": 3, "quantity": 5},
+                                          {"name": "Stapler", "price": 7, "quantity": 1}],
+             "total_amount": 42},
+        ]
+
+        merged = merge_chunk_results(chunks, results)
+
+        self.assertEqual(merged["vendor_name"], "Acme Ltd")
+        self.assertEqual([i["name"] for i in merged["items"]], ["Toner", "Paper", "Stapler"])
+        self.assertEqual(merged["total_amount"], 42)
+
+    def test_repeated_item_outside_overlap_is_kept(self):
+        chunks = [("Paper 5 $3\n", 0), ("Stapler\nPaper 5 $3\n", 0)]
+        item = {"name": "Paper", "price": 3, "quantity": 5}
+        merged = merge_chunk_results(chunks, [{"items": [item]}, {"items": [item]}])
+
+        self.assertEqual(len(merged["items"]), 2)
+        self.assertEqual(merged["total_amount"], 30)
+
+
+def chunk_reply(messages):
+    """Echo each chunk's part number as its total and its item lines as items."""
+    prompt = messages[0]["content"]
+    part = re.search(r"part (\d+) of", prompt)
+    items = [
+        {"name": f"Item {n} widget", "price": 10, "quantity": 1}
+        for n in re.findall(r"Item (\d{3}) widget", prompt)
+    ]
+    return {"vendor_name": "Acme Ltd", "vendor_address": "", "payment_terms": "",
+            "items": items, "total_amount": int(part.group(1)) if part else None}
+
+
+@override_settings(LLM_CHUNK_SIZE=1000, LLM_CHUNK_OVERLAP=100, LLM_CHUNK_CONCURRENCY=3)
+class TestChunkedParse(SimpleTestCase):
+
+    def test_long_document_parsed_concurrently_without_truncation(self):
+        with use_fake_backend() as backend:
+            backend.parse_reply = chunk_reply
+            backend.delay = 0.05
+            result = parse_with_ai(item_lines(300))
+
+        self.assertGreater(len(backend.calls), 3)
+        self.assertEqual(backend.max_in_flight, 3)
+        self.assertEqual(result["total_amount"], len(backend.calls))
+        # every line item survives, overlap duplicates are dropped
+        self.assertEqual([i["name"] for i in result["items"]], [f"Item {n:03d} widget" for n in range(300)])
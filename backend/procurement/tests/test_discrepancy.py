@@ -0,0 +1,339 @@
+import re
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from procurement.checkpoints import Checkpoints, purge_checkpoints
+from procurement.discrepancy import compare_lines, summarize
+from procurement.document_processing import extract_and_parse
+from procurement.mailer import deliver_batch
+from procurement.models import PipelineCheckpoint, PurchaseRequest
+from procurement.reports import get_discrepancy_report_pdf, report_download_url, verify_report_token
+from procurement.tasks import process_invoice, send_discrepancy_email_task, validate_receipt
+
+PO = [
+    {"name": "Toner", "price": 50, "quantity": 2},
+    {"name": "Paper", "price": 5, "quantity": 10},
+    {"name": "Stapler", "price": 8, "quantity": 1},
+    {"name": "Free sample", "price": 0, "quantity": 0},
+]
+RECEIPT = [
+    {"name": "Toner HP", "price": 52, "quantity": 2},
+    {"name": "Paper A4", "price": 5, "quantity": 12},
+    {"name": "Pens", "price": 1, "quantity": 3},
+    {"name": "Sample", "price": 3, "quantity": 1},
+]
+
+
+class TestCompareLines(SimpleTestCase):
+
+    def setUp(self):
+        self.result = compare_lines(PO, RECEIPT, [(0, 0), (1, 1), (3, 3)], [2], [2], 5.0, 10.0)
+
+    def test_line_statuses(self):
+        statuses = {line["name"]: line["status"] for line in self.result["lines"]}
+        self.assertEqual(statuses, {
+            "Toner": "MATCHED",              # 4% price difference
+            "Paper": "MISMATCH",             # 20% quantity difference
+            "Free sample": "MATCHED",        # nothing expected, nothing to compare
+            "Stapler": "MISSING_IN_RECEIPT",
+            "Pens": "EXTRA_IN_RECEIPT",
+        })
+        self.assertEqual(self.result["lines"][0]["price_diff_pct"], 4.0)
+
+    def test_issues_and_codes(self):
+        self.assertEqual(
+            [(issue["type"], issue["item"]) for issue in self.result["issues"]],
+            [("quantity", "Paper"), ("missing_item", "Stapler"), ("extra_item", "Pens")],
+        )
+        self.assertEqual(self.result["discrepancies"], ["item_mismatch", "missing_item", "extra_item"])
+
+    def test_summary(self):
+        summary = summarize(self.result["lines"], 200, 210.5)
+        self.assertEqual(summary["total_items"], 5)
+        self.assertEqual(summary["matched_count"], 2)
+        self.assertEqual(summary["issues_count"], 3)
+        self.assertEqual(summary["receipt_total"], 210.5)
+
+    def test_no_pairs(self):
+        result = compare_lines(PO[:1], [], [], [0], [], 5.0, 10.0)
+        self.assertEqual(result["discrepancies"], ["missing_item"])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestDiscrepancyReport(TestCase):
+
+    def setUp(self):
+        staff = get_user_model().objects.create_user(
+            phone="+250788000001", email="staff@example.com", first_name="Sam", last_name="Staff"
+        )
+        result = compare_lines(PO, RECEIPT, [(0, 0), (1, 1)], [2], [2], 5.0, 10.0)
+        self.pr = PurchaseRequest.objects.create(
+            title="Supplies", description="", amount=100, created_by=staff,
+            three_way_match_status="DISCREPANCY",
+            discrepancy_details={
+                "vendor_match": True,
+                "lines": result["lines"],
+                "summary": summarize(result["lines"], 200, 210),
+            },
+        )
+        self.client = APIClient()
+
+    @patch("procurement.rendering.HTML")
+    def test_email_links_report_instead_of_rendering_it(self, mock_html):
+        send_discrepancy_email_task(self.pr.id)
+        deliver_batch()
+
+        mock_html.assert_not_called()
+        message = mail.outbox[0]
+        self.assertEqual(message.attachments, [])
+        html = message.alternatives[0][0]
+        self.assertIn("Stapler", html)
+        token = re.search(r'discrepancy-report/\?token=([^"]+)"', html).group(1)
+        self.assertTrue(verify_report_token(self.pr, token))
+
+    @patch("procurement.rendering.HTML")
+    def test_report_rendered_once_on_download(self, mock_html):
+        mock_html.return_value.write_pdf.return_value = b"%PDF"
+        url = report_download_url(self.pr)
+
+        with patch("procurement.rendering.render_to_string", wraps=render_to_string) as render:
+            first = self.client.get(url)
+            second = self.client.get(url)
+
+        self.assertEqual((first.status_code, first.content), (200, b"%PDF"))
+        self.assertEqual(second.content, b"%PDF")
+        mock_html.assert_called_once()
+        context = next(c.args[1] for c in render.call_args_list if c.args[0] == "emails/matching_report.html")
+        self.assertEqual([row["status"] for row in context["items"]],
+                         ["MATCHED", "MISMATCH", "MISSING_IN_RECEIPT", "EXTRA_IN_RECEIPT"])
+        self.assertEqual((context["matched_count"], context["issues_count"]), (1, 3))
+
+        # new matching results invalidate the stored report
+        self.pr.refresh_from_db()
+        self.pr.discrepancy_details["vendor_match"] = False
+        self.pr.save()
+        self.assertTrue(get_discrepancy_report_pdf(self.pr)[1])
+
+    def test_forged_or_foreign_token_rejected(self):
+        other = PurchaseRequest.objects.create(title="Other", description="", amount=1)
+        token = report_download_url(other).split("token=")[1]
+
+        response = self.client.get(f"/api/requests/{self.pr.id}/discrepancy-report/?token={token}")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(f"/api/requests/{self.pr.id}/discrepancy-report/?token=forged")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(f"/api/requests/{self.pr.id}/discrepancy-report/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_new_matching_results_invalidate_link(self):
+        url = report_download_url(self.pr)
+        self.pr.discrepancy_details["vendor_match"] = False
+        self.pr.save()
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class TestThreeWayMatch(TestCase):
+
+    def setUp(self):
+        self.pr = PurchaseRequest.objects.create(
+            title="Supplies", description="", amount=110, vendor_name="Acme",
+            total_amount_extracted=110, items_json=PO[:2],
+            receipt="receipts/r.pdf", invoice="invoices/i.pdf",
+        )
+        self.receipt = {"vendor_name": "Acme Ltd", "items": PO[:2], "total_amount": 110}
+        self.invoice = {
+            "vendor_name": "ACME Limited",
+            "items": [{"name": "Toner", "price": 50, "quantity": 2}, {"name": "Paper", "price": 7, "quantity": 10}],
+            "total_amount": 130,
+        }
+
+    @patch("procurement.tasks.validate_receipt")
+    @patch("procurement.tasks.extract_and_parse")
+    def test_invoice_extraction_fills_fields_and_rematches(self, mock_extract, mock_validate):
+        mock_extract.return_value = ("text", self.invoice)
+        process_invoice(self.pr.id)
+
+        self.pr.refresh_from_db()
+        self.assertEqual(self.pr.invoice_extraction_status, "SUCCESS")
+        self.assertEqual(self.pr.invoice_vendor_name, "ACME Limited")
+        self.assertEqual(self.pr.invoice_total, 130)
+        self.assertEqual(len(self.pr.invoice_items_json), 2)
+        mock_validate.delay.assert_called_once_with(self.pr.id)
+
+    @patch("procurement.tasks.validate_receipt")
+    @patch("procurement.tasks.extract_and_parse")
+    def test_invoice_extraction_keeps_concurrent_match_results(self, mock_extract, mock_validate):
+        def extract(document):
+            # matching finishes while the invoice is being extracted
+            PurchaseRequest.objects.filter(id=self.pr.id).update(three_way_match_status="MATCHED")
+            return "text", self.invoice
+        mock_extract.side_effect = extract
+
+        process_invoice(self.pr.id)
+
+        self.pr.refresh_from_db()
+        self.assertEqual(self.pr.three_way_match_status, "MATCHED")
+        self.assertEqual(self.pr.invoice_extraction_status, "SUCCESS")
+
+    @patch("procurement.tasks.send_discrepancy_email_task")
+    @patch("procurement.tasks.extract_and_parse")
+    def test_po_receipt_and_invoice_compared_in_one_pass(self, mock_extract, mock_email):
+        PurchaseRequest.objects.filter(id=self.pr.id).update(
+            invoice_extraction_status="SUCCESS", invoice_vendor_name="ACME Limited",
+            invoice_items_json=self.invoice["items"], invoice_total=130,
+        )
+        mock_extract.return_value = ("text", self.receipt)
+
+        validate_receipt(self.pr.id)
+
+        # the stored invoice extraction is reused; only the receipt is (cache-)extracted
+        mock_extract.assert_called_once()
+        self.pr.refresh_from_db()
+        details = self.pr.discrepancy_details
+        self.assertEqual(self.pr.three_way_match_status, "DISCREPANCY")
+        self.assertEqual(details["receipt_validation"], [])
+        self.assertTrue(details["invoice_vendor_match"])
+        self.assertEqual(
+            [(issue["type"], issue.get("item")) for issue in details["invoice_validation"]],
+            [("price", "Paper"), ("total", None)],
+        )
+        self.assertEqual(details["invoice_lines"][1]["status"], "MISMATCH")
+        self.assertEqual(details["summary"]["invoice_total"], 130.0)
+
+    @patch.object(send_discrepancy_email_task, "delay", side_effect=send_discrepancy_email_task)
+    @patch("procurement.tasks.extract_and_parse")
+    def test_invoice_only_discrepancy_is_counted_and_shown(self, mock_extract, mock_email):
+        staff = get_user_model().objects.create_user(
+            phone="+250788000002", email="staff@example.com", first_name="Sam", last_name="Staff"
+        )
+        PurchaseRequest.objects.filter(id=self.pr.id).update(
+            created_by=staff, invoice_extraction_status="SUCCESS", invoice_vendor_name="Acme",
+            invoice_items_json=PO[:2], invoice_total=500,
+        )
+        mock_extract.return_value = ("text", self.receipt)
+
+        validate_receipt(self.pr.id)
+        deliver_batch()
+
+        self.pr.refresh_from_db()
+        self.assertEqual(self.pr.three_way_match_status, "DISCREPANCY")
+        self.assertEqual(self.pr.discrepancy_details["summary"]["issues_count"], 1)
+        html = mail.outbox[0].alternatives[0][0]
+        self.assertIn("found <strong>1</strong> issue", html)
+        self.assertIn("Invoice total mismatch: expected $110.0, invoiced $500.0", html)
+
+    @patch("procurement.tasks.extract_and_parse")
+    def test_two_way_when_no_invoice(self, mock_extract):
+        PurchaseRequest.objects.filter(id=self.pr.id).update(invoice="")
+        mock_extract.return_value = ("text", self.receipt)
+
+        validate_receipt(self.pr.id)
+
+        self.pr.refresh_from_db()
+        self.assertEqual(self.pr.three_way_match_status, "MATCHED")
+        self.assertNotIn("invoice_lines", self.pr.discrepancy_details)
+
+
+    @patch("procurement.tasks.send_discrepancy_email_task")
+    @patch("procurement.tasks.extract_and_parse")
+    def test_unreadable_invoice_keeps_receipt_comparison(self, mock_extract, mock_email):
+        def extract(document, checkpoints=None):
+            if document.name.startswith("invoices/"):
+                raise ValueError("unreadable invoice")
+            return "text", self.receipt
+        mock_extract.side_effect = extract
+
+        validate_receipt(self.pr.id)
+
+        self.pr.refresh_from_db()
+        details = self.pr.discrepancy_details
+        self.assertEqual(self.pr.three_way_match_status, "DISCREPANCY")
+        self.assertNotIn("error", details)
+        self.assertEqual(details["receipt_validation"], [])
+        self.assertEqual([line["status"] for line in details["lines"]], ["MATCHED", "MATCHED"])
+        self.assertEqual(details["invoice_validation"][0]["type"], "invoice_extraction_failed")
+
+    @patch("procurement.tasks.send_discrepancy_email_task")
+    @patch("procurement.tasks.extract_and_parse")
+    def test_failed_invoice_is_not_re_extracted(self, mock_extract, mock_email):
+        PurchaseRequest.objects.filter(id=self.pr.id).update(invoice_extraction_status="FAILED")
+        mock_extract.return_value = ("text", self.receipt)
+
+        validate_receipt(self.pr.id)
+
+        mock_extract.assert_called_once()
+        self.pr.refresh_from_db()
+        self.assertTrue(self.pr.discrepancy_details["invoice_extraction_failed"])
+
+class TestCheckpointedMatching(TestCase):
+
+    def setUp(self):
+        self.pr = PurchaseRequest.objects.create(
+            title="Supplies", description="", amount=110, vendor_name="Acme",
+            items_json=PO[:2], receipt="receipts/r.pdf",
+        )
+        self.receipt = {"vendor_name": "Acme", "items": PO[:2], "total_amount": 110}
+
+    @patch("procurement.tasks.match_documents")
+    @patch("procurement.tasks.extract_and_parse")
+    def test_retry_resumes_after_completed_match(self, mock_extract, mock_match):
+        mock_extract.return_value = ("text", self.receipt)
+        mock_match.return_value = {"details": {"vendor_match": True}, "discrepancies": []}
+
+        with patch.object(PurchaseRequest.objects, "select_for_update", side_effect=RuntimeError("db down")), \
+                patch.object(validate_receipt, "retry", side_effect=RuntimeError("retry")):
+            with self.assertRaises(RuntimeError):
+                validate_receipt(self.pr.id)
+        self.assertTrue(PipelineCheckpoint.objects.filter(stage="match").exists())
+
+        validate_receipt(self.pr.id)
+
+        mock_match.assert_called_once()
+        self.pr.refresh_from_db()
+        self.assertEqual(self.pr.three_way_match_status, "MATCHED")
+        self.assertFalse(PipelineCheckpoint.objects.exists())
+
+    @patch("procurement.tasks.extract_and_parse")
+    def test_final_failure_clears_checkpoints(self, mock_extract):
+        Checkpoints(self.pr.id, "validate_receipt").for_document("receipt").save("raw_text", "k", {"raw_text": "x"})
+        mock_extract.side_effect = RuntimeError("LLM down")
+
+        with patch.object(validate_receipt, "max_retries", 0), \
+                patch.object(validate_receipt, "retry", side_effect=RuntimeError("gave up")):
+            with self.assertRaises(RuntimeError):
+                validate_receipt(self.pr.id)
+        self.assertFalse(PipelineCheckpoint.objects.exists())
+
+    @override_settings(PIPELINE_CHECKPOINT_TTL_HOURS=24)
+    def test_purge_removes_abandoned_checkpoints(self):
+        checkpoints = Checkpoints(self.pr.id, "validate_receipt")
+        checkpoints.save("match", "old", {})
+        checkpoints.save("other", "new", {})
+        PipelineCheckpoint.objects.filter(stage="match").update(updated_at=timezone.now() - timedelta(hours=25))
+
+        self.assertEqual(purge_checkpoints(), 1)
+        self.assertEqual(list(PipelineCheckpoint.objects.values_list("stage", flat=True)), ["other"])
+
+    def test_raw_text_checkpoint_skips_ocr_on_retry(self):
+        checkpoints = Checkpoints(self.pr.id, "validate_receipt").for_document("receipt")
+        document = BytesIO(b"%PDF-1.4 receipt")
+
+        with patch("procurement.document_processing.extract_text_from_path", return_value="raw"), \
+                patch("procurement.document_processing.parse_document", side_effect=RuntimeError("LLM down")):
+            with self.assertRaises(RuntimeError):
+                extract_and_parse(document, checkpoints=checkpoints)
+
+        with patch("procurement.document_processing.extract_text_from_path") as mock_ocr, \
+                patch("procurement.document_processing.parse_document", return_value=self.receipt):
+            self.assertEqual(extract_and_parse(document, checkpoints=checkpoints), ("raw", self.receipt))
+        mock_ocr.assert_not_called()
@@ -0,0 +1,154 @@
+import multiprocessing
+from io import BytesIO
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from procurement.document_processing import (
+    detect_document_format,
+    extract_text_from_any_pdf,
+    extract_text_from_document,
+    ocr_dpi,
+    ocr_page,
+    ocr_pdf_pages,
+    ocr_worker_count,
+    pages_needing_ocr,
+)
+
+A4 = (595, 842)
+
+
+def fake_ocr_page(pdf_path, page_number, dpi=200):
+    return f"page {page_number} @ {dpi}"
+
+
+def ocr_in_child(results):
+    try:
+        results.put(list(ocr_pdf_pages("doc.pdf", [1, 2, 3], max_workers=3)))
+    except Exception as e:
+        results.put(repr(e))
+
+
+class TestParallelOcr(SimpleTestCase):
+
+    @override_settings(OCR_PARALLEL=True, OCR_MAX_WORKERS=4)
+    def test_worker_count_bounded_by_setting_and_pages(self):
+        self.assertEqual(ocr_worker_count(12), 4)
+        self.assertEqual(ocr_worker_count(2), 2)
+        self.assertEqual(ocr_worker_count(12, max_workers=1), 1)
+
+    @override_settings(OCR_PARALLEL=False, OCR_MAX_WORKERS=4)
+    def test_parallel_disabled(self):
+        self.assertEqual(ocr_worker_count(12), 1)
+
+    @override_settings(OCR_DPI=200, OCR_MEMORY_BUDGET_MB=256)
+    @patch("procurement.document_processing.ocr_page", side_effect=fake_ocr_page)
+    def test_serial_pages_returned_in_order(self, mock_ocr):
+        texts = list(ocr_pdf_pages("doc.pdf", [3, 1, 2], max_workers=1))
+        self.assertEqual(texts, ["page 3 @ 200", "page 1 @ 200", "page 2 @ 200"])
+
+    @override_settings(OCR_DPI=200, OCR_MEMORY_BUDGET_MB=256)
+    @patch("procurement.document_processing.ocr_page", side_effect=fake_ocr_page)
+    def test_parallel_ocr_runs_inside_daemon_process(self, mock_ocr):
+        # Celery prefork workers are daemonic and may not start child processes
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        child = context.Process(target=ocr_in_child, args=(results,), daemon=True)
+        child.start()
+        texts = results.get(timeout=30)
+        child.join(timeout=30)
+        self.assertEqual(texts, ["page 1 @ 200", "page 2 @ 200", "page 3 @ 200"])
+
+
+@override_settings(OCR_LOW_DPI=150, OCR_MIN_CONFIDENCE=60)
+class TestAdaptiveDpi(SimpleTestCase):
+
+    @patch("procurement.document_processing.ocr_page_at_dpi", return_value=("clear text", 91.0))
+    def test_confident_low_dpi_pass_is_kept(self, mock_render):
+        self.assertEqual(ocr_page("doc.pdf", 1, dpi=300), "clear text")
+        mock_render.assert_called_once_with("doc.pdf", 1, 150)
+
+    @patch("procurement.document_processing.ocr_page_at_dpi")
+    def test_poor_confidence_rerenders_at_high_dpi(self, mock_render):
+        mock_render.side_effect = [("bl4rry", 31.0), ("blurry", 78.0)]
+        self.assertEqual(ocr_page("doc.pdf", 2, dpi=300), "blurry")
+        self.assertEqual([c.args[2] for c in mock_render.call_args_list], [150, 300])
+
+    @patch("procurement.document_processing.ocr_page_at_dpi", return_value=("bl4rry", 31.0))
+    def test_no_rerender_when_budget_caps_dpi(self, mock_render):
+        ocr_page("doc.pdf", 1, dpi=120)
+        mock_render.assert_called_once_with("doc.pdf", 1, 120)
+
+
+class TestMemoryBudget(SimpleTestCase):
+
+    @override_settings(OCR_DPI=200, OCR_MEMORY_BUDGET_MB=256)
+    def test_full_dpi_when_budget_allows(self):
+        self.assertEqual(ocr_dpi(A4), 200)
+
+    @override_settings(OCR_DPI=300, OCR_MEMORY_BUDGET_MB=32)
+    def test_dpi_lowered_to_fit_budget(self):
+        dpi = ocr_dpi(A4, concurrent_pages=2)
+        raster_bytes = 3 * (A4[0] / 72 * dpi) * (A4[1] / 72 * dpi)
+        self.assertLess(dpi, 300)
+        self.assertLessEqual(2 * raster_bytes, 32 * 1024 * 1024)
+
+    @override_settings(OCR_DPI=200, OCR_MEMORY_BUDGET_MB=1)
+    def test_dpi_has_a_floor(self):
+        self.assertEqual(ocr_dpi(A4, concurrent_pages=8), 72)
+
+
+@override_settings(OCR_PAGE_MIN_CHARS=30)
+class TestHybridExtraction(SimpleTestCase):
+    TYPED = "ACME SUPPLIES LTD  Proforma invoice no. 1234  Kigali, Rwanda"
+
+    def test_pages_needing_ocr(self):
+        self.assertEqual(pages_needing_ocr([self.TYPED, "", "  p.2 ", self.TYPED]), [2, 3])
+
+    @patch("procurement.document_processing.ocr_pdf_pages")
+    @patch("procurement.document_processing.pdf_page_layers")
+    def test_text_only_pdf_skips_ocr(self, mock_layers, mock_ocr):
+        mock_layers.return_value = [(self.TYPED, A4), (self.TYPED, A4)]
+        mock_ocr.return_value = iter([])
+        text = extract_text_from_any_pdf(BytesIO(b"%PDF"))
+        self.assertEqual(text, f"{self.TYPED}\n{self.TYPED}")
+        self.assertEqual(mock_ocr.call_args.args[1], [])
+
+    @patch("procurement.document_processing.ocr_pdf_pages")
+    @patch("procurement.document_processing.pdf_page_layers")
+    def test_mixed_pdf_ocrs_only_scanned_pages(self, mock_layers, mock_ocr):
+        mock_layers.return_value = [(self.TYPED, A4), ("", A4), (self.TYPED, A4)]
+        mock_ocr.return_value = iter(["scanned page two " * 4])
+        text = extract_text_from_any_pdf(BytesIO(b"%PDF"))
+        self.assertEqual(mock_ocr.call_args.args[1:], ([2], [A4]))
+        self.assertEqual(text.split("\n"), [self.TYPED, "scanned page two " * 4, self.TYPED])
+
+
+class TestFormatDispatch(SimpleTestCase):
+
+    def test_detect_document_format(self):
+        self.assertEqual(detect_document_format(b"%PDF-1.7\n..."), "pdf")
+        self.assertEqual(detect_document_format(b"\r\n%PDF-1.4"), "pdf")
+        self.assertEqual(detect_document_format(b"\x89PNG\r\n\x1a\n\x00\x00"), "image")
+        self.assertEqual(detect_document_format(b"\xff\xd8\xff\xe0\x00\x10JFIF"), "image")
+        self.assertEqual(detect_document_format(b"PK\x03\x04"), "unknown")
+
+    @override_settings(OCR_MIN_CONFIDENCE=60)
+    @patch("procurement.document_processing.extract_text_from_pdf_path")
+    @patch("procurement.document_processing.ocr_image", return_value=("RECEIPT " * 10, 90.0))
+    def test_image_goes_straight_to_ocr(self, mock_ocr, mock_pdf):
+        buffer = BytesIO()
+        Image.new("RGB", (40, 20), "white").save(buffer, format="PNG")
+        # a misleading .pdf name must not matter
+        buffer.name = "receipt.pdf"
+
+        text = extract_text_from_document(buffer)
+
+        self.assertEqual(text, "RECEIPT " * 10)
+        mock_ocr.assert_called_once()
+        mock_pdf.assert_not_called()
+
+    def test_unknown_format_rejected(self):
+        with self.assertRaises(ValueError):
+            extract_text_from_document(BytesIO(b"PK\x03\x04 zip archive"))
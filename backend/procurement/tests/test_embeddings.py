@@ -0,0 +1,69 @@
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from procurement.ai_matching import match_item_lists
+from procurement.embeddings import embed_names
+from procurement.metrics import get_counters
+from procurement.models import ItemEmbedding
+from procurement.similarity import optimal_assignment
+from procurement.tests.test_llm_client import use_fake_backend
+
+# toy 3-d "embedding space": one axis per product family
+VECTORS = {
+    "hp 85a toner": [1.0, 0.1, 0.0],
+    "toner cartridge hp 85a": [0.95, 0.2, 0.0],
+    "hp 85a toner black": [0.9, 0.35, 0.0],
+    "a4 paper ream": [0.0, 1.0, 0.1],
+    "paper a4 80gsm": [0.1, 0.95, 0.0],
+    "stapler": [0.0, 0.0, 1.0],
+    "usb cable": [0.3, 0.3, 0.3],
+}
+
+
+class TestOptimalAssignment(SimpleTestCase):
+
+    def test_beats_greedy_choice(self):
+        # greedy takes (0, 0) = 0.9 and leaves 0.1; optimal is 0.8 + 0.85
+        scores = np.array([[0.9, 0.8], [0.85, 0.1]])
+        self.assertEqual(optimal_assignment(scores), [(0, 1), (1, 0)])
+
+    def test_rectangular_matrices(self):
+        scores = np.array([[0.1, 0.9, 0.2]])
+        self.assertEqual(optimal_assignment(scores), [(0, 1)])
+        self.assertEqual(optimal_assignment(scores.T), [(1, 0)])
+        self.assertEqual(optimal_assignment(np.zeros((0, 3))), [])
+
+
+@override_settings(ITEM_MATCH_MODE="embedding", ITEM_EMBEDDING_THRESHOLD=0.8)
+class TestEmbeddingMatching(TestCase):
+
+    def test_vectors_are_cached_per_normalized_name(self):
+        with use_fake_backend() as backend:
+            backend.embed_reply = lambda text: VECTORS[text]
+            first = embed_names(["HP 85A toner", "Stapler"])
+            second = embed_names(["hp 85a  TONER", "A4 paper ream"])
+
+        self.assertEqual([call[1] for call in backend.calls], [["hp 85a toner", "stapler"], ["a4 paper ream"]])
+        np.testing.assert_allclose(first[0], second[0])
+        self.assertAlmostEqual(float(np.linalg.norm(first[0])), 1.0, places=5)
+        self.assertEqual(ItemEmbedding.objects.count(), 3)
+        self.assertEqual(get_counters("item_embedding"), {"item_embedding.hit": 1, "item_embedding.miss": 3})
+
+    def test_one_batched_call_and_optimal_pairs(self):
+        po = ["HP 85A toner", "A4 paper ream", "Stapler"]
+        receipt = ["HP 85A toner black", "Paper A4 80gsm", "Toner cartridge HP 85A", "USB cable"]
+        with use_fake_backend() as backend:
+            backend.embed_reply = lambda text: VECTORS[text]
+            pairs, unmatched_po, unmatched_receipt = match_item_lists(po, receipt)
+
+        self.assertEqual([call[0] for call in backend.calls], ["embed"])
+        self.assertEqual(pairs, [(0, 2), (1, 1)])
+        self.assertEqual(unmatched_po, [2])
+        self.assertEqual(unmatched_receipt, [0, 3])
+
+    def test_falls_back_to_local_similarity(self):
+        with use_fake_backend() as backend:
+            backend.embed_reply = lambda text: 1 / 0
+            pairs, unmatched_po, _ = match_item_lists(["HP 85A toner", "Stapler"], ["Toner HP 85A", "Pens"])
+        self.assertEqual(pairs, [(0, 0)])
+        self.assertEqual(unmatched_po, [1])
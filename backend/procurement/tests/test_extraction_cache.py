@@ -0,0 +1,72 @@
+from datetime import timedelta
+from io import BytesIO
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from procurement.document_processing import extract_and_parse
+from procurement.extraction_cache import (
+    document_digest,
+    get_cached_extraction,
+    purge_extraction_cache,
+    store_extraction,
+)
+from procurement.metrics import get_counters, hit_rate
+from procurement.models import DocumentExtraction
+
+
+PARSED = {"vendor_name": "Acme Ltd", "items": [{"name": "Toner", "price": 10, "quantity": 2}]}
+
+
+class TestExtractionCache(TestCase):
+
+    def test_digest_is_sha256_of_content(self):
+        self.assertEqual(
+            document_digest(b"hello"),
+            "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824",
+        )
+
+    def test_miss_then_hit_updates_counters(self):
+        digest = document_digest(b"doc")
+        self.assertIsNone(get_cached_extraction(digest))
+
+        store_extraction(digest, "raw", PARSED)
+        entry = get_cached_extraction(digest)
+
+        self.assertEqual(entry.parsed_json, PARSED)
+        self.assertEqual(DocumentExtraction.objects.get(digest=digest).hit_count, 1)
+        counters = get_counters("extraction_cache")
+        self.assertEqual(counters["extraction_cache.hit"], 1)
+        self.assertEqual(counters["extraction_cache.miss"], 1)
+        self.assertEqual(hit_rate("extraction_cache"), 0.5)
+
+    @patch("procurement.document_processing.parse_document", return_value=PARSED)
+    @patch("procurement.document_processing.extract_text_from_pdf_path", return_value="raw text")
+    def test_identical_documents_skip_extraction(self, mock_extract, mock_parse):
+        first = extract_and_parse(BytesIO(b"%PDF-same"))
+        second = extract_and_parse(BytesIO(b"%PDF-same"))
+
+        self.assertEqual(first, ("raw text", PARSED))
+        self.assertEqual(second, ("raw text", PARSED))
+        mock_extract.assert_called_once()
+        mock_parse.assert_called_once()
+
+    @override_settings(EXTRACTION_CACHE_TTL_DAYS=30, EXTRACTION_CACHE_MAX_ENTRIES=2)
+    def test_purge_removes_expired_and_overflow(self):
+        now = timezone.now()
+        store_extraction("old", "", {})
+        DocumentExtraction.objects.filter(digest="old").update(last_used_at=now - timedelta(days=31))
+        for i in range(3):
+            store_extraction(f"recent-{i}", "", {})
+            DocumentExtraction.objects.filter(digest=f"recent-{i}").update(
+                last_used_at=now - timedelta(minutes=i)
+            )
+
+        deleted = purge_extraction_cache()
+
+        self.assertEqual(deleted, 2)
+        self.assertEqual(
+            set(DocumentExtraction.objects.values_list("digest", flat=True)),
+            {"recent-0", "recent-1"},
+        )
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+from PIL import Image
+
+from procurement.image_preprocessing import crop_margins, deskew, preprocess_for_ocr, skew_angle
+
+
+def text_block(angle=0.0):
+    """White page with black 'text lines' in the middle, rotated by `angle` degrees."""
+    page = np.full((600, 800), 255, dtype=np.uint8)
+    for row in range(8):
+        y = 200 + row * 25
+        cv2.rectangle(page, (200, y), (600, y + 8), 0, -1)
+    if angle:
+        matrix = cv2.getRotationMatrix2D((400, 300), angle, 1.0)
+        page = cv2.warpAffine(page, matrix, (800, 600), flags=cv2.INTER_NEAREST, borderValue=255)
+    return page
+
+
+class TestImagePreprocessing(SimpleTestCase):
+
+    def test_skew_angle_detected(self):
+        self.assertAlmostEqual(abs(skew_angle(text_block(5))), 5, delta=1)
+        self.assertAlmostEqual(skew_angle(text_block()), 0, delta=0.5)
+
+    def test_deskew_straightens_text(self):
+        straightened = deskew(text_block(6))
+        self.assertLess(abs(skew_angle(straightened)), 1)
+
+    def test_crop_margins_trims_blank_border(self):
+        cropped = crop_margins(text_block())
+        self.assertEqual(cropped.shape, (8 * 25 - 17 + 20 + 1, 400 + 20 + 1))
+
+    def test_preprocess_returns_binary_grayscale_image(self):
+        image = Image.fromarray(cv2.cvtColor(text_block(3), cv2.COLOR_GRAY2RGB))
+        result = preprocess_for_ocr(image)
+        self.assertEqual(result.mode, "L")
+        self.assertLessEqual(set(np.unique(np.asarray(result))), {0, 255})
+        self.assertLess(result.width, image.width)
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from procurement.item_equivalence import (
+    clear_memory,
+    get_equivalence,
+    get_equivalences,
+    pair_key,
+    purge_item_equivalences,
+    store_equivalence,
+    store_equivalences,
+)
+from procurement.metrics import get_counters, hit_rate
+from procurement.models import ItemEquivalence
+
+
+class TestItemEquivalence(TestCase):
+
+    def setUp(self):
+        clear_memory()
+
+    def test_key_is_order_and_format_independent(self):
+        self.assertEqual(
+            pair_key("HP LaserJet Toner 85A", "Toner cartridge HP 85A"),
+            pair_key("toner cartridge hp 85a", "HP laserjet toner, 85A"),
+        )
+        self.assertNotEqual(pair_key("Toner 85A", "Toner 83A"), pair_key("Toner 85A", "Toner 85X"))
+
+    def test_database_tier_is_shared_across_workers(self):
+        self.assertIsNone(get_equivalence("Office chair", "Ofice chiar"))
+        store_equivalence("Office chair", "Ofice chiar", True)
+
+        clear_memory()  # a different worker process
+        self.assertTrue(get_equivalence("Ofice chiar", "Office chair"))
+        self.assertTrue(get_equivalence("Ofice chiar", "Office chair"))
+
+        counters = get_counters("item_equivalence")
+        self.assertEqual(counters["item_equivalence.miss"], 1)
+        self.assertEqual(counters["item_equivalence.hit"], 2)
+        self.assertEqual(counters["item_equivalence.memory_hit"], 1)
+        self.assertAlmostEqual(hit_rate("item_equivalence"), 2 / 3)
+        self.assertEqual(ItemEquivalence.objects.get().hit_count, 1)
+
+    def test_batch_lookup_query_count_does_not_grow_with_pairs(self):
+        pairs = [(f"po item {i}", f"receipt item {j}") for i in range(6) for j in range(6)]
+        with CaptureQueriesContext(connection) as stored:
+            store_equivalences([(a, b, a[-1] == b[-1]) for a, b in pairs[::2]])
+        self.assertEqual(len(stored), 1)
+
+        for _ in range(2):
+            clear_memory()
+            with CaptureQueriesContext(connection) as looked_up:
+                answers = get_equivalences(pairs)
+        self.assertEqual(answers[:2], [True, None])
+        # one lookup, one hit_count update, and a get + update per counter (hit, miss)
+        self.assertEqual(len(looked_up), 6)
+        counters = get_counters("item_equivalence")
+        self.assertEqual((counters["item_equivalence.hit"], counters["item_equivalence.miss"]), (36, 36))
+
+    @override_settings(ITEM_EQUIVALENCE_MEMORY_SIZE=1)
+    def test_memory_tier_is_bounded(self):
+        store_equivalence("a1", "b1", True)
+        store_equivalence("a2", "b2", False)
+        ItemEquivalence.objects.all().delete()
+        self.assertIsNone(get_equivalence("a1", "b1"))
+        self.assertFalse(get_equivalence("a2", "b2"))
+
+    @override_settings(ITEM_EQUIVALENCE_TTL_DAYS=30, ITEM_EQUIVALENCE_MAX_ENTRIES=2)
+    def test_purge_removes_expired_and_overflow(self):
+        now = timezone.now()
+        for i, age in enumerate([60, 1, 2, 3]):
+            store_equivalence(f"item {i}", f"other {i}", True)
+            ItemEquivalence.objects.filter(pair_key=pair_key(f"item {i}", f"other {i}")).update(
+                last_used_at=now - timedelta(days=age)
+            )
+
+        self.assertEqual(purge_item_equivalences(), 2)
+        self.assertEqual(
+            sorted(ItemEquivalence.objects.values_list("name_a", flat=True)),
+            ["item 1", "item 2"],
+        )
@@ -0,0 +1,67 @@
+import copy
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from procurement.document_processing import parse_document
+from procurement.layout_templates import layout_fingerprint, learn_template, parse_with_template
+from procurement.metrics import get_counters
+from procurement.models import VendorTemplate
+from procurement.tests.test_rule_parser import text_and_layout
+
+SAMPLE_ITEMS = [
+    {"name": 'MacBook Pro 16" M3 Pro', "price": 2499.0, "quantity": 1},
+    {"name": "Samsung T7 External SSD 2TB", "price": 120.0, "quantity": 2},
+    {"name": "AppleCare+ for MacBook Pro", "price": 379.0, "quantity": 1},
+]
+LLM_RESULT = {
+    "vendor_name": "Tech Solutions Rwanda Ltd",
+    "vendor_address": "KN 123 St, Kigali, Rwanda",
+    "items": SAMPLE_ITEMS,
+    "total_amount": 3118.0,
+    "payment_terms": "50% advance",
+}
+
+
+class TestLayoutTemplates(TestCase):
+
+    def setUp(self):
+        self.text, self.layout = text_and_layout("sample.pdf")
+
+    def test_fingerprint_ignores_numbers(self):
+        other = copy.deepcopy(self.layout)
+        for word in other["pages"][0]["words"]:
+            if word["text"] == "PI-2025-001":
+                word["text"] = "PI-2025-777"
+        self.assertIsNotNone(layout_fingerprint(self.layout))
+        self.assertEqual(layout_fingerprint(self.layout), layout_fingerprint(other))
+
+    def test_fingerprint_differs_between_vendors(self):
+        _text, receipt_layout = text_and_layout("Receipt_Example.pdf")
+        self.assertNotEqual(layout_fingerprint(self.layout), layout_fingerprint(receipt_layout))
+
+    def test_learned_template_reparses_document(self):
+        template = learn_template(layout_fingerprint(self.layout), self.layout, LLM_RESULT)
+
+        self.assertIsNotNone(template)
+        data, confidence = parse_with_template(template, self.layout)
+        self.assertEqual(confidence, 1.0)
+        self.assertEqual(data["items"], SAMPLE_ITEMS)
+        self.assertEqual(data["total_amount"], 3118.0)
+
+    def test_inconsistent_extraction_is_not_learned(self):
+        wrong = dict(LLM_RESULT, total_amount=999.0)
+        self.assertIsNone(learn_template(layout_fingerprint(self.layout), self.layout, wrong))
+        self.assertFalse(VendorTemplate.objects.exists())
+
+    @override_settings(RULE_PARSER_MIN_CONFIDENCE=0.85)
+    @patch("procurement.document_processing.parse_with_rules", return_value=({}, 0.0))
+    @patch("procurement.document_processing.parse_with_ai", return_value=LLM_RESULT)
+    def test_llm_result_teaches_template_for_next_upload(self, mock_ai, mock_rules):
+        parse_document(self.text, self.layout)
+        data = parse_document(self.text, self.layout)
+
+        mock_ai.assert_called_once()
+        self.assertEqual(data["items"], SAMPLE_ITEMS)
+        self.assertEqual(get_counters("parser."), {"parser.llm": 1, "parser.template": 1})
+        self.assertEqual(VendorTemplate.objects.get().hit_count, 1)
@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from procurement.ai_matching import are_items_same
+from procurement.item_equivalence import clear_memory
+from procurement.llm_client import LLMBackend, OpenAIBackend, gather_limited, get_backend, reset_backend, run_async
+from procurement.tests.fakes import FakeLLMBackend
+
+
+@contextmanager
+def use_fake_backend():
+    """Route every LLM call in the block to a fresh FakeLLMBackend."""
+    with override_settings(LLM_BACKEND="procurement.tests.fakes.FakeLLMBackend"):
+        reset_backend()
+        # answers memoized in-process from an earlier fake must not leak in
+        clear_memory()
+        try:
+            yield get_backend()
+        finally:
+            reset_backend()
+
+
+class TestLLMClient(SimpleTestCase):
+
+    def test_backend_is_shared_per_process(self):
+        with use_fake_backend() as backend:
+            self.assertIsInstance(backend, FakeLLMBackend)
+            self.assertIs(get_backend(), backend)
+
+    @override_settings(LLM_BASE_URL="http://127.0.0.1:8999/v1", LLM_MAX_CONNECTIONS=7, LLM_TIMEOUT=12.0)
+    def test_openai_backend_uses_configured_pool(self):
+        backend = OpenAIBackend()
+        self.assertEqual(str(backend.client.base_url), "http://127.0.0.1:8999/v1/")
+        self.assertEqual(str(backend.async_client.base_url), "http://127.0.0.1:8999/v1/")
+        self.assertEqual(backend.client.timeout.read, 12.0)
+
+    def test_incomplete_backend_fails_at_instantiation(self):
+        class ChatOnly(LLMBackend):
+            def chat(self, messages, **kwargs):
+                return "YES"
+
+        class NoEmbeddings(ChatOnly):
+            def parse(self, messages, response_format, **kwargs):
+                return response_format()
+
+        for backend_class in (ChatOnly, NoEmbeddings):
+            with self.assertRaises(TypeError):
+                backend_class()
+
+    def test_run_async_reuses_one_loop(self):
+        async def loop_id():
+            import asyncio
+            return id(asyncio.get_running_loop())
+
+        self.assertEqual(run_async(loop_id()), run_async(loop_id()))
+        self.assertEqual(run_async(gather_limited([loop_id(), loop_id()], 1))[0], run_async(loop_id()))
+
+
+
+class TestMatchingBackend(TestCase):
+
+    def setUp(self):
+        clear_memory()
+
+    def test_matching_goes_through_backend(self):
+        with use_fake_backend() as backend:
+            backend.chat_reply = "YES"
+            self.assertTrue(are_items_same("HP LaserJet Toner 85A", "Toner cartridge HP 85A"))
+        self.assertEqual(backend.calls[0][2]["max_tokens"], 5)
@@ -0,0 +1,134 @@
+import smtplib
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+
+from procurement.mailer import backoff_remaining, deliver_batch, queue_email
+from procurement.metrics import get_counters
+from procurement.models import OutboundEmail
+from procurement.tasks import send_queued_emails
+
+
+def make_email(i, to=None):
+    return EmailMessage(subject=f"Message {i}", body="Body", to=to or [f"user{i}@example.com"])
+
+
+class CountingBackend(EmailBackend):
+    """locmem backend that records how often a connection is opened."""
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+
+class RefusingBackend(EmailBackend):
+    """Refuses one recipient, drops the connection on another."""
+
+    def send_messages(self, messages):
+        recipients = messages[0].to
+        if "refused@example.com" in recipients:
+            raise smtplib.SMTPRecipientsRefused({"refused@example.com": (550, b"No such user")})
+        if "drop@example.com" in recipients:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+class UnreachableBackend(EmailBackend):
+    """SMTP server down: the connection cannot be opened."""
+
+    def open(self):
+        raise ConnectionRefusedError("Connection refused")
+
+
+@override_settings(MAIL_BATCH_SIZE=10, MAIL_MAX_ATTEMPTS=2, MAIL_RETRY_BACKOFF=30, MAIL_RETRY_BACKOFF_MAX=900)
+class TestOutboundMail(TestCase):
+
+    def test_queued_message_round_trips(self):
+        message = EmailMultiAlternatives(subject="PO", body="text", to=["staff@example.com"])
+        message.attach_alternative("<p>html</p>", "text/html")
+        message.attach("PO_1.pdf", b"%PDF-1.4", "application/pdf")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            queue_email(message)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertEqual(deliver_batch(), (1, 0))
+        sent = mail.outbox[0]
+        self.assertEqual((sent.subject, sent.to), ("PO", ["staff@example.com"]))
+        self.assertEqual(sent.alternatives[0][0], "<p>html</p>")
+        self.assertEqual(sent.attachments[0][:2], ("PO_1.pdf", b"%PDF-1.4"))
+        self.assertEqual(OutboundEmail.objects.get().status, "SENT")
+
+    @override_settings(EMAIL_BACKEND="procurement.tests.test_mailer.CountingBackend")
+    def test_batch_shares_one_connection(self):
+        CountingBackend.opened = 0
+        for i in range(12):
+            queue_email(make_email(i))
+
+        self.assertEqual(deliver_batch(), (10, 0))
+        self.assertEqual(deliver_batch(), (2, 0))
+
+        self.assertEqual(CountingBackend.opened, 2)
+        self.assertEqual(len(mail.outbox), 12)
+        counters = get_counters("mail.")
+        self.assertEqual((counters["mail.sent"], counters["mail.batches"]), (12, 2))
+
+    @override_settings(EMAIL_BACKEND="procurement.tests.test_mailer.RefusingBackend")
+    def test_rejected_message_fails_alone(self):
+        queue_email(make_email(1))
+        queue_email(make_email(2, to=["refused@example.com"]))
+        queue_email(make_email(3))
+
+        self.assertEqual(deliver_batch(), (2, 1))
+        failed = OutboundEmail.objects.get(status="FAILED")
+        self.assertEqual(failed.subject, "Message 2")
+
+    @override_settings(EMAIL_BACKEND="procurement.tests.test_mailer.RefusingBackend")
+    @patch.object(send_queued_emails, "apply_async")
+    def test_connection_error_requeues_and_backs_off(self, mock_apply):
+        queue_email(make_email(1))
+        queue_email(make_email(2, to=["drop@example.com"]))
+        queue_email(make_email(3))
+
+        send_queued_emails()
+
+        # one follow-up flush, scheduled for the end of the backoff
+        self.assertAlmostEqual(mock_apply.call_args.kwargs["countdown"], 30, delta=1)
+        statuses = dict(OutboundEmail.objects.values_list("subject", "status"))
+        self.assertEqual(statuses, {"Message 1": "SENT", "Message 2": "PENDING", "Message 3": "PENDING"})
+        # only the message being sent when the connection dropped is charged
+        attempts = dict(OutboundEmail.objects.filter(status="PENDING").values_list("subject", "attempts"))
+        self.assertEqual(attempts, {"Message 2": 1, "Message 3": 0})
+
+        # periodic/on-commit flushes do nothing while backing off
+        queue_email(make_email(4))
+        self.assertEqual(deliver_batch(), (0, 0))
+
+        # the second failure exhausts MAIL_MAX_ATTEMPTS; the rest still goes out
+        OutboundEmail.objects.update(deferred_until=None)
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            deliver_batch()
+        self.assertAlmostEqual(backoff_remaining(), 60, delta=1)
+        OutboundEmail.objects.update(deferred_until=None)
+        self.assertEqual(deliver_batch(), (2, 0))
+        statuses = dict(OutboundEmail.objects.values_list("subject", "status"))
+        self.assertEqual(statuses["Message 2"], "FAILED")
+        self.assertEqual(statuses["Message 3"], "SENT")
+
+    @override_settings(EMAIL_BACKEND="procurement.tests.test_mailer.UnreachableBackend")
+    def test_unreachable_server_charges_no_attempts(self):
+        queue_email(make_email(1))
+        for _ in range(5):
+            OutboundEmail.objects.update(deferred_until=None)
+            with self.assertRaises(ConnectionRefusedError):
+                deliver_batch()
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.attempts, email.deferrals), ("PENDING", 0, 5))
+        # 30 * 2**4, capped at MAIL_RETRY_BACKOFF_MAX
+        self.assertAlmostEqual(backoff_remaining(), 480, delta=1)
@@ -0,0 +1,99 @@
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from procurement.mailer import deliver_batch
+from procurement.models import PurchaseRequest
+from procurement.purchase_orders import get_purchase_order_pdf, po_version
+from procurement.tasks import generate_purchase_order
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+@patch("procurement.purchase_orders.render_pdf", side_effect=lambda template, context: b"%PDF-" + str(len(context["items"])).encode())
+class TestPurchaseOrderCache(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            phone="+250788000002", email="staff@example.com", first_name="Sam", last_name="Staff"
+        )
+        self.pr = PurchaseRequest.objects.create(
+            title="Chairs", description="", amount=100, status="APPROVED", created_by=self.staff,
+            vendor_name="Acme", items_json=[{"name": "Chair", "price": 50, "quantity": 2}],
+        )
+
+    def test_unchanged_request_serves_stored_pdf(self, mock_render):
+        first, rendered = get_purchase_order_pdf(self.pr)
+        self.assertTrue(rendered)
+        updated_at = PurchaseRequest.objects.get(id=self.pr.id).updated_at
+
+        pr = PurchaseRequest.objects.get(id=self.pr.id)
+        self.assertEqual(pr.updated_at, updated_at)  # attaching the PO did not bump it
+        self.assertEqual(pr.purchase_order_version, po_version(pr))
+        self.assertEqual(get_purchase_order_pdf(pr), (first, False))
+        mock_render.assert_called_once()
+
+    def test_changed_items_re_render_and_replace_file(self, mock_render):
+        get_purchase_order_pdf(self.pr)
+        pr = PurchaseRequest.objects.get(id=self.pr.id)
+        old_name = pr.purchase_order.name
+
+        pr.items_json.append({"name": "Desk", "price": 120, "quantity": 1})
+        pr.save()
+        pdf_bytes, rendered = get_purchase_order_pdf(pr)
+
+        self.assertTrue(rendered)
+        self.assertEqual(pdf_bytes, b"%PDF-2")
+        pr.refresh_from_db()
+        self.assertEqual(pr.purchase_order.read(), b"%PDF-2")
+        if pr.purchase_order.name != old_name:
+            self.assertFalse(pr.purchase_order.storage.exists(old_name))
+
+    def test_retriggered_task_does_not_re_render_or_re_send(self, mock_render):
+        generate_purchase_order(self.pr.id)
+        generate_purchase_order(self.pr.id)
+        deliver_batch()
+        mock_render.assert_called_once()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(mail.outbox[0].attachments[0][1].startswith(b"%PDF-"))
+
+    def test_retry_after_failed_send_emails_stored_po(self, mock_render):
+        with patch("procurement.tasks.queue_email", side_effect=RuntimeError("db down")):
+            generate_purchase_order(self.pr.id)
+        self.assertTrue(PurchaseRequest.objects.get(id=self.pr.id).purchase_order)
+
+        generate_purchase_order(self.pr.id)
+        generate_purchase_order(self.pr.id)
+        deliver_batch()
+
+        mock_render.assert_called_once()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][1], b"%PDF-1")
+
+    def test_failed_render_keeps_existing_po(self, mock_render):
+        get_purchase_order_pdf(self.pr)
+        PurchaseRequest.objects.filter(id=self.pr.id).update(vendor_name="Acme Ltd")
+        mock_render.side_effect = RuntimeError("render failed")
+
+        generate_purchase_order(self.pr.id)
+
+        self.assertTrue(PurchaseRequest.objects.get(id=self.pr.id).purchase_order)
+
+    def test_download_endpoint(self, mock_render):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.get(f"/api/requests/{self.pr.id}/purchase-order/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response.content, b"%PDF-1")
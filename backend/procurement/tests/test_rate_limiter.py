@@ -0,0 +1,81 @@
+import asyncio
+import time
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from procurement import rate_limiter
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  (fakeredis needs it to run Lua scripts)
+except ImportError:
+    fakeredis = None
+
+
+class TestTokenEstimate(SimpleTestCase):
+
+    @override_settings(LLM_RATE_LIMIT_COMPLETION_ESTIMATE=500)
+    def test_estimate_tokens(self):
+        messages = [{"role": "user", "content": "x" * 400}]
+        self.assertEqual(rate_limiter.estimate_tokens(messages, max_tokens=5), 105)
+        self.assertEqual(rate_limiter.estimate_tokens(messages), 600)
+
+    @override_settings(LLM_RATE_LIMIT_ENABLED=False)
+    @patch("procurement.rate_limiter.try_acquire")
+    def test_disabled_limiter_never_touches_redis(self, mock_try):
+        rate_limiter.acquire(100)
+        mock_try.assert_not_called()
+
+
+    @override_settings(LLM_RATE_LIMIT_ENABLED=True)
+    def test_async_acquire_does_not_block_the_event_loop(self):
+        def slow_redis_round_trip(tokens):
+            time.sleep(0.2)
+            return 0.0
+
+        async def acquire_concurrently():
+            started = time.monotonic()
+            await asyncio.gather(*(rate_limiter.aacquire(10) for _ in range(4)))
+            return time.monotonic() - started
+
+        with patch("procurement.rate_limiter.try_acquire", side_effect=slow_redis_round_trip):
+            elapsed = asyncio.run(acquire_concurrently())
+        self.assertLess(elapsed, 0.6)
+
+@skipUnless(fakeredis, "fakeredis[lua] not installed")
+@override_settings(LLM_RATE_LIMIT_ENABLED=True, LLM_RATE_LIMIT_RPM=3, LLM_RATE_LIMIT_TPM=1000,
+                   LLM_RATE_LIMIT_MAX_WAIT=1)
+class TestRedisTokenBucket(SimpleTestCase):
+
+    def setUp(self):
+        server = fakeredis.FakeRedis()
+        patcher = patch.object(rate_limiter, "_client", server)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        script_patcher = patch.object(rate_limiter, "_script", server.register_script(rate_limiter.ACQUIRE_SCRIPT))
+        script_patcher.start()
+        self.addCleanup(script_patcher.stop)
+
+    def test_requests_admitted_until_bucket_empty(self):
+        self.assertEqual([rate_limiter.try_acquire(10) for _ in range(3)], [0, 0, 0])
+        # 3 rpm refills one request every 20 s
+        self.assertAlmostEqual(rate_limiter.try_acquire(10), 20, delta=0.5)
+
+    def test_token_budget_limits_large_prompts(self):
+        self.assertEqual(rate_limiter.try_acquire(900), 0)
+        self.assertGreater(rate_limiter.try_acquire(900), 0)
+
+    def test_over_budget_call_waits_then_times_out(self):
+        for _ in range(3):
+            rate_limiter.acquire(10)
+        with self.assertRaises(rate_limiter.RateLimitTimeout):
+            rate_limiter.acquire(10)
+
+    def test_utilization_report(self):
+        rate_limiter.acquire(250)
+        report = rate_limiter.utilization()
+        self.assertEqual(report["requests"]["limit"], 3)
+        self.assertAlmostEqual(report["tokens"]["used_pct"], 25, delta=1)
+        self.assertEqual(report["waiting"], 0)
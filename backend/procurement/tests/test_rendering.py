@@ -0,0 +1,49 @@
+from unittest.mock import patch
+
+from django.template.loader import get_template
+from django.test import SimpleTestCase, override_settings
+
+from procured_payment.celery import warm_pdf_renderer
+from procurement.rendering import STYLESHEETS, PDFRenderer
+
+
+@patch("procurement.rendering.HTML")
+class TestPDFRenderer(SimpleTestCase):
+
+    def test_stylesheets_parsed_once_and_reused(self, mock_html):
+        mock_html.return_value.write_pdf.return_value = b"%PDF"
+        renderer = PDFRenderer()
+        context = {"purchase_request": {"id": 1, "title": "Chairs"}, "items": []}
+
+        with patch("procurement.rendering.CSS") as mock_css:
+            pdfs = renderer.render_many([("emails/po.html", context)] * 3)
+
+        self.assertEqual(pdfs, [b"%PDF"] * 3)
+        mock_css.assert_called_once()
+        for call in mock_html.return_value.write_pdf.call_args_list:
+            self.assertIs(call.kwargs["font_config"], renderer.font_config)
+            self.assertIs(call.kwargs["cache"], renderer.image_cache)
+            self.assertEqual(call.kwargs["stylesheets"], [mock_css.return_value])
+
+    def test_warm_up_parses_every_stylesheet(self, mock_html):
+        renderer = PDFRenderer()
+        with patch("procurement.rendering.CSS"):
+            renderer.warm_up()
+        self.assertEqual(set(renderer.stylesheets), set(STYLESHEETS.values()))
+        self.assertIn("border-collapse", get_template("pdf/po.css").template.source)
+
+
+class TestWorkerWarmUp(SimpleTestCase):
+
+    @override_settings(PDF_WARM_UP=True)
+    @patch("procurement.rendering.warm_up", side_effect=OSError("no fonts"))
+    def test_failed_warm_up_does_not_break_worker_start(self, mock_warm_up):
+        with self.assertLogs("procured_payment.celery", "ERROR"):
+            warm_pdf_renderer()
+        mock_warm_up.assert_called_once()
+
+    @override_settings(PDF_WARM_UP=False)
+    @patch("procurement.rendering.warm_up")
+    def test_warm_up_can_be_turned_off(self, mock_warm_up):
+        warm_pdf_renderer()
+        mock_warm_up.assert_not_called()
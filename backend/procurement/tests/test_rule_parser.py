@@ -0,0 +1,99 @@
+import os
+from unittest.mock import patch
+
+import pdfplumber
+from django.test import TestCase, override_settings
+
+from procurement.document_processing import add_page_layout, extract_and_parse, new_layout, parse_document
+from procurement.metrics import get_counters
+from procurement.rule_parser import parse_amount, parse_with_rules
+
+SAMPLES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def text_and_tables(filename):
+    with pdfplumber.open(os.path.join(SAMPLES_DIR, filename)) as pdf:
+        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        tables = [table for page in pdf.pages for table in page.extract_tables()]
+    return text, tables
+
+
+def pdf_layout(path):
+    layout = new_layout()
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            add_page_layout(layout, page)
+    return layout
+
+
+def text_and_layout(filename):
+    text, _tables = text_and_tables(filename)
+    return text, pdf_layout(os.path.join(SAMPLES_DIR, filename))
+
+
+class TestRuleParser(TestCase):
+
+    def test_parse_amount(self):
+        self.assertEqual(parse_amount("$2,499.00"), 2499.0)
+        self.assertEqual(parse_amount("RWF 1,200"), 1200.0)
+        self.assertIsNone(parse_amount("n/a"))
+
+    def test_sample_proforma_from_tables(self):
+        data, confidence = parse_with_rules(*text_and_tables("sample.pdf"))
+
+        self.assertEqual(confidence, 1.0)
+        self.assertEqual(data["vendor_name"], "Tech Solutions Rwanda Ltd")
+        self.assertEqual(data["total_amount"], 3118.0)
+        self.assertEqual(
+            [(i["name"], i["quantity"], i["price"]) for i in data["items"]],
+            [('MacBook Pro 16" M3 Pro', 1, 2499.0), ("Samsung T7 External SSD 2TB", 2, 120.0),
+             ("AppleCare+ for MacBook Pro", 1, 379.0)],
+        )
+
+    def test_receipt_from_text_lines_only(self):
+        text, _tables = text_and_tables("Receipt_Example.pdf")
+        data, confidence = parse_with_rules(text)
+
+        self.assertEqual(confidence, 1.0)
+        self.assertEqual(data["vendor_name"], "SuperTech Supplies Ltd.")
+        self.assertEqual(len(data["items"]), 3)
+        self.assertEqual(data["total_amount"], 770.0)
+
+    def test_unreconciled_total_lowers_confidence(self):
+        text = "Vendor: Acme Ltd\nToner 2 $10.00 $20.00\nTOTAL: $95.00"
+        _data, confidence = parse_with_rules(text)
+        self.assertLess(confidence, 0.85)
+
+    @override_settings(RULE_PARSER_MIN_CONFIDENCE=0.85)
+    def test_guessed_vendor_is_not_full_confidence(self):
+        # no vendor heading: the first company-like line may be the buyer
+        text = "Bill to: Acme Buyers Ltd\nToner 2 $10.00 $20.00\nTOTAL: $20.00"
+        data, confidence = parse_with_rules(text)
+        self.assertEqual(data["vendor_name"], "Bill to: Acme Buyers Ltd")
+        self.assertLess(confidence, 0.85)
+
+    def test_layout_read_in_the_text_pass(self):
+        path = os.path.join(SAMPLES_DIR, "sample.pdf")
+        with open(path, "rb") as document, \
+                patch("procurement.document_processing.pdfplumber.open", wraps=pdfplumber.open) as opened, \
+                patch("procurement.document_processing.parse_document", return_value={}) as parse:
+            extract_and_parse(document)
+
+        opened.assert_called_once()
+        self.assertEqual(parse.call_args.args[1], pdf_layout(path))
+
+    @override_settings(RULE_PARSER_MIN_CONFIDENCE=0.85)
+    @patch("procurement.document_processing.parse_with_ai")
+    def test_parse_document_skips_llm_when_confident(self, mock_ai):
+        data = parse_document(*text_and_layout("sample.pdf"))
+
+        mock_ai.assert_not_called()
+        self.assertEqual(data["total_amount"], 3118.0)
+        self.assertEqual(get_counters("parser."), {"parser.rules": 1})
+
+    @override_settings(RULE_PARSER_MIN_CONFIDENCE=0.85)
+    @patch("procurement.document_processing.parse_with_ai", return_value={"items": []})
+    def test_parse_document_falls_back_to_llm(self, mock_ai):
+        self.assertEqual(parse_document("blurry unreadable scan")["items"], [])
+        mock_ai.assert_called_once_with("blurry unreadable scan")
+        self.assertEqual(get_counters("parser."), {"parser.llm": 1})
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+from pydantic import ValidationError
+
+from procurement.document_processing import parse_chunk_with_ai
+from procurement.llm_client import parsed_message
+from procurement.schemas import validate_extraction
+from procurement.tests.test_llm_client import use_fake_backend
+
+
+class TestExtractionSchema(SimpleTestCase):
+
+    def test_prices_and_quantities_are_coerced(self):
+        data = validate_extraction({
+            "vendor_name": None,
+            "items": [{"name": " Toner ", "price": "$1,200.50", "quantity": "2 pcs"}],
+            "total_amount": "RWF 2,401",
+        })
+
+        self.assertEqual(data, {
+            "vendor_name": "",
+            "vendor_address": "",
+            "items": [{"name": "Toner", "price": 1200.5, "quantity": 2}],
+            "total_amount": 2401.0,
+            "payment_terms": "",
+        })
+
+    def test_space_separated_thousands(self):
+        data = validate_extraction({
+            "items": [{"name": "Chair", "price": "RWF 1 200", "quantity": 1}],
+            "total_amount": "RWF 12 500",
+        })
+        self.assertEqual(data["items"][0]["price"], 1200.0)
+        self.assertEqual(data["total_amount"], 12500.0)
+
+    def test_unparseable_price_rejected(self):
+        with self.assertRaises(ValidationError):
+            validate_extraction({"items": [{"name": "Toner", "price": "call us", "quantity": 1}]})
+
+    def test_structured_output_returned_as_dict(self):
+        with use_fake_backend() as backend:
+            backend.parse_reply = {
+                "vendor_name": "Acme Ltd", "vendor_address": "", "payment_terms": "",
+                "items": [{"name": "Toner", "price": "10", "quantity": 2}], "total_amount": 20,
+            }
+            data = parse_chunk_with_ai("Acme Ltd Toner 2 x 10")
+
+        self.assertEqual(data["items"], [{"name": "Toner", "price": 10.0, "quantity": 2}])
+        self.assertEqual(backend.calls[0][0], "parse")
+
+    def test_refusal_raises(self):
+        message = SimpleNamespace(parsed=None, refusal="cannot help")
+        with self.assertRaises(ValueError):
+            parsed_message(SimpleNamespace(choices=[SimpleNamespace(message=message)]))
@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from procurement.models import PurchaseRequest, Vendor, VendorAlias
+from procurement.vendors import resolve_vendor, same_vendor, vendor_key
+
+
+class TestVendorRegistry(TestCase):
+
+    def test_key_ignores_case_punctuation_and_legal_form(self):
+        self.assertEqual(vendor_key("ACME Ltd."), "acme")
+        self.assertEqual(vendor_key("Acme Limited"), "acme")
+        self.assertEqual(vendor_key("Ltd"), "ltd")
+
+    def test_spellings_resolve_to_one_vendor(self):
+        vendor = resolve_vendor("Kigali Office Supplies Ltd")
+        self.assertEqual(resolve_vendor("KIGALI OFFICE SUPPLIES LIMITED"), vendor)
+        self.assertEqual(resolve_vendor("Kigali Office Supplies Ltd."), vendor)
+        # a close new spelling becomes another alias of the same vendor
+        self.assertEqual(resolve_vendor("Kigali Ofice Supplies"), vendor)
+
+        self.assertEqual(Vendor.objects.count(), 1)
+        self.assertEqual(VendorAlias.objects.filter(vendor=vendor).count(), 2)
+
+    def test_different_vendors_do_not_match(self):
+        self.assertFalse(same_vendor(resolve_vendor("Acme Ltd"), resolve_vendor("Globex Corp")))
+        self.assertFalse(same_vendor(resolve_vendor("Acme Ltd"), resolve_vendor("")))
+        self.assertFalse(same_vendor(resolve_vendor("Acme"), resolve_vendor("Acme Hardware")))
+
+    def test_extra_words_are_another_vendor(self):
+        for name, other in [
+            ("Global Tech Ltd", "Global Tech Solutions Ltd"),
+            ("ABC Trading", "ABC Trading & Logistics"),
+        ]:
+            with self.subTest(name=name, other=other):
+                self.assertFalse(same_vendor(resolve_vendor(name), resolve_vendor(other)))
+
+    def test_lookup_without_create(self):
+        self.assertIsNone(resolve_vendor("Unknown Vendor", create=False))
+        self.assertFalse(Vendor.objects.exists())
+
+    def test_document_spellings_are_not_registered(self):
+        vendor = resolve_vendor("Kigali Office Supplies Ltd")
+        self.assertEqual(resolve_vendor("Kigali Ofice Supplies", create=False), vendor)
+        self.assertIsNone(resolve_vendor("Kigali Office Supplies Rwanda", create=False))
+        self.assertEqual(Vendor.objects.count(), 1)
+        self.assertEqual(VendorAlias.objects.count(), 1)
+
+    def test_backfill_links_existing_requests(self):
+        pr = PurchaseRequest.objects.create(title="Chairs", description="", amount=10, vendor_name="Acme Ltd")
+        call_command("backfill_vendors", stdout=StringIO())
+        pr.refresh_from_db()
+        self.assertEqual(pr.vendor.name, "Acme Ltd")
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from procurement.models import PurchaseRequest
+
+
+class TestCursorPagination(TestCase):
+
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            phone="+250788000003", email="staff@example.com", first_name="Sam", last_name="Staff"
+        )
+        now = timezone.now()
+        for i in range(25):
+            pr = PurchaseRequest.objects.create(
+                title=f"Request {i}", description="", amount=10, created_by=self.staff
+            )
+            # pairs of requests share a timestamp, so id has to break the tie
+            PurchaseRequest.objects.filter(id=pr.id).update(created_at=now - timedelta(minutes=i // 2))
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def fetch(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data["data"]
+
+    def test_pages_cover_every_request_once_newest_first(self):
+        page = self.fetch("/api/requests/?pagination=cursor&page_size=10")
+        self.assertNotIn("count", page)
+
+        ids = [row["id"] for row in page["results"]]
+        while page["next"]:
+            page = self.fetch(page["next"])
+            ids += [row["id"] for row in page["results"]]
+
+        expected = list(
+            PurchaseRequest.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_inserts_between_pages_do_not_shift_results(self):
+        first = self.fetch("/api/requests/?pagination=cursor&page_size=10")
+        PurchaseRequest.objects.create(title="New", description="", amount=1, created_by=self.staff)
+        second = self.fetch(first["next"])
+
+        first_ids = {row["id"] for row in first["results"]}
+        second_ids = [row["id"] for row in second["results"]]
+        self.assertEqual(len(second_ids), 10)
+        self.assertFalse(first_ids & set(second_ids))
+
+    def test_cursor_mode_skips_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.fetch("/api/requests/?pagination=cursor")
+        self.assertFalse(any("COUNT(" in query["sql"].upper() for query in queries))
+
+    def test_page_number_pagination_stays_default(self):
+        page = self.fetch("/api/requests/")
+        self.assertEqual(page["count"], 25)
+        self.assertEqual(len(page["results"]), 10)
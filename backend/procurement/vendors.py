@@ -0,0 +1,91 @@
+# requests/vendors.py
+"""
+Vendor registry: every vendor-name spelling seen on a document resolves
+to one Vendor through the unique, indexed VendorAlias.alias_key, so
+comparing vendors is comparing ids.
+"""
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Vendor, VendorAlias
+from .similarity import name_similarity, normalize_item_name
+
+logger = logging.getLogger(__name__)
+
+# legal-form words that do not distinguish vendors ("Acme Ltd" == "ACME")
+LEGAL_FORMS = {"ltd", "inc", "co", "corp", "llc", "plc", "sarl", "sa", "gmbh", "&"}
+# fuzzy lookup only scores aliases starting with the same letters, at most this many
+PREFIX_LENGTH = 3
+CANDIDATE_LIMIT = 200
+
+
+def vendor_key(name: str) -> str:
+    """Alias lookup key: normalized name without legal-form words."""
+    tokens = normalize_item_name(name).split()
+    kept = [token for token in tokens if token not in LEGAL_FORMS]
+    return " ".join(kept or tokens)[:255]
+
+
+def find_similar_vendor(key: str):
+    """
+    First-sighting fallback: the vendor whose known alias is most similar
+    to `key`, if it clears ITEM_MATCH_ACCEPT. Only spelling variants of
+    the same words qualify: one-word names never match fuzzily, and
+    aliases with a different number of words are skipped, since an extra
+    word ("Global Tech" vs "Global Tech Solutions") is usually another
+    company. Candidates share the first letters of the key (an indexed
+    prefix lookup), at most CANDIDATE_LIMIT of them.
+    """
+    words = len(key.split())
+    if words < 2:
+        return None
+    candidates = (
+        VendorAlias.objects.select_related("vendor")
+        .filter(alias_key__startswith=key[:PREFIX_LENGTH])
+        .only("alias_key", "vendor__name")[:CANDIDATE_LIMIT]
+    )
+    best, best_score = None, settings.ITEM_MATCH_ACCEPT
+    for alias in candidates:
+        if len(alias.alias_key.split()) != words:
+            continue
+        score = name_similarity(key, alias.alias_key)
+        if score >= best_score:
+            best, best_score = alias.vendor, score
+    return best
+
+
+def resolve_vendor(name: str, create: bool = True):
+    """
+    Vendor for a document's vendor name, or None for a blank name.
+    Known spellings are one indexed lookup; a new spelling is matched to a
+    similar existing vendor. Only with `create` (proformas) is the
+    spelling registered, as an alias or as a new vendor; receipts and
+    invoices look up without writing, so OCR noise never enters the registry.
+    """
+    key = vendor_key(name or "")
+    if not key:
+        return None
+
+    alias = VendorAlias.objects.select_related("vendor").filter(alias_key=key).first()
+    if alias:
+        return alias.vendor
+
+    vendor = find_similar_vendor(key)
+    if not create:
+        return vendor
+    try:
+        with transaction.atomic():
+            if vendor is None:
+                vendor = Vendor.objects.create(name=name.strip()[:255])
+                logger.info(f"Registered new vendor {vendor.name!r}")
+            VendorAlias.objects.create(vendor=vendor, alias=name.strip()[:255], alias_key=key)
+    except IntegrityError:
+        # another worker registered the same spelling first
+        return VendorAlias.objects.select_related("vendor").get(alias_key=key).vendor
+    return vendor
+
+
+def same_vendor(vendor_a, vendor_b) -> bool:
+    return vendor_a is not None and vendor_b is not None and vendor_a.pk == vendor_b.pk
@@ -20,9 +20,12 @@ from Users.utils import api_response
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from django.db.models import Q
-from .tasks import process_proforma,validate_receipt
+from .tasks import process_proforma,validate_receipt,process_invoice
+from .purchase_orders import get_purchase_order_pdf
+from .reports import get_discrepancy_report_pdf, verify_report_token
+from django.http import HttpResponse
 
 
 
@@ -32,6 +35,25 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class PurchaseRequestCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id): no COUNT(*) and no OFFSET scan,
+    so every page costs the same, and rows inserted while paging do not
+    shift or repeat items. id breaks ties between equal timestamps.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Only created_at orderings have a unique keyset; anything else
+        # requested through ?ordering= falls back to newest first.
+        if request.query_params.get('ordering') == 'created_at':
+            return ('created_at', 'id')
+        return self.ordering
+
+
 
 @extend_schema(tags=['Purchase Requests'])
 class PurchaseRequestViewSet(ModelViewSet):
@@ -45,18 +67,33 @@ class PurchaseRequestViewSet(ModelViewSet):
     'current_level': ['exact'],
     'created_by': ['exact'],
     'created_at': ['exact'],
+    'vendor': ['exact'],
 }
 
     search_fields = ['title', 'description', 'vendor_name']
     ordering_fields = ['created_at', 'amount', 'current_level', 'status']
     ordering = ['-created_at']
     pagination_class = StandardResultsSetPagination
+
+    @property
+    def paginator(self):
+        """Page-number pagination by default; keyset pagination with ?pagination=cursor."""
+        if not hasattr(self, '_paginator'):
+            if self.request is not None and self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = PurchaseRequestCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
     
     def get_permissions(self):
         """
         Require authentication for all actions. Use custom permissions
         for specific actions like create, approve, reject, etc.
         """
+        # Signed report links from emails carry their own authorization
+        if self.action == 'discrepancy_report' and self.request.query_params.get('token'):
+            return []
+
         # Ensure user is logged in for all actions
         permissions = [IsAuthenticated()]
 
@@ -193,7 +230,16 @@ class PurchaseRequestViewSet(ModelViewSet):
                  required=False,
                  type=str,
                  examples=[OpenApiExample('Approved History', value='1')]
-             )
+             ),
+             OpenApiParameter(
+                 name='pagination',
+                 description='`cursor` switches to keyset pagination over (created_at, id): pages are followed through '
+                             'the `next`/`previous` links, there is no `count`, and only `ordering=created_at` or the '
+                             'default newest-first ordering apply.',
+                 required=False,
+                 type=str,
+                 examples=[OpenApiExample('Cursor pagination', value='cursor')]
+             ),
         ],
 
 
@@ -530,8 +576,12 @@ class PurchaseRequestViewSet(ModelViewSet):
             )
 
         purchase_request.invoice = serializer.validated_data["invoice"]
+        purchase_request.invoice_extraction_status = "PENDING"
         purchase_request.save()
 
+        # Extract the invoice and run the PO/receipt/invoice match
+        process_invoice.delay(purchase_request.id)
+
         return api_response(
             success=True,
             message="Invoice uploaded successfully.",
@@ -539,4 +589,69 @@ class PurchaseRequestViewSet(ModelViewSet):
             status_code=status.HTTP_200_OK
         )
 
-    
\ No newline at end of file
+    
+    # documentation for download_purchase_order added here
+    @extend_schema(
+        summary="Download the purchase order PDF",
+        description=(
+            "Returns the PO PDF of an approved request. The stored PDF is served as long as "
+            "the request data it was rendered from is unchanged; otherwise it is re-rendered first."
+        ),
+        responses={(200, 'application/pdf'): {'type': 'string', 'format': 'binary'}},
+    )
+    @action(detail=True, methods=["get"], url_path="purchase-order")
+    def download_purchase_order(self, request, pk=None):
+        purchase_request = self.get_object()
+
+        if purchase_request.status != 'APPROVED':
+            return api_response(
+                success=False,
+                message="Purchase orders are only available for approved requests.",
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        pdf_bytes, _rendered = get_purchase_order_pdf(purchase_request)
+        response = HttpResponse(pdf_bytes, content_type="application/pdf")
+        response["Content-Disposition"] = f'attachment; filename="PO_{purchase_request.id}.pdf"'
+        return response
+
+
+    # documentation for discrepancy_report added here
+    @extend_schema(
+        summary="Download the 3-way matching discrepancy report PDF",
+        description=(
+            "Returns the discrepancy report of a request. The PDF is rendered on the first "
+            "download and served from storage until matching results change. Accessible "
+            "either with normal authentication or with the signed `token` from the email link, "
+            "which is only valid for the request's current matching results."
+        ),
+        parameters=[
+            OpenApiParameter(name='token', description='Signed link token from the discrepancy email', required=False, type=str),
+        ],
+        responses={(200, 'application/pdf'): {'type': 'string', 'format': 'binary'}},
+    )
+    @action(detail=True, methods=["get"], url_path="discrepancy-report")
+    def discrepancy_report(self, request, pk=None):
+        token = request.query_params.get('token')
+        if token:
+            purchase_request = PurchaseRequest.objects.filter(pk=pk).first()
+            if purchase_request is None or not verify_report_token(purchase_request, token):
+                return api_response(
+                    success=False,
+                    message="Invalid or expired report link.",
+                    status_code=status.HTTP_403_FORBIDDEN
+                )
+        else:
+            purchase_request = self.get_object()
+
+        if purchase_request.three_way_match_status != 'DISCREPANCY' or not purchase_request.discrepancy_details.get('lines'):
+            return api_response(
+                success=False,
+                message="No discrepancy report is available for this request.",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+
+        pdf_bytes, _rendered = get_discrepancy_report_pdf(purchase_request)
+        response = HttpResponse(pdf_bytes, content_type="application/pdf")
+        response["Content-Disposition"] = f'attachment; filename="3way_report_{purchase_request.id}.pdf"'
+        return response